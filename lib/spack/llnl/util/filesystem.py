@@ -76,7 +76,8 @@ __all__ = [
     'touchp',
     'traverse_tree',
     'unset_executable_mode',
-    'working_dir'
+    'working_dir',
+    'writable'
 ]
 
 
@@ -447,6 +448,22 @@ def working_dir(dirname, **kwargs):
     os.chdir(orig_dir)
 
 
+@contextmanager
+def writable(path):
+    """Make the file ``path`` writable by its owner inside the context,
+    and restore its permissions afterwards if it was not."""
+    mode = os.stat(path).st_mode
+    if mode & stat.S_IWUSR:
+        yield
+        return
+
+    os.chmod(path, mode | stat.S_IWUSR)
+    try:
+        yield
+    finally:
+        os.chmod(path, mode)
+
+
 @contextmanager
 def replace_directory_transaction(directory_name, tmp_root=None):
     """Moves a directory to a temporary space. If the operations executed
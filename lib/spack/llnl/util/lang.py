@@ -29,8 +29,10 @@ import re
 import functools
 import collections
 import inspect
+import threading
 from datetime import datetime, timedelta
 from six import string_types
+from ordereddict_backport import OrderedDict
 
 # Ignore emacs backups when listing modules
 ignore_modules = [r'^\.#', '~$']
@@ -191,6 +193,48 @@ class memoized(object):
         self.cache.clear()
 
 
+class LRUCache(object):
+    """Mapping that holds at most ``maxsize`` items, and forgets the
+       least recently used ones first.  It can be shared by threads."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Return the item for ``key``, or ``default`` if there is none."""
+        with self._lock:
+            try:
+                value = self._items.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self._items[key] = value
+            self.hits += 1
+            return value
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._items.pop(key, None)
+            self._items[key] = value
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def clear(self):
+        """Forget all the items."""
+        with self._lock:
+            self._items.clear()
+
+
 def list_modules(directory, **kwargs):
     """Lists all of the modules, excluding ``__init__.py``, in a
        particular directory.  Listed packages have no particular
@@ -90,12 +90,14 @@ class Lock(object):
         pid and host to the lock file, in case the holding process needs
         to be killed later.
 
-        If the lock times out, it raises a ``LockError``.
+        If the lock times out, it raises a ``LockError``.  The lock is
+        always tried at least once, so a ``timeout`` of 0 makes a single,
+        nonblocking attempt.
         """
         assert op in (fcntl.LOCK_SH, fcntl.LOCK_EX)
 
         start_time = time.time()
-        while (time.time() - start_time) < timeout:
+        while True:
             # Create file and parent directories if they don't exist.
             if self._file is None:
                 parent = self._ensure_parent_directory()
@@ -144,6 +146,8 @@ class Lock(object):
                 else:
                     raise
 
+            if (time.time() - start_time) >= timeout:
+                break
             time.sleep(_sleep_time)
 
         raise LockTimeoutError("Timed out waiting for lock.")
@@ -253,9 +257,13 @@ class Lock(object):
             self._writes += 1
             return False
 
-    def release_read(self):
+    def release_read(self, release_fn=None):
         """Releases a read lock.
 
+        Arguments:
+            release_fn (callable): function to call *before* the last
+                recursive lock (read or write) is released.
+
         Returns True if the last recursive lock was released, False if
         there are still outstanding locks.
 
@@ -269,16 +277,25 @@ class Lock(object):
             self._debug(
                 'READ LOCK: {0.path}[{0._start}:{0._length}] [Released]'
                 .format(self))
-            self._unlock()      # can raise LockError.
-            self._reads -= 1
+            try:
+                if release_fn is not None:
+                    release_fn()
+            finally:
+                self._unlock()      # can raise LockError.
+                self._reads -= 1
             return True
         else:
             self._reads -= 1
             return False
 
-    def release_write(self):
+    def release_write(self, release_fn=None):
         """Releases a write lock.
 
+        Arguments:
+            release_fn (callable): function to call *before* the last
+                recursive lock (read or write) is released, e.g. to write
+                out data protected by the lock while it is still held.
+
         Returns True if the last recursive lock was released, False if
         there are still outstanding locks.
 
@@ -292,8 +309,12 @@ class Lock(object):
             self._debug(
                 'WRITE LOCK: {0.path}[{0._start}:{0._length}] [Released]'
                 .format(self))
-            self._unlock()      # can raise LockError.
-            self._writes -= 1
+            try:
+                if release_fn is not None:
+                    release_fn()
+            finally:
+                self._unlock()      # can raise LockError.
+                self._writes -= 1
             return True
         else:
             self._writes -= 1
@@ -339,15 +360,20 @@ class LockTransaction(object):
                 return self._as
 
     def __exit__(self, type, value, traceback):
-        suppress = False
-        if self._exit():
+        suppress = []
+
+        def release_fn():
+            # Runs while the lock is still held, so that anything the
+            # release function writes is protected by the lock.
             if self._as and hasattr(self._as, '__exit__'):
                 if self._as.__exit__(type, value, traceback):
-                    suppress = True
+                    suppress.append(True)
             if self._release_fn:
                 if self._release_fn(type, value, traceback):
-                    suppress = True
-        return suppress
+                    suppress.append(True)
+
+        self._exit(release_fn)
+        return bool(suppress)
 
 
 class ReadTransaction(LockTransaction):
@@ -355,8 +381,8 @@ class ReadTransaction(LockTransaction):
     def _enter(self):
         return self._lock.acquire_read(self._timeout)
 
-    def _exit(self):
-        return self._lock.release_read()
+    def _exit(self, release_fn):
+        return self._lock.release_read(release_fn)
 
 
 class WriteTransaction(LockTransaction):
@@ -364,8 +390,8 @@ class WriteTransaction(LockTransaction):
     def _enter(self):
         return self._lock.acquire_write(self._timeout)
 
-    def _exit(self):
-        return self._lock.release_write()
+    def _exit(self, release_fn):
+        return self._lock.release_write(release_fn)
 
 
 class LockError(Exception):
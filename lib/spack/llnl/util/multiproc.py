@@ -27,9 +27,11 @@ This implements a parallel map operation but it can accept more values
 than multiprocessing.Pool.apply() can.  For example, apply() will fail
 to pickle functions if they're passed indirectly as parameters.
 """
+import multiprocessing
+import os
 from multiprocessing import Process, Pipe, Semaphore, Value
 
-__all__ = ['spawn', 'parmap', 'Barrier']
+__all__ = ['spawn', 'parmap', 'fork_context', 'Barrier']
 
 
 def spawn(f):
@@ -48,6 +50,23 @@ def parmap(f, elements):
     return [p.recv() for (p, c) in pipe]
 
 
+def fork_context():
+    """The multiprocessing context that forks processes, or None if this
+    platform cannot fork.
+
+    Workers that inherit the state of this process have to be forked,
+    even where another start method is the default, as on macOS with
+    Python 3.8 and later.
+    """
+    if not hasattr(multiprocessing, 'get_context'):
+        # Python 2 forks wherever it can
+        return multiprocessing if hasattr(os, 'fork') else None
+    try:
+        return multiprocessing.get_context('fork')
+    except ValueError:
+        return None
+
+
 class Barrier:
     """Simple reusable semaphore barrier.
 
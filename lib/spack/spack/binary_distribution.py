@@ -27,23 +27,58 @@ import re
 import tarfile
 import shutil
 import platform
+import stat
 import tempfile
 import hashlib
-from contextlib import closing
+import gzip
+import json
+import multiprocessing
+import subprocess
+import threading
+import time
+from contextlib import closing, contextmanager
+from io import BytesIO
+from multiprocessing.pool import ThreadPool
 
 import ruamel.yaml as yaml
+from six.moves import queue
+from six.moves.urllib.error import HTTPError, URLError
 
 import llnl.util.tty as tty
-from llnl.util.filesystem import mkdirp, install_tree, get_filetype
+from llnl.util.filesystem import mkdirp
+from llnl.util.lock import LockTimeoutError
 
+import spack.architecture
+import spack.caches
 import spack.cmd
+import spack.config
 import spack.fetch_strategy as fs
+import spack.hooks
+import spack.spec
+import spack.store
+import spack.util.content_store as content_store
 import spack.util.gpg as gpg_util
 import spack.relocate as relocate
 from spack.stage import Stage
 from spack.util.gpg import Gpg
-from spack.util.web import spider
-from spack.util.executable import ProcessError
+from spack.util.web import spider, read_from_url
+from spack.util.executable import ProcessError, which
+
+#: Name of the index of all specs in a build cache directory
+index_file_name = 'index.json.gz'
+
+#: Version of the format of the index
+index_version = 1
+
+#: Directory of the content-addressed store in a build cache directory,
+#: which holds the files of packages created with ``dedup=True``
+blobs_directory_name = 'blobs'
+
+#: Version of the format of the manifests of these packages
+manifest_version = 1
+
+#: Extension of the manifests, in place of ``.spack``
+manifest_ext = '.manifest.json.gz'
 
 
 class NoOverwriteException(Exception):
@@ -148,7 +183,7 @@ def write_buildinfo_file(prefix, workdir, rel=False):
             #  of files potentially needing relocation
             if relocate.strings_contains_installroot(
                     path_name, spack.store.layout.root):
-                filetype = get_filetype(path_name)
+                filetype = relocate.classify_file(path_name)
                 if relocate.needs_binary_relocation(filetype, os_id):
                     rel_path_name = os.path.relpath(path_name, prefix)
                     binary_to_relocate.append(rel_path_name)
@@ -203,14 +238,8 @@ def tarball_path_name(spec, ext):
 
 def checksum_tarball(file):
     # calculate sha256 hash of tar file
-    block_size = 65536
-    hasher = hashlib.sha256()
     with open(file, 'rb') as tfile:
-        buf = tfile.read(block_size)
-        while len(buf) > 0:
-            hasher.update(buf)
-            buf = tfile.read(block_size)
-    return hasher.hexdigest()
+        return _checksum_stream(tfile)
 
 
 def sign_tarball(key, force, specfile_path):
@@ -254,25 +283,388 @@ def generate_index(outdir, indexfile_path):
     f.close()
 
 
+def _read_index_entry(cache_dir, specfile_name):
+    """Read the index entry for one spec.yaml file in a build cache."""
+    with open(os.path.join(cache_dir, specfile_name), 'r') as f:
+        spec_dict = yaml.load(f.read())
+
+    spec = spack.spec.Spec.from_dict(spec_dict)
+    spackfile_path = os.path.join(
+        tarball_directory_name(spec), tarball_name(spec, '.spack'))
+
+    # the .spack archive holds the signature of signed spec.yaml files,
+    # which is next to the spec.yaml for packages with a manifest
+    signed = False
+    full_spackfile_path = os.path.join(cache_dir, spackfile_path)
+    if spec_dict.get('binary_cache_manifest'):
+        spackfile_path = None
+        signed = os.path.exists(
+            os.path.join(cache_dir, specfile_name + '.asc'))
+    elif os.path.exists(full_spackfile_path):
+        with closing(tarfile.open(full_spackfile_path, 'r')) as tar:
+            signed = any(n.endswith('.asc') for n in tar.getnames())
+
+    return spec.dag_hash(), {
+        'spec': spec_dict,
+        'spackfile': spackfile_path,
+        'signed': signed,
+    }
+
+
+def generate_package_index(outdir):
+    """Update the index of all specs in ``<outdir>/build_cache``.
+
+    The index is a single gzipped JSON file holding the contents of every
+    ``spec.yaml`` in the build cache (the spec DAG with its hashes, the
+    full hash and the tarball checksum), and whether the tarball is signed.
+    Clients read it instead of listing the directory and fetching each
+    ``spec.yaml`` separately.
+
+    Only ``spec.yaml`` files that are new or changed since the last index
+    was written are read.
+
+    Returns:
+        (dict): the index that was written
+    """
+    cache_dir = os.path.join(outdir, 'build_cache')
+    index_path = os.path.join(cache_dir, index_file_name)
+
+    entries, index_mtime = {}, None
+    if os.path.exists(index_path):
+        try:
+            old_index = _read_index_file(index_path)
+            entries = dict((e['specfile'], (h, e))
+                           for h, e in old_index['specs'].items())
+            index_mtime = os.stat(index_path).st_mtime
+        except (IOError, OSError, ValueError, KeyError):
+            tty.warn('Rebuilding unreadable build cache index: {0}'.format(
+                index_path))
+
+    specs = {}
+    for specfile_name in sorted(os.listdir(cache_dir)):
+        if not specfile_name.endswith('.spec.yaml'):
+            continue
+
+        specfile_path = os.path.join(cache_dir, specfile_name)
+        if (specfile_name in entries and index_mtime is not None and
+                os.stat(specfile_path).st_mtime < index_mtime):
+            dag_hash, entry = entries[specfile_name]
+        else:
+            tty.debug('Indexing {0}'.format(specfile_name))
+            dag_hash, entry = _read_index_entry(cache_dir, specfile_name)
+            entry['specfile'] = specfile_name
+        specs[dag_hash] = entry
+
+    index = {'index_version': index_version, 'specs': specs}
+    tmp_path = '{0}.{1}.tmp'.format(index_path, os.getpid())
+    with closing(gzip.open(tmp_path, 'wb')) as f:
+        f.write(json.dumps(index, sort_keys=True).encode('utf-8'))
+    os.rename(tmp_path, index_path)
+
+    return index
+
+
+def _read_index_file(path):
+    """Read a gzipped build cache index from a local file."""
+    with closing(gzip.open(path, 'rb')) as f:
+        return _parse_index(f.read())
+
+
+def _parse_index(data):
+    """Parse the uncompressed content of a build cache index."""
+    index = json.loads(data.decode('utf-8'))
+    if index.get('index_version') != index_version:
+        raise ValueError('Unsupported build cache index version: {0}'.format(
+            index.get('index_version')))
+    return index
+
+
+def _mirror_index(url, force=False):
+    """Get the build cache index of a mirror, or None if it has none.
+
+    Indexes are cached in the misc cache, along with what is needed to
+    tell whether they changed: the modification time of local indexes,
+    and the ``ETag`` and ``Last-Modified`` headers of remote ones, which
+    are sent back in a conditional request.  Remote indexes fetched less
+    than ``config:binary_index_ttl`` seconds ago are used without any
+    request.
+    """
+    index_url = url.rstrip('/') + '/build_cache/' + index_file_name
+    key = os.path.join('build_cache', 'index-{0}.json'.format(
+        hashlib.sha1(index_url.encode('utf-8')).hexdigest()))
+
+    cache = spack.caches.misc_cache
+    cached = None
+    if cache.init_entry(key) and not force:
+        try:
+            with cache.read_transaction(key) as f:
+                cached = json.load(f)
+            if cached.get('url') != index_url:
+                cached = None
+        except ValueError:
+            cached = None
+
+    if url.startswith('file://'):
+        path = index_url[len('file://'):]
+        if not os.path.exists(path):
+            return None
+        stamps = {'mtime': os.stat(path).st_mtime}
+        if cached and cached['stamps'] == stamps:
+            tty.debug('Using cached build cache index of {0}'.format(url))
+            return cached['index']
+
+        with closing(gzip.open(path, 'rb')) as f:
+            data = f.read()
+
+    else:
+        ttl = spack.config.get('config:binary_index_ttl', 600)
+        if cached and time.time() - cached.get('fetched', 0) < ttl:
+            tty.debug('Using cached build cache index of {0}'.format(url))
+            return cached['index']
+
+        headers = {}
+        if cached:
+            if cached['stamps'].get('etag'):
+                headers['If-None-Match'] = cached['stamps']['etag']
+            if cached['stamps'].get('last_modified'):
+                headers['If-Modified-Since'] = cached['stamps'][
+                    'last_modified']
+        try:
+            response = read_from_url(index_url, headers)
+        except HTTPError as e:
+            if e.code == 304 and cached:
+                tty.debug('Build cache index of {0} is unchanged'.format(url))
+                _write_cached_index(key, index_url, cached['stamps'],
+                                    cached['index'])
+                return cached['index']
+            if e.code != 404:
+                tty.warn('Could not fetch {0}: {1}'.format(index_url, e))
+            return None
+        except URLError as e:
+            tty.warn('Could not fetch {0}: {1}'.format(index_url, e))
+            return None
+
+        stamps = {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+        }
+        with closing(gzip.GzipFile(fileobj=BytesIO(response.read()))) as f:
+            data = f.read()
+
+    try:
+        index = _parse_index(data)
+    except (ValueError, KeyError) as e:
+        tty.warn('Ignoring invalid build cache index {0}: {1}'.format(
+            index_url, e))
+        return None
+
+    _write_cached_index(key, index_url, stamps, index)
+    return index
+
+
+def _write_cached_index(key, index_url, stamps, index):
+    """Store the index of a mirror in the misc cache."""
+    with spack.caches.misc_cache.write_transaction(key) as (old, new):
+        json.dump({'url': index_url, 'stamps': stamps,
+                   'fetched': time.time(), 'index': index}, new)
+
+
+class _HashingWriter(object):
+    """Writes to ``fileobj``, computing the sha256 checksum and the size
+    of what is written along the way."""
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.hasher = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.hasher.update(data)
+        self.size += len(data)
+        self.fileobj.write(data)
+
+    def flush(self):
+        self.fileobj.flush()
+
+
+def _gzip_command():
+    """Return ``pigz``, which compresses on all cores, if it is in the
+    PATH, or None."""
+    return which('pigz')
+
+
+@contextmanager
+def _gzip_stream(fileobj):
+    """Yield a file object that compresses what is written to it with
+    gzip, into ``fileobj``.
+
+    ``pigz`` is used if it is available, and the ``gzip`` module
+    otherwise.  Both write gzip data, so any version of Spack can read
+    the result.
+    """
+    pigz = _gzip_command()
+    if pigz is None:
+        stream = gzip.GzipFile(fileobj=fileobj, mode='wb', compresslevel=6)
+        with closing(stream):
+            yield stream
+        return
+
+    proc = subprocess.Popen(pigz.exe + ['-c', '-6'],
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    pump = threading.Thread(target=shutil.copyfileobj,
+                            args=(proc.stdout, fileobj, 1024 * 1024))
+    pump.start()
+    try:
+        yield proc.stdin
+    finally:
+        proc.stdin.close()
+        pump.join()
+        proc.wait()
+    if proc.returncode != 0:
+        raise ProcessError('%s exited with status %d' % (
+            pigz.command, proc.returncode))
+
+
+def _prefix_files(prefix, workdir):
+    """Yield the paths relative to ``prefix`` of the files and
+    directories in it, and the files to read them from.
+
+    Files that also exist in ``workdir`` -- the relocation information
+    and binaries with rewritten RPATHs -- are taken from there.  The
+    relocation information comes first, so that it is known before the
+    files it lists when the package is extracted.
+    """
+    buildinfo_path = os.path.relpath(buildinfo_file_name(workdir), workdir)
+    yield buildinfo_path, os.path.join(workdir, buildinfo_path)
+
+    for root, dirs, files in os.walk(prefix):
+        dirs.sort()
+        for name in dirs + sorted(files):
+            path = os.path.relpath(os.path.join(root, name), prefix)
+            if path == buildinfo_path:
+                continue
+            source = os.path.join(workdir, path)
+            if not os.path.isfile(source) or os.path.islink(source):
+                source = os.path.join(prefix, path)
+            yield path, source
+
+
+def _add_prefix(tar, prefix, workdir):
+    """Add the install prefix ``prefix`` to ``tar`` under its base name,
+    with the files listed by :func:`_prefix_files`."""
+    arcroot = os.path.basename(prefix)
+    tar.add(prefix, arcname=arcroot, recursive=False)
+    for path, source in _prefix_files(prefix, workdir):
+        tar.add(source, arcname=os.path.join(arcroot, path),
+                recursive=False)
+
+
+def _write_prefix_member(spackfile, name, prefix, workdir):
+    """Write the compressed tarball of ``prefix`` to ``spackfile`` as the
+    tar member ``name``, without creating it on disk first.
+
+    The member header is written last, once the size of the tarball is
+    known.  Returns the sha256 checksum of the tarball.
+    """
+    info = tarfile.TarInfo(name)
+    info.mode = 0o644
+    info.mtime = time.time()
+    start = spackfile.tell()
+    spackfile.write(b'\0' * len(info.tobuf(tarfile.GNU_FORMAT)))
+
+    writer = _HashingWriter(spackfile)
+    with _gzip_stream(writer) as stream:
+        with closing(tarfile.open(fileobj=stream, mode='w|')) as tar:
+            _add_prefix(tar, prefix, workdir)
+
+    spackfile.write(b'\0' * (-writer.size % tarfile.BLOCKSIZE))
+    end = spackfile.tell()
+    info.size = writer.size
+    spackfile.seek(start)
+    spackfile.write(info.tobuf(tarfile.GNU_FORMAT))
+    spackfile.seek(end)
+    return writer.hasher.hexdigest()
+
+
+def _manifest_entry(path, source, store):
+    """Describe the file ``path`` of a package, read from ``source``, in
+    its manifest, adding its content to ``store``."""
+    st = os.lstat(source)
+    entry = {'path': path}
+    if os.path.islink(source):
+        entry['type'] = 'link'
+        entry['target'] = os.readlink(source)
+    elif os.path.isdir(source):
+        entry['type'] = 'dir'
+        entry['mode'] = stat.S_IMODE(st.st_mode)
+    else:
+        entry['type'] = 'file'
+        entry['mode'] = stat.S_IMODE(st.st_mode)
+        entry['mtime'] = int(st.st_mtime)
+        entry['size'] = st.st_size
+        entry['chunks'] = content_store.add_file(store, source)
+    return entry
+
+
+def _write_manifest(manifest_path, prefix, workdir, store, jobs=None):
+    """Add the files of the install prefix ``prefix``, listed by
+    :func:`_prefix_files`, to the content-addressed ``store``, and write
+    the manifest describing the package to ``manifest_path``.
+
+    The manifest is a gzipped JSON file listing the files, directories
+    and symlinks of the package, with the checksums of the chunks of
+    each file.  Files are added to the store ``jobs`` at a time.
+
+    Returns:
+        str: the sha256 checksum of the manifest
+    """
+    paths = [('.', prefix)] + list(_prefix_files(prefix, workdir))
+    pool = ThreadPool(jobs or multiprocessing.cpu_count())
+    try:
+        files = pool.map(lambda p: _manifest_entry(p[0], p[1], store), paths)
+    finally:
+        pool.terminate()
+
+    manifest = {'manifest_version': manifest_version,
+                'chunk_size': content_store.chunk_size,
+                'files': files}
+    tmp_path = '{0}.{1}.tmp'.format(manifest_path, os.getpid())
+    with closing(gzip.open(tmp_path, 'wb')) as f:
+        f.write(json.dumps(manifest, sort_keys=True).encode('utf-8'))
+    os.rename(tmp_path, manifest_path)
+    return checksum_tarball(manifest_path)
+
+
 def build_tarball(spec, outdir, force=False, rel=False, unsigned=False,
-                  allow_root=False, key=None):
+                  allow_root=False, key=None, dedup=False):
     """
     Build a tarball from given spec and put it into the directory structure
     used at the mirror (following <tarball_directory_name>).
+
+    The install prefix is streamed into the tarball, and only the binaries
+    whose RPATHs are rewritten are copied to a temporary directory first.
+
+    With ``dedup``, the files of the package are instead added to the
+    content-addressed store in ``<outdir>/build_cache/blobs``, where
+    contents shared with other packages are stored only once, and the
+    package is described by a manifest (see :func:`_write_manifest`).
+    The signed spec.yaml holds the checksum of the manifest.
     """
     # set up some paths
     tarfile_name = tarball_name(spec, '.tar.gz')
     tarfile_dir = os.path.join(outdir, "build_cache",
                                tarball_directory_name(spec))
-    tarfile_path = os.path.join(tarfile_dir, tarfile_name)
     mkdirp(tarfile_dir)
     spackfile_path = os.path.join(
         outdir, "build_cache", tarball_path_name(spec, '.spack'))
-    if os.path.exists(spackfile_path):
-        if force:
-            os.remove(spackfile_path)
-        else:
-            raise NoOverwriteException(str(spackfile_path))
+    manifest_path = os.path.join(
+        outdir, "build_cache", tarball_path_name(spec, manifest_ext))
+    for path in (spackfile_path, manifest_path):
+        if os.path.exists(path):
+            if force:
+                os.remove(path)
+            else:
+                raise NoOverwriteException(str(path))
     # need to copy the spec file so the build cache can be downloaded
     # without concretizing with the current spack packages
     # and preferences
@@ -284,14 +676,22 @@ def build_tarball(spec, outdir, force=False, rel=False, unsigned=False,
     if os.path.exists(specfile_path):
         if force:
             os.remove(specfile_path)
+            # the signature of a previous package with a manifest
+            if os.path.exists('%s.asc' % specfile_path):
+                os.remove('%s.asc' % specfile_path)
         else:
             raise NoOverwriteException(str(specfile_path))
-    # make a copy of the install directory to work with
-    workdir = os.path.join(tempfile.mkdtemp(), os.path.basename(spec.prefix))
-    install_tree(spec.prefix, workdir, symlinks=True)
 
-    # create info for later relocation and create tar
+    # create info for later relocation, and copy the binaries that need
+    # their RPATHs rewritten to a work directory
+    tmpdir = tempfile.mkdtemp()
+    workdir = os.path.join(tmpdir, os.path.basename(spec.prefix))
+    mkdirp(os.path.dirname(buildinfo_file_name(workdir)))
     write_buildinfo_file(spec.prefix, workdir, rel=rel)
+    for filename in read_buildinfo_file(workdir)['relocate_binaries']:
+        mkdirp(os.path.dirname(os.path.join(workdir, filename)))
+        shutil.copy2(os.path.join(spec.prefix, filename),
+                     os.path.join(workdir, filename))
 
     # optinally make the paths in the binaries relative to each other
     # in the spack install tree before creating tarball
@@ -299,25 +699,31 @@ def build_tarball(spec, outdir, force=False, rel=False, unsigned=False,
         try:
             make_package_relative(workdir, spec.prefix, allow_root)
         except Exception as e:
-            shutil.rmtree(workdir)
+            shutil.rmtree(tmpdir)
             shutil.rmtree(tarfile_dir)
             tty.die(str(e))
     else:
         try:
             make_package_placeholder(workdir, allow_root)
         except Exception as e:
-            shutil.rmtree(workdir)
+            shutil.rmtree(tmpdir)
             shutil.rmtree(tarfile_dir)
             tty.die(str(e))
-    # create compressed tarball of the install prefix
-    with closing(tarfile.open(tarfile_path, 'w:gz')) as tar:
-        tar.add(name='%s' % workdir,
-                arcname='%s' % os.path.basename(spec.prefix))
-    # remove copy of install directory
-    shutil.rmtree(workdir)
 
-    # get the sha256 checksum of the tarball
-    checksum = checksum_tarball(tarfile_path)
+    try:
+        if dedup:
+            store = content_store.LocalContentStore(os.path.join(
+                outdir, "build_cache", blobs_directory_name))
+            checksum = _write_manifest(
+                manifest_path, spec.prefix, workdir, store)
+        else:
+            # stream the compressed tarball of the install prefix into
+            # the .spack archive, computing its checksum
+            with open(spackfile_path, 'wb') as spackfile:
+                checksum = _write_prefix_member(
+                    spackfile, tarfile_name, spec.prefix, workdir)
+    finally:
+        shutil.rmtree(tmpdir)
 
     # add sha256 checksum to spec.yaml
     spec_dict = {}
@@ -328,8 +734,13 @@ def build_tarball(spec, outdir, force=False, rel=False, unsigned=False,
     bchecksum['hash_algorithm'] = 'sha256'
     bchecksum['hash'] = checksum
     spec_dict['binary_cache_checksum'] = bchecksum
+    if dedup:
+        spec_dict['binary_cache_manifest'] = tarball_path_name(
+            spec, manifest_ext)
+    spec_dict['full_hash'] = spec.full_hash()
     # Add original install prefix relative to layout root to spec.yaml.
-    # This will be used to determine is the directory layout has changed.
+    # This will be used to determine is the directory layout has
+    # changed.
     buildinfo = {}
     buildinfo['relative_prefix'] = os.path.relpath(
         spec.prefix, spack.store.layout.root)
@@ -339,18 +750,22 @@ def build_tarball(spec, outdir, force=False, rel=False, unsigned=False,
     # sign the tarball and spec file with gpg
     if not unsigned:
         sign_tarball(key, force, specfile_path)
-    # put tarball, spec and signature files in .spack archive
-    with closing(tarfile.open(spackfile_path, 'w')) as tar:
-        tar.add(name='%s' % tarfile_path, arcname='%s' % tarfile_name)
-        tar.add(name='%s' % specfile_path, arcname='%s' % specfile_name)
-        if not unsigned:
-            tar.add(name='%s.asc' % specfile_path,
-                    arcname='%s.asc' % specfile_name)
 
-    # cleanup file moved to archive
-    os.remove(tarfile_path)
-    if not unsigned:
-        os.remove('%s.asc' % specfile_path)
+    # put spec and signature files in .spack archive, after the tarball.
+    # The signature of a manifest stays next to the spec.yaml.
+    if not dedup:
+        with open(spackfile_path, 'r+b') as spackfile:
+            spackfile.seek(0, os.SEEK_END)
+            with closing(tarfile.open(fileobj=spackfile, mode='w')) as tar:
+                tar.add(name='%s' % specfile_path,
+                        arcname='%s' % specfile_name)
+                if not unsigned:
+                    tar.add(name='%s.asc' % specfile_path,
+                            arcname='%s.asc' % specfile_name)
+
+        # cleanup file moved to archive
+        if not unsigned:
+            os.remove('%s.asc' % specfile_path)
 
     # create an index.html for the build_cache directory so specs can be found
     if os.path.exists(indexfile_path):
@@ -359,18 +774,32 @@ def build_tarball(spec, outdir, force=False, rel=False, unsigned=False,
     return None
 
 
-def download_tarball(spec):
-    """
-    Download binary tarball for given package into stage area
-    Return True if successful
+def _tarball_urls(spec):
+    """URLs the binary tarball of ``spec`` may be downloaded from.
+
+    The mirror known to have the binary comes first, if mirrors were
+    already searched.
     """
     mirrors = spack.config.get('mirrors')
     if len(mirrors) == 0:
         tty.die("Please add a spack mirror to allow " +
                 "download of pre-compiled packages.")
     tarball = tarball_path_name(spec, '.spack')
-    for key in mirrors:
-        url = mirrors[key] + "/build_cache/" + tarball
+
+    urls = list(mirrors.values())
+    entry = (_binary_index or {}).get(spec.dag_hash())
+    if entry and entry['mirror'] in urls:
+        urls.remove(entry['mirror'])
+        urls.insert(0, entry['mirror'])
+    return [url + "/build_cache/" + tarball for url in urls]
+
+
+def download_tarball(spec):
+    """
+    Download binary tarball for given package into stage area
+    Return True if successful
+    """
+    for url in _tarball_urls(spec):
         # stage the tarball into standard place
         stage = Stage(url, name="build_cache", keep=True)
         try:
@@ -381,6 +810,101 @@ def download_tarball(spec):
     return None
 
 
+def _fetch_tarball(spec, stage_path):
+    """Download the binary tarball of ``spec`` into ``stage_path``.
+
+    Unlike :func:`download_tarball`, this does not change the working
+    directory, so several tarballs can be downloaded in threads at the
+    same time.  The tarball is saved where :func:`download_tarball`
+    saves it, and is not downloaded again if it is already there.
+    """
+    path = os.path.join(stage_path, tarball_name(spec, '.spack'))
+    if os.path.exists(path):
+        return path
+
+    for url in _tarball_urls(spec):
+        tty.msg("Fetching %s" % url)
+        if _fetch_url(url, path):
+            return path
+
+    raise fs.FetchError(
+        'Download of binary cache file for spec %s failed.' % spec.format(),
+        None)
+
+
+def _fetch_url(url, path):
+    """Download ``url`` to ``path``.  Returns whether it succeeded."""
+    partial_path = path + '.part'
+    try:
+        with closing(read_from_url(url)) as response:
+            with open(partial_path, 'wb') as f:
+                shutil.copyfileobj(response, f, 1024 * 1024)
+    except (URLError, IOError) as e:
+        tty.debug('Fetching {0} failed: {1}'.format(url, e))
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        return False
+    os.rename(partial_path, path)
+    return True
+
+
+def _fetch_manifest(spec, entry, stage_path, unsigned):
+    """Download the manifest of ``spec``, stored with a manifest on the
+    mirror of its binary index ``entry``, and the chunks of its files
+    that are not in ``stage_path`` yet, and check them.
+
+    The chunks are kept in a content-addressed store in ``stage_path``,
+    so chunks shared with other packages are downloaded only once.
+    """
+    cache_url = entry['mirror'].rstrip('/') + '/build_cache/'
+    specfile_name = tarball_name(spec, '.spec.yaml')
+    specfile_path = os.path.join(stage_path, specfile_name)
+    manifest_path = os.path.join(stage_path, tarball_name(spec, manifest_ext))
+
+    # spec.yaml is downloaded again, as it may be in the stage from a
+    # listing of a mirror, and the manifest may have been overwritten
+    tty.msg("Fetching %s" % (cache_url + specfile_name))
+    names = [(specfile_name, specfile_path),
+             (entry['spec']['binary_cache_manifest'], manifest_path)]
+    if not unsigned:
+        names.append((specfile_name + '.asc', specfile_path + '.asc'))
+    for name, path in names:
+        if not _fetch_url(cache_url + name, path):
+            raise fs.FetchError(
+                'Download of %s failed.' % (cache_url + name), None)
+
+    spec_dict = _verify_spec_file(specfile_path, unsigned)
+    if spec_dict['binary_cache_checksum']['hash'] != \
+            checksum_tarball(manifest_path):
+        raise NoChecksumException(
+            "Package manifest failed checksum verification.\n"
+            "It cannot be installed.")
+    _check_relative_prefix(spec, spec_dict)
+
+    manifest = _read_manifest(manifest_path)
+    checksums = []
+    for f in manifest['files']:
+        checksums.extend(f.get('chunks', []))
+    local = content_store.LocalContentStore(
+        os.path.join(stage_path, blobs_directory_name))
+    missing = set(c for c in checksums if not local.contains(c))
+    tty.msg('Fetching %d of %d chunks of %s' % (
+        len(missing), len(set(checksums)), spec.format()))
+    remote = content_store.store_for_url(cache_url + blobs_directory_name)
+    content_store.copy_chunks(remote, local, sorted(missing))
+    return manifest_path
+
+
+def _read_manifest(path):
+    """Read the manifest of a package written by :func:`_write_manifest`."""
+    with closing(gzip.open(path, 'rb')) as f:
+        manifest = json.loads(f.read().decode('utf-8'))
+    if manifest.get('manifest_version') != manifest_version:
+        raise ValueError('Unsupported package manifest version: {0}'.format(
+            manifest.get('manifest_version')))
+    return manifest
+
+
 def make_package_relative(workdir, prefix, allow_root):
     """
     Change paths in binaries to relative paths
@@ -407,9 +931,12 @@ def make_package_placeholder(workdir, allow_root):
     relocate.make_binary_placeholder(cur_path_names, allow_root)
 
 
-def relocate_package(workdir, allow_root):
+def relocate_package(workdir, allow_root, dry_run=False, relocated=None):
     """
-    Relocate the given package
+    Relocate the given package.  With dry_run, only report the files
+    that relocation would change.  relocated maps the text files that
+    were already relocated, relative to workdir, to the number of
+    replacements made in them; they are not searched again.
     """
     buildinfo = read_buildinfo_file(workdir)
     new_path = spack.store.layout.root
@@ -417,16 +944,32 @@ def relocate_package(workdir, allow_root):
     rel = buildinfo.get('relative_rpaths', False)
     if rel:
         return
+    relocated = relocated or {}
 
-    tty.msg("Relocating package from",
+    tty.msg("%s package from" % ("Would relocate" if dry_run else
+                                 "Relocating"),
             "%s to %s." % (old_path, new_path))
     path_names = set()
     for filename in buildinfo['relocate_textfiles']:
         path_name = os.path.join(workdir, filename)
         # Don't add backup files generated by filter_file during install step.
-        if not path_name.endswith('~'):
+        if not path_name.endswith('~') and filename not in relocated:
             path_names.add(path_name)
-    relocate.relocate_text(path_names, old_path, new_path)
+    changed = relocate.relocate_text(path_names, old_path, new_path,
+                                     dry_run=dry_run)
+    for filename, count in relocated.items():
+        if count:
+            changed[os.path.join(workdir, filename)] = count
+    if dry_run:
+        lines = ['%6d  %s' % (changed[p], os.path.relpath(p, workdir))
+                 for p in sorted(changed)]
+        lines += ['  RPATH  %s' % f
+                  for f in sorted(buildinfo['relocate_binaries'])]
+        tty.msg('%d text file(s) and %d binaries would change in %s' % (
+            len(changed), len(buildinfo['relocate_binaries']),
+            os.path.basename(workdir)), *lines)
+        return
+
     # If the binary files in the package were not edited to use
     # relative RPATHs, then the RPATHs need to be relocated
     if not rel:
@@ -438,58 +981,141 @@ def relocate_package(workdir, allow_root):
                                  allow_root)
 
 
-def extract_tarball(spec, filename, allow_root=False, unsigned=False,
-                    force=False):
-    """
-    extract binary tarball for given package into install area
+def _extract_prefix(tar, workdir):
+    """Extract the install prefix in the tarball ``tar``, open as a
+    stream, into ``workdir``.
+
+    Text files listed in the relocation information are relocated as
+    they are extracted, and so are the targets of absolute symlinks into
+    the old install tree.  This needs the relocation information before
+    the files; tarballs written by older versions of Spack have it in no
+    particular place, and files extracted before it are left to
+    :func:`relocate_package`.
+
+    Returns:
+        dict: the text files relocated while extracting, relative to
+        ``workdir``, and the number of replacements in each
     """
-    if os.path.exists(spec.prefix):
-        if force:
-            shutil.rmtree(spec.prefix)
-        else:
-            raise NoOverwriteException(str(spec.prefix))
+    root = os.path.basename(workdir)
+    path = os.path.dirname(workdir)
+    buildinfo_path = os.path.relpath(buildinfo_file_name(workdir), workdir)
+    textfiles, regex, replacements, old_path = set(), None, None, None
+    relocated, directories = {}, []
+
+    for member in tar:
+        name = os.path.normpath(member.name)
+        if name != root and not name.startswith(root + os.sep) or \
+                '..' in name.split(os.sep):
+            raise ValueError(
+                'Unexpected file in binary package: %s' % member.name)
+        filename = os.path.relpath(name, root)
+        target = os.path.join(path, name)
+
+        if member.isdir():
+            # set permissions at the end, in case they make the
+            # directory read-only
+            mkdirp(target)
+            directories.append(member)
+            continue
 
-    tmpdir = tempfile.mkdtemp()
-    stagepath = os.path.dirname(filename)
-    spackfile_name = tarball_name(spec, '.spack')
-    spackfile_path = os.path.join(stagepath, spackfile_name)
-    tarfile_name = tarball_name(spec, '.tar.gz')
-    tarfile_path = os.path.join(tmpdir, tarfile_name)
-    specfile_name = tarball_name(spec, '.spec.yaml')
-    specfile_path = os.path.join(tmpdir, specfile_name)
+        if regex and member.issym() and \
+                member.linkname.startswith(old_path + os.sep):
+            member.linkname = spack.store.layout.root + \
+                member.linkname[len(old_path):]
+
+        if regex and member.isfile() and filename in textfiles:
+            data = tar.extractfile(member).read()
+            data, relocated[filename] = regex.subn(
+                lambda m: replacements[m.group(0)], data)
+            mkdirp(os.path.dirname(target))
+            with open(target, 'wb') as f:
+                f.write(data)
+            os.chmod(target, member.mode)
+            os.utime(target, (member.mtime, member.mtime))
+            continue
+
+        tar.extract(member, path)
+        if filename == buildinfo_path:
+            buildinfo = read_buildinfo_file(workdir)
+            if not buildinfo.get('relative_rpaths', False):
+                old_path = buildinfo['buildpath']
+                textfiles = set(buildinfo['relocate_textfiles'])
+                regex, replacements = relocate.prefix_regex(
+                    [(old_path, spack.store.layout.root)])
+
+    for member in reversed(directories):
+        target = os.path.join(path, os.path.normpath(member.name))
+        os.chmod(target, member.mode)
+        os.utime(target, (member.mtime, member.mtime))
+    return relocated
+
+
+def _checksum_stream(stream):
+    """Return the sha256 checksum of what is read from ``stream``."""
+    block_size = 1024 * 1024
+    hasher = hashlib.sha256()
+    buf = stream.read(block_size)
+    while len(buf) > 0:
+        hasher.update(buf)
+        buf = stream.read(block_size)
+    return hasher.hexdigest()
 
-    with closing(tarfile.open(spackfile_path, 'r')) as tar:
-        tar.extractall(tmpdir)
+
+def _verify_spec_file(specfile_path, unsigned=False):
+    """Check the signature of a spec.yaml file, unless ``unsigned``, and
+    return its content."""
     if not unsigned:
         if os.path.exists('%s.asc' % specfile_path):
             try:
                 Gpg.verify('%s.asc' % specfile_path, specfile_path)
             except Exception as e:
-                shutil.rmtree(tmpdir)
                 tty.die(str(e))
         else:
-            shutil.rmtree(tmpdir)
             raise NoVerifyException(
                 "Package spec file failed signature verification.\n"
                 "Use spack buildcache keys to download "
                 "and install a key for verification from the mirror.")
-    # get the sha256 checksum of the tarball
-    checksum = checksum_tarball(tarfile_path)
 
-    # get the sha256 checksum recorded at creation
-    spec_dict = {}
     with open(specfile_path, 'r') as inputfile:
-        content = inputfile.read()
-        spec_dict = yaml.load(content)
+        return yaml.load(inputfile.read())
+
+
+def _verify_tarball(spec, filename, unsigned=False):
+    """Check the signature and the checksum of a downloaded binary package.
+
+    The tarball of the install prefix is checksummed as it is read from
+    the ``.spack`` file, without extracting it.
+    """
+    tmpdir = tempfile.mkdtemp()
+    tarfile_name = tarball_name(spec, '.tar.gz')
+    specfile_name = tarball_name(spec, '.spec.yaml')
+    specfile_path = os.path.join(tmpdir, specfile_name)
+
+    try:
+        with closing(tarfile.open(filename, 'r')) as tar:
+            names = tar.getnames()
+            for name in (specfile_name, specfile_name + '.asc'):
+                if name in names:
+                    tar.extract(name, tmpdir)
+            checksum = _checksum_stream(tar.extractfile(tarfile_name))
+
+        # get the sha256 checksum recorded at creation
+        spec_dict = _verify_spec_file(specfile_path, unsigned)
+    finally:
+        shutil.rmtree(tmpdir)
     bchecksum = spec_dict['binary_cache_checksum']
 
     # if the checksums don't match don't install
     if bchecksum['hash'] != checksum:
-        shutil.rmtree(tmpdir)
         raise NoChecksumException(
             "Package tarball failed checksum verification.\n"
             "It cannot be installed.")
+    _check_relative_prefix(spec, spec_dict)
+
 
+def _check_relative_prefix(spec, spec_dict):
+    """Check that the binary package of ``spec``, described by the
+    contents of its spec.yaml, can be relocated to its prefix."""
     new_relative_prefix = str(os.path.relpath(spec.prefix,
                                               spack.store.layout.root))
     # if the original relative prefix is in the spec file use it
@@ -498,40 +1124,222 @@ def extract_tarball(spec, filename, allow_root=False, unsigned=False,
     # if the original relative prefix and new relative prefix differ the
     # directory layout has changed and the  buildcache cannot be installed
     if old_relative_prefix != new_relative_prefix:
-        shutil.rmtree(tmpdir)
         msg = "Package tarball was created from an install "
         msg += "prefix with a different directory layout.\n"
         msg += "It cannot be relocated."
         raise NewLayoutException(msg)
 
-    # extract the tarball in a temp directory
-    with closing(tarfile.open(tarfile_path, 'r')) as tar:
-        tar.extractall(path=tmpdir)
-    # the base of the install prefix is used when creating the tarball
-    # so the pathname should be the same now that the directory layout
-    # is confirmed
-    workdir = os.path.join(tmpdir, os.path.basename(spec.prefix))
 
-    # cleanup
-    os.remove(tarfile_path)
-    os.remove(specfile_path)
+def _install_verified_tarball(spec, filename, allow_root=False,
+                              dry_run=False):
+    """Extract and relocate a package checked by :func:`_verify_tarball`
+    into the prefix of ``spec``.  With ``dry_run``, only report what
+    relocation would change.
+
+    The tarball is streamed out of the ``.spack`` file into a directory
+    next to the prefix, which is renamed to the prefix once relocation
+    is done, so the files are written once.
+    """
+    if dry_run:
+        tmpdir = tempfile.mkdtemp()
+    else:
+        mkdirp(os.path.dirname(spec.prefix))
+        tmpdir = tempfile.mkdtemp(prefix='.tmp-',
+                                  dir=os.path.dirname(spec.prefix))
+    workdir = os.path.join(tmpdir, os.path.basename(spec.prefix))
 
     try:
-        relocate_package(workdir, allow_root)
+        with closing(tarfile.open(filename, 'r')) as spackfile:
+            stream = spackfile.extractfile(tarball_name(spec, '.tar.gz'))
+            with closing(tarfile.open(fileobj=stream, mode='r|*')) as tar:
+                relocated = _extract_prefix(tar, workdir)
+        relocate_package(workdir, allow_root, dry_run, relocated)
     except Exception as e:
-        shutil.rmtree(workdir)
+        shutil.rmtree(tmpdir)
         tty.die(str(e))
     # Delay creating spec.prefix until verification is complete
     # and any relocation has been done.
     else:
-        install_tree(workdir, spec.prefix, symlinks=True)
-    finally:
+        if not dry_run:
+            os.rename(workdir, spec.prefix)
         shutil.rmtree(tmpdir)
 
 
+def _write_manifest_files(manifest, store, workdir):
+    """Write the files listed in ``manifest`` to ``workdir``, from the
+    chunks in ``store``.
+
+    The targets of absolute symlinks into the old install tree are
+    relocated, as when a tarball is extracted.
+    """
+    directories, links = [], []
+    for entry in manifest['files']:
+        path = os.path.normpath(entry['path'])
+        if os.path.isabs(path) or '..' in path.split(os.sep):
+            raise ValueError(
+                'Unexpected file in binary package: %s' % entry['path'])
+        target = os.path.join(workdir, path)
+
+        if entry['type'] == 'dir':
+            # set permissions at the end, in case they make the
+            # directory read-only
+            mkdirp(target)
+            directories.append((target, entry['mode']))
+        elif entry['type'] == 'link':
+            links.append((target, entry['target']))
+        else:
+            mkdirp(os.path.dirname(target))
+            content_store.write_file(store, entry['chunks'], target)
+            os.chmod(target, entry['mode'])
+            os.utime(target, (entry['mtime'], entry['mtime']))
+
+    buildinfo = read_buildinfo_file(workdir)
+    old_path = buildinfo['buildpath']
+    for target, link in links:
+        if not buildinfo.get('relative_rpaths', False) and \
+                link.startswith(old_path + os.sep):
+            link = spack.store.layout.root + link[len(old_path):]
+        mkdirp(os.path.dirname(target))
+        os.symlink(link, target)
+
+    for target, mode in reversed(directories):
+        os.chmod(target, mode)
+
+
+def _install_verified_manifest(spec, filename, allow_root=False,
+                               dry_run=False):
+    """Write and relocate a package checked by :func:`_fetch_manifest`
+    into the prefix of ``spec``, from its manifest ``filename`` and the
+    chunks next to it.  With ``dry_run``, only report what relocation
+    would change.
+
+    As for tarballs, the package is written to a directory next to the
+    prefix, which is renamed to the prefix once relocation is done.
+    """
+    store = content_store.LocalContentStore(
+        os.path.join(os.path.dirname(filename), blobs_directory_name))
+    if dry_run:
+        tmpdir = tempfile.mkdtemp()
+    else:
+        mkdirp(os.path.dirname(spec.prefix))
+        tmpdir = tempfile.mkdtemp(prefix='.tmp-',
+                                  dir=os.path.dirname(spec.prefix))
+    workdir = os.path.join(tmpdir, os.path.basename(spec.prefix))
+
+    try:
+        _write_manifest_files(_read_manifest(filename), store, workdir)
+        relocate_package(workdir, allow_root, dry_run)
+    except Exception as e:
+        shutil.rmtree(tmpdir)
+        tty.die(str(e))
+    else:
+        if not dry_run:
+            os.rename(workdir, spec.prefix)
+        shutil.rmtree(tmpdir)
+
+
+def extract_tarball(spec, filename, allow_root=False, unsigned=False,
+                    force=False):
+    """
+    extract binary tarball for given package into install area
+    """
+    if os.path.exists(spec.prefix):
+        if force:
+            shutil.rmtree(spec.prefix)
+        else:
+            raise NoOverwriteException(str(spec.prefix))
+
+    _verify_tarball(spec, filename, unsigned)
+    _install_verified_tarball(spec, filename, allow_root)
+
+
 #: Internal cache for get_specs
 _cached_specs = None
 
+#: Internal cache for binary_index
+_binary_index = None
+
+
+def _mirror_specs(url, force=False):
+    """Build cache entries of a mirror without index, by DAG hash.
+
+    This lists (or spiders) the build cache and fetches every spec.yaml.
+    """
+    path = str(spack.architecture.sys_type())
+    urls = set()
+    if url.startswith('file'):
+        mirror = url.replace('file://', '') + '/build_cache'
+        tty.msg("Finding buildcaches in %s" % mirror)
+        files = os.listdir(mirror)
+        for file in files:
+            if re.search('spec.yaml', file):
+                link = 'file://' + mirror + '/' + file
+                urls.add(link)
+    else:
+        tty.msg("Finding buildcaches on %s" % url)
+        p, links = spider(url + "/build_cache")
+        for link in links:
+            if re.search("spec.yaml", link) and re.search(path, link):
+                urls.add(link)
+
+    entries = {}
+    for link in urls:
+        with Stage(link, name="build_cache", keep=True) as stage:
+            if force and os.path.exists(stage.save_filename):
+                os.remove(stage.save_filename)
+            if not os.path.exists(stage.save_filename):
+                try:
+                    stage.fetch()
+                except fs.FetchError:
+                    continue
+            with open(stage.save_filename, 'r') as f:
+                spec_dict = yaml.load(f.read())
+            spec = spack.spec.Spec.from_dict(spec_dict)
+            spackfile = None
+            if not spec_dict.get('binary_cache_manifest'):
+                spackfile = tarball_path_name(spec, '.spack')
+            entries[spec.dag_hash()] = {
+                'spec': spec_dict,
+                'spackfile': spackfile,
+            }
+    return entries
+
+
+def binary_index(force=False):
+    """Build cache entries of the specs on all mirrors, by DAG hash.
+
+    Each entry holds the contents of the spec.yaml of a binary package,
+    the path of its .spack file in the build cache (None for packages
+    stored with a manifest), and the URL of the mirror it is on (the
+    first configured mirror that has it).  Checking
+    whether a spec has a binary is a lookup by its DAG hash.
+
+    Args:
+        force (bool): fetch the index of every mirror again, instead of
+            using the copies cached in the misc cache
+    """
+    global _binary_index
+
+    if _binary_index is not None and not force:
+        return _binary_index
+
+    index = {}
+    mirrors = spack.config.get('mirrors')
+    for name, url in reversed(list(mirrors.items())):
+        mirror_index = _mirror_index(url, force)
+        if mirror_index is not None:
+            entries = mirror_index['specs']
+        else:
+            entries = _mirror_specs(url, force)
+
+        for dag_hash, entry in entries.items():
+            entry = dict(entry)
+            entry['mirror'] = url
+            index[dag_hash] = entry
+
+    _binary_index = index
+    return index
+
 
 def get_specs(force=False):
     """
@@ -549,43 +1357,261 @@ def get_specs(force=False):
         return {}
 
     path = str(spack.architecture.sys_type())
-    urls = set()
-    for key in mirrors:
-        url = mirrors[key]
-        if url.startswith('file'):
-            mirror = url.replace('file://', '') + '/build_cache'
-            tty.msg("Finding buildcaches in %s" % mirror)
-            files = os.listdir(mirror)
-            for file in files:
-                if re.search('spec.yaml', file):
-                    link = 'file://' + mirror + '/' + file
-                    urls.add(link)
+    _cached_specs = set()
+    for entry in binary_index(force).values():
+        # read the spec from the build cache entry. All specs
+        # in build caches are concrete (as they are built) so
+        # we need to mark this spec concrete on read-in.
+        spec = spack.spec.Spec.from_dict(entry['spec'])
+        spec._mark_concrete()
+        if entry['mirror'].startswith('file') or (
+                str(spec.architecture) == path):
+            _cached_specs.add(spec)
+
+    return _cached_specs
+
+
+#: Number of binary tarballs :func:`install_from_cache` downloads at once
+fetch_connections = 8
+
+#: Seconds between checks on packages being installed by another process
+busy_interval = 1.0
+
+
+def _call(function, *args):
+    """Run ``function`` in a worker thread of :func:`install_from_cache`.
+
+    Returns a tuple of its result and an error message, or ``None`` if
+    it succeeded.
+    """
+    try:
+        return function(*args), None
+    except SystemExit:
+        # tty.die() already printed the error
+        return None, 'see the error above'
+    except Exception as e:
+        return None, str(e) or type(e).__name__
+
+
+def _fetch_and_verify(spec, stage_path, unsigned):
+    entry = binary_index().get(spec.dag_hash(), {})
+    if entry.get('spec', {}).get('binary_cache_manifest'):
+        return _fetch_manifest(spec, entry, stage_path, unsigned)
+    filename = _fetch_tarball(spec, stage_path)
+    _verify_tarball(spec, filename, unsigned)
+    return filename
+
+
+def _install_verified(spec, filename, allow_root, force, dry_run):
+    if os.path.exists(spec.prefix) and not dry_run:
+        if force:
+            shutil.rmtree(spec.prefix)
         else:
-            tty.msg("Finding buildcaches on %s" % url)
-            p, links = spider(url + "/build_cache")
-            for link in links:
-                if re.search("spec.yaml", link) and re.search(path, link):
-                    urls.add(link)
+            raise NoOverwriteException(str(spec.prefix))
 
-    _cached_specs = set()
-    for link in urls:
-        with Stage(link, name="build_cache", keep=True) as stage:
-            if force and os.path.exists(stage.save_filename):
-                os.remove(stage.save_filename)
-            if not os.path.exists(stage.save_filename):
-                try:
-                    stage.fetch()
-                except fs.FetchError:
+    if not dry_run:
+        tty.msg('Installing buildcache for spec %s' % spec.format())
+    if filename.endswith(manifest_ext):
+        _install_verified_manifest(spec, filename, allow_root, dry_run)
+    else:
+        _install_verified_tarball(spec, filename, allow_root, dry_run)
+
+
+def install_from_cache(specs, allow_root=False, unsigned=False, force=False,
+                       explicit=True, jobs=None, connections=None,
+                       hooks=False, dry_run=False):
+    """Install binary packages of ``specs`` and of the link and run
+    dependencies they need from the build caches on the mirrors.
+
+    Installation is pipelined.  The tarballs of all the packages are
+    downloaded up to ``connections`` at a time, and the downloading
+    threads verify their signatures and checksums.  As soon as a package
+    is verified and its dependencies are installed, one of ``jobs``
+    threads extracts and relocates it, so packages that do not depend on
+    each other are installed at the same time.  The calling thread adds
+    each package to the database once it is in place.
+
+    For packages stored with a manifest, only the chunks of their files
+    that were not downloaded for other packages are fetched.
+
+    Like :class:`spack.installer.DagInstaller`, this claims each package
+    by taking its prefix write lock without waiting.  Packages that
+    another process is installing are set aside and checked every
+    :data:`busy_interval` seconds until their lock is released; they are
+    then either installed already, or installed from here.
+
+    Args:
+        specs (list): concrete specs to install
+        allow_root (bool): allow the install root string in binaries
+            after relocation
+        unsigned (bool): do not check the signatures of the packages
+        force (bool): install packages again if they are installed
+        explicit (bool): whether ``specs`` are explicitly installed;
+            their dependencies never are
+        jobs (int): number of packages extracted at the same time.
+            Defaults to ``config:build_jobs``
+        connections (int): number of tarballs downloaded at the same
+            time.  Defaults to :data:`fetch_connections`
+        hooks (bool): run the post-install hooks of each package
+        dry_run (bool): download, verify and extract the packages, and
+            report the files relocation would change, but do not
+            install them
+
+    Returns:
+        list: the specs that were installed, dependencies first
+
+    Raises:
+        DagInstallError: if some packages could not be installed.  The
+            packages that do not depend on them are installed anyway.
+    """
+    deptype = ('link', 'run')
+    roots = set(s.dag_hash() for s in specs)
+
+    # packages to install, in post-order
+    order, nodes = [], {}
+    for spec in specs:
+        for node in spec.traverse(order='post', deptype=deptype):
+            key = node.dag_hash()
+            if key in nodes or node.external or node.virtual:
+                continue
+            if not force and node.package.installed:
+                continue
+            order.append(key)
+            nodes[key] = node
+
+    if not order:
+        return []
+
+    waiting, dependents = {}, dict((key, []) for key in order)
+    for key in order:
+        deps = set(d.dag_hash()
+                   for d in nodes[key].dependencies(deptype=deptype))
+        waiting[key] = set(k for k in deps if k in nodes)
+        for dep in waiting[key]:
+            dependents[dep].append(key)
+
+    # All tarballs are staged in the same directory; create it before
+    # the downloads start.
+    stage = Stage(_tarball_urls(nodes[order[0]])[0],
+                  name="build_cache", keep=True)
+    stage.create()
+
+    jobs = jobs or spack.config.get(
+        'config:build_jobs') or multiprocessing.cpu_count()
+    fetch_pool = ThreadPool(connections or fetch_connections)
+    install_pool = ThreadPool(jobs)
+    events = queue.Queue()
+
+    index = binary_index()
+    installed, failed, messages = [], [], []
+    verified = {}
+    outstanding = set()
+
+    # Claims are held until the end: releasing a lock closes its file,
+    # which drops every POSIX lock this process holds on that file.
+    claims, busy, installed_elsewhere = [], {}, set()
+
+    def start(pool, step, key, function, *args):
+        outstanding.add(key)
+        pool.apply_async(
+            _call, (function,) + args,
+            callback=lambda result: events.put((step, key, result)))
+
+    def claim(key):
+        lock = spack.store.db.prefix_lock(nodes[key])
+        try:
+            lock.acquire_write(timeout=0)
+        except LockTimeoutError:
+            return False
+        claims.append(lock)
+        return True
+
+    def fetch(key):
+        if key not in index:
+            failed.append(nodes[key])
+            messages.append('no binary package on any mirror')
+            return
+        start(fetch_pool, 'verified', key,
+              _fetch_and_verify, nodes[key], stage.path, unsigned)
+
+    def release_dependents(key):
+        for dependent in dependents[key]:
+            waiting[dependent].discard(key)
+
+    try:
+        for key in order:
+            if claim(key):
+                fetch(key)
+            else:
+                tty.msg('{0} is being installed by another process, '
+                        'waiting for it'.format(nodes[key].name))
+                busy[key] = time.time()
+
+        while outstanding or busy:
+            try:
+                event = events.get(True, busy_interval if busy else None)
+            except queue.Empty:
+                event = None
+
+            if event is not None:
+                step, key, (result, error) = event
+                outstanding.discard(key)
+                spec = nodes[key]
+
+                if error is not None:
+                    failed.append(spec)
+                    messages.append(error)
+                elif step == 'verified':
+                    verified[key] = result
+                else:
+                    if not dry_run:
+                        spack.store.db.add(
+                            spec, spack.store.layout,
+                            explicit=explicit and key in roots)
+                    if hooks and not dry_run:
+                        spack.hooks.post_install(spec)
+                    installed.append(spec)
+                    release_dependents(key)
+
+            # check on the packages other processes were installing
+            now = time.time()
+            for key, last_check in list(busy.items()):
+                if now - last_check < busy_interval:
                     continue
-            with open(stage.save_filename, 'r') as f:
-                # read the spec from the build cache file. All specs
-                # in build caches are concrete (as they are built) so
-                # we need to mark this spec concrete on read-in.
-                spec = spack.spec.Spec.from_yaml(f)
-                spec._mark_concrete()
-                _cached_specs.add(spec)
+                if not claim(key):
+                    busy[key] = now
+                    continue
+                del busy[key]
+                with spack.store.db.read_transaction():
+                    done = nodes[key].package.installed
+                if done:
+                    tty.msg('{0} was installed by another process'.format(
+                        nodes[key].name))
+                    installed_elsewhere.add(key)
+                    release_dependents(key)
+                else:
+                    fetch(key)
 
-    return _cached_specs
+            # extract the packages whose dependencies are all in place
+            for ready in [k for k in verified if not waiting[k]]:
+                start(install_pool, 'installed', ready, _install_verified,
+                      nodes[ready], verified.pop(ready), allow_root, force,
+                      dry_run)
+    finally:
+        fetch_pool.terminate()
+        install_pool.terminate()
+        for lock in claims:
+            lock.release_write()
+
+    if failed:
+        done = set(s.dag_hash() for s in installed + failed)
+        done.update(installed_elsewhere)
+        skipped = [nodes[key] for key in order if key not in done]
+        # NOTE: we import spack.installer here to avoid init order cycles
+        from spack.installer import DagInstallError
+        raise DagInstallError(failed, skipped, messages)
+
+    return installed
 
 
 def get_keys(install=False, trust=False, force=False):
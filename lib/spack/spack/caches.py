@@ -38,7 +38,8 @@ def _misc_cache():
     """The ``misc_cache`` is Spack's cache for small data.
 
     Currently the ``misc_cache`` stores indexes for virtual dependency
-    providers and for which packages provide which tags.
+    providers, for which packages provide which tags, for package
+    metadata and for reverse dependencies, as well as concretized specs.
     """
     path = spack.config.get('config:misc_cache')
     if not path:
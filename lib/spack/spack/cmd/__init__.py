@@ -31,14 +31,14 @@ import llnl.util.tty as tty
 from llnl.util.lang import attr_setdefault, index_by
 from llnl.util.tty.colify import colify
 from llnl.util.tty.color import colorize
-from llnl.util.filesystem import working_dir
 
-import spack.config
 import spack.paths
-import spack.spec
-import spack.store
 from spack.error import SpackError
 
+# Modules that are slow to import, like spack.config, spack.spec and
+# spack.store, are imported by the functions using them, so that commands
+# like `spack help` start fast.
+
 
 #
 # Settings for commands that modify configuration
@@ -49,6 +49,7 @@ def default_modify_scope():
     Commands that modify configuration by default modify the *highest*
     priority scope.
     """
+    import spack.config
     return spack.config.config.highest_precedence_scope().name
 
 
@@ -155,13 +156,23 @@ def parse_specs(args, **kwargs):
     concretize = kwargs.get('concretize', False)
     normalize = kwargs.get('normalize', False)
     tests = kwargs.get('tests', False)
+    unify = kwargs.get('unify', False)
+    use_cache = kwargs.get('use_cache', None)
+    jobs = kwargs.get('jobs', 1)
+
+    # imported here, as importing the concretizer pulls in the compilers
+    import spack.concretize
+    import spack.spec
 
     try:
         specs = spack.spec.parse(args)
-        for spec in specs:
-            if concretize:
-                spec.concretize(tests=tests)  # implies normalize
-            elif normalize:
+        if concretize:
+            # implies normalize
+            specs = spack.concretize.concretize_specs(
+                specs, tests=tests, unify=unify, use_cache=use_cache,
+                jobs=jobs)
+        elif normalize:
+            for spec in specs:
                 spec.normalize(tests=tests)
 
         return specs
@@ -197,6 +208,7 @@ def elide_list(line_list, max_num=10):
 
 
 def disambiguate_spec(spec):
+    import spack.store
     matching_specs = spack.store.db.query(spec)
     if not matching_specs:
         tty.die("Spec '%s' matches no installed packages." % spec)
@@ -248,6 +260,8 @@ def display_specs(specs, args=None, **kwargs):
         variants (bool): Show variants with specs
 
     """
+    import spack.spec
+
     def get_arg(name, default=None):
         """Prefer kwargs, then args, then default."""
         if name in kwargs:
@@ -345,5 +359,6 @@ def display_specs(specs, args=None, **kwargs):
 
 def spack_is_git_repo():
     """Ensure that this instance of Spack is a git clone."""
+    from llnl.util.filesystem import working_dir
     with working_dir(spack.paths.prefix):
         return os.path.isdir('.git')
@@ -27,6 +27,7 @@ import argparse
 import llnl.util.tty as tty
 
 import spack.cmd
+import spack.store
 from spack.filesystem_view import YamlFilesystemView
 
 description = "activate a package extension"
@@ -27,6 +27,7 @@ import llnl.util.tty as tty
 import spack.repo
 import spack.spec
 import spack.cmd.common.arguments as arguments
+import spack.store
 
 description = "Bootstrap packages needed for spack to run smoothly"
 section = "admin"
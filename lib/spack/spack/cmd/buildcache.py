@@ -22,9 +22,12 @@
 # along with this program; if not, write to the Free Software Foundation,
 # Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
 ##############################################################################
+from __future__ import print_function
+
 import argparse
 
 import llnl.util.tty as tty
+from llnl.util.tty.color import colorize, cescape
 
 import spack.cmd
 import spack.repo
@@ -59,6 +62,10 @@ def setup_parser(subparser):
     create.add_argument('-d', '--directory', metavar='directory',
                         type=str, default='.',
                         help="directory in which to save the tarballs.")
+    create.add_argument('--dedup', action='store_true',
+                        help="store the files of the packages once by "
+                             "content, in place of tarballs, so that files "
+                             "shared between packages are stored once.")
     create.add_argument(
         'packages', nargs=argparse.REMAINDER,
         help="specs of packages to create buildcache for")
@@ -75,6 +82,18 @@ def setup_parser(subparser):
     install.add_argument('-u', '--unsigned', action='store_true',
                          help="install unsigned buildcache" +
                               " tarballs for testing")
+    install.add_argument('-j', '--jobs', type=int, default=None,
+                         help="extract and relocate up to this many "
+                              "packages at the same time. Default is "
+                              "config:build_jobs.")
+    install.add_argument('--connections', type=int, default=None,
+                         help="download up to this many tarballs at the "
+                              "same time (default %d)." %
+                              bindist.fetch_connections)
+    install.add_argument('--dry-run', action='store_true',
+                         help="download and unpack the packages, and report "
+                              "the files relocation would change, without "
+                              "installing anything.")
     install.add_argument(
         'packages', nargs=argparse.REMAINDER,
         help="specs of packages to install biuldache for")
@@ -99,6 +118,23 @@ def setup_parser(subparser):
                         help="force new download of keys")
     dlkeys.set_defaults(func=getkeys)
 
+    check = subparsers.add_parser('check', help=check_binaries.__doc__)
+    check.add_argument('-f', '--force', action='store_true',
+                       help="fetch the build cache indexes of all mirrors "
+                            "again.")
+    check.add_argument(
+        'packages', nargs=argparse.REMAINDER,
+        help="specs of packages to check")
+    check.set_defaults(func=check_binaries)
+
+    update_index = subparsers.add_parser(
+        'update-index', help=updateindex.__doc__)
+    update_index.add_argument('-d', '--directory', metavar='directory',
+                              type=str, default='.',
+                              help="directory containing the build_cache "
+                                   "directory to index.")
+    update_index.set_defaults(func=updateindex)
+
 
 def find_matching_specs(pkgs, allow_multiple_matches=False, force=False):
     """Returns a list of specs matching the not necessarily
@@ -222,7 +258,11 @@ def createtarball(args):
     for spec in specs:
         tty.msg('creating binary cache file for package %s ' % spec.format())
         bindist.build_tarball(spec, outdir, args.force, args.rel,
-                              args.unsigned, args.allow_root, signkey)
+                              args.unsigned, args.allow_root, signkey,
+                              dedup=args.dedup)
+
+    tty.msg('updating index of %s/build_cache' % outdir)
+    bindist.generate_package_index(outdir)
 
 
 def installtarball(args):
@@ -232,32 +272,31 @@ def installtarball(args):
                 " at least one package spec argument")
     pkgs = set(args.packages)
     matches = match_downloaded_specs(pkgs, args.multiple, args.force)
-
-    for match in matches:
-        install_tarball(match, args)
+    install_tarballs(matches, args)
 
 
 def install_tarball(spec, args):
-    s = spack.spec.Spec(spec)
-    if s.external or s.virtual:
-        tty.warn("Skipping external or virtual package %s" % spec.format())
-        return
-    for d in s.dependencies(deptype=('link', 'run')):
-        tty.msg("Installing buildcache for dependency spec %s" % d)
-        install_tarball(d, args)
-    package = spack.repo.get(spec)
-    if s.concrete and package.installed and not args.force:
-        tty.warn("Package for spec %s already installed." % spec.format())
-    else:
-        tarball = bindist.download_tarball(spec)
-        if tarball:
-            tty.msg('Installing buildcache for spec %s' % spec.format())
-            bindist.extract_tarball(spec, tarball, args.allow_root,
-                                    args.unsigned, args.force)
-            spack.store.store.reindex()
+    install_tarballs([spec], args)
+
+
+def install_tarballs(specs, args):
+    to_install = []
+    for spec in specs:
+        if spec.external or spec.virtual:
+            tty.warn("Skipping external or virtual package %s" %
+                     spec.format())
+        elif spec.concrete and spack.repo.get(spec).installed and \
+                not args.force:
+            tty.warn("Package for spec %s already installed." %
+                     spec.format())
         else:
-            tty.die('Download of binary cache file for spec %s failed.' %
-                    spec.format())
+            to_install.append(spec)
+
+    if to_install:
+        bindist.install_from_cache(
+            to_install, allow_root=args.allow_root, unsigned=args.unsigned,
+            force=args.force, jobs=args.jobs, connections=args.connections,
+            dry_run=args.dry_run)
 
 
 def listspecs(args):
@@ -288,6 +327,51 @@ def getkeys(args):
     bindist.get_keys(args.install, args.trust, args.force)
 
 
+def check_binaries(args):
+    """check which packages of specs would be installed from build caches"""
+    if not args.packages:
+        tty.die("build cache check requires at least one package spec")
+
+    specs = spack.cmd.parse_specs(args.packages, concretize=True)
+    index = bindist.binary_index(args.force)
+
+    counts = {'installed': 0, 'fetch': 0, 'build': 0}
+    seen = set()
+    for spec in specs:
+        tty.msg(spec.format())
+        for node in spec.traverse(order='post'):
+            dag_hash = node.dag_hash()
+            if dag_hash in seen:
+                continue
+            seen.add(dag_hash)
+
+            if node.package.installed:
+                status, where = '@g{installed}', ''
+                counts['installed'] += 1
+            elif dag_hash in index:
+                status, where = '@c{fetch}    ', index[dag_hash]['mirror']
+                counts['fetch'] += 1
+            else:
+                status, where = '@y{build}    ', ''
+                counts['build'] += 1
+
+            line = '    %s  @K{%s}  %s' % (
+                status, node.dag_hash(7), cescape(node.format('$_$@$%@')))
+            if where:
+                line += '  ' + cescape(where)
+            print(colorize(line))
+
+    tty.msg('%d installed, %d to fetch from build caches, %d to build' % (
+        counts['installed'], counts['fetch'], counts['build']))
+
+
+def updateindex(args):
+    """update the index of specs in a build cache directory"""
+    index = bindist.generate_package_index(args.directory)
+    tty.msg('Indexed %d specs in %s/build_cache' % (
+        len(index['specs']), args.directory))
+
+
 def buildcache(parser, args):
     if args.func:
         args.func(args)
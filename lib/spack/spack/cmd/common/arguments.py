@@ -121,6 +121,10 @@ _arguments['jobs'] = Args(
     '-j', '--jobs', action='store', type=int, dest='jobs',
     help="explicitely set number of make jobs. default is #cpus")
 
+_arguments['unify'] = Args(
+    '--unify', action='store_true', default=False,
+    help='reuse the same dependencies across the given specs where possible')
+
 _arguments['tags'] = Args(
     '-t', '--tags', action='append',
     help='filter a package query by tags')
@@ -29,9 +29,11 @@ import sys
 from six import iteritems
 
 import llnl.util.tty as tty
+# spack.spec has to be loaded before spack.compilers, which imports it
+# back while it is being initialized.
+import spack.spec
 import spack.compilers
 import spack.config
-import spack.spec
 from llnl.util.lang import index_by
 from llnl.util.tty.colify import colify
 from llnl.util.tty.color import colorize
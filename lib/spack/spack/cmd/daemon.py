@@ -0,0 +1,121 @@
+##############################################################################
+# Copyright (c) 2013-2018, Lawrence Livermore National Security, LLC.
+# Produced at the Lawrence Livermore National Laboratory.
+#
+# This file is part of Spack.
+# Created by Todd Gamblin, tgamblin@llnl.gov, All rights reserved.
+# LLNL-CODE-647188
+#
+# For details, see https://github.com/spack/spack
+# Please also see the NOTICE and LICENSE files for our notice and the LGPL.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License (as
+# published by the Free Software Foundation) version 2.1, February 1999.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the IMPLIED WARRANTY OF
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the terms and
+# conditions of the GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+##############################################################################
+import os
+import socket
+import sys
+import time
+
+import llnl.util.tty as tty
+
+import spack.daemon
+
+description = "keep spack loaded in a server, to speed up read-only commands"
+section = "admin"
+level = "long"
+
+
+def setup_parser(subparser):
+    sp = subparser.add_subparsers(metavar='SUBCOMMAND', dest='daemon_command')
+
+    start = sp.add_parser('start', help=daemon_start.__doc__)
+    start.add_argument(
+        '-f', '--foreground', action='store_true',
+        help="serve commands without detaching from the terminal")
+
+    sp.add_parser('stop', help=daemon_stop.__doc__)
+    sp.add_parser('status', help=daemon_status.__doc__)
+
+
+def daemon_start(args):
+    """start a daemon for this spack, if none is running"""
+    if not hasattr(socket.socket, 'sendmsg'):
+        tty.die('spack daemon requires Python 3.3 or later')
+
+    running = spack.daemon.status()
+    if running:
+        tty.msg('A spack daemon is already running with pid {0}'.format(
+            running['pid']))
+        return
+
+    daemon = spack.daemon.Daemon(spack.daemon.socket_path())
+    daemon.warm_up()
+    daemon.listen()
+
+    if not args.foreground:
+        if os.fork():
+            # wait until the daemon serves commands
+            for i in range(100):
+                running = spack.daemon.status()
+                if running:
+                    tty.msg('Started a spack daemon with pid {0}'.format(
+                        running['pid']))
+                    return
+                time.sleep(0.1)
+            tty.die('The spack daemon did not start')
+
+        os.setsid()
+        devnull = os.open(os.devnull, os.O_RDWR)
+        for fd in (0, 1, 2):
+            os.dup2(devnull, fd)
+
+    if daemon.serve():
+        # files changed: start over, with a fresh spack
+        argv = [sys.executable] + sys.argv
+        if '--foreground' not in argv:
+            argv.append('--foreground')
+        os.execv(sys.executable, argv)
+
+    if not args.foreground:
+        os._exit(0)
+
+
+def daemon_stop(args):
+    """stop the daemon of this spack"""
+    if spack.daemon.stop():
+        tty.msg('Stopped the spack daemon')
+    else:
+        tty.msg('No spack daemon is running')
+
+
+def daemon_status(args):
+    """show whether a daemon is running for this spack"""
+    running = spack.daemon.status()
+    if not running:
+        tty.msg('No spack daemon is running')
+        return
+
+    tty.msg('A spack daemon is running with pid {0}'.format(running['pid']),
+            'socket:   {0}'.format(running['socket']),
+            'uptime:   {0:.0f}s'.format(running['uptime']),
+            'commands: {0}'.format(running['requests']))
+
+
+def daemon(parser, args):
+    action = {
+        'start': daemon_start,
+        'stop': daemon_stop,
+        'status': daemon_status
+    }
+    action[args.daemon_command](args)
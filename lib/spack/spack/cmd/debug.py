@@ -31,6 +31,7 @@ import llnl.util.tty as tty
 from llnl.util.filesystem import working_dir
 
 import spack.paths
+import spack.store
 from spack.util.executable import which
 
 description = "debugging commands for troubleshooting Spack"
@@ -86,6 +87,8 @@ def create_db_tarball(args):
     wd = os.path.dirname(str(spack.store.root))
     with working_dir(wd):
         files = [spack.store.db._index_path]
+        if os.path.exists(spack.store.db._journal_path):
+            files.append(spack.store.db._journal_path)
         files += glob('%s/*/*/*/.spack/spec.yaml' % base)
         files = [os.path.relpath(f) for f in files]
 
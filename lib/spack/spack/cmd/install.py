@@ -35,7 +35,11 @@ import spack.build_environment
 import spack.cmd
 import spack.cmd.common.arguments as arguments
 import spack.fetch_strategy
+import spack.installer
 import spack.report
+import spack.config
+import spack.spec
+import spack.store
 from spack.error import SpackError
 
 
@@ -56,6 +60,19 @@ alternatively one can decide to install only the package or only
 the dependencies"""
     )
     arguments.add_common_arguments(subparser, ['jobs'])
+    subparser.add_argument(
+        '--concurrent-builds', type=int, default=None,
+        help="build up to this many independent dependencies at once. "
+        "the -j budget is split among them")
+    subparser.add_argument(
+        '--keep-going', action='store_true',
+        help="with --concurrent-builds, keep installing what does not "
+        "depend on a failed package instead of stopping")
+    subparser.add_argument(
+        '--cooperative', action='store_true',
+        help="share the work with other spack processes installing into "
+        "the same store: packages they are building are waited for "
+        "instead of built again")
     subparser.add_argument(
         '--overwrite', action='store_true',
         help="reinstall an existing spec, even if it has dependents")
@@ -91,6 +108,10 @@ the dependencies"""
 
     cd_group = subparser.add_mutually_exclusive_group()
     arguments.add_common_arguments(cd_group, ['clean', 'dirty'])
+    arguments.add_common_arguments(subparser, ['unify'])
+    subparser.add_argument(
+        '--concretize-jobs', type=int, default=1, metavar='N',
+        help="concretize up to N specs at once, in separate processes")
 
     subparser.add_argument(
         'package',
@@ -140,6 +161,21 @@ def default_log_file(spec):
     return fs.os.path.join(dirname, basename)
 
 
+def install_concurrently(specs, kwargs):
+    """Install the DAGs of ``specs`` with a ``DagInstaller``, translating
+    the ``do_install`` arguments in ``kwargs``."""
+    kwargs = dict(kwargs)
+    kwargs.pop('install_deps', None)
+    installer = spack.installer.DagInstaller(
+        specs,
+        explicit=kwargs.pop('explicit', False),
+        jobs=kwargs.pop('make_jobs', None),
+        concurrent_builds=kwargs.pop('concurrent_builds', None),
+        fail_fast=not kwargs.pop('keep_going', False),
+        **kwargs)
+    installer.install()
+
+
 def install_spec(cli_args, kwargs, spec):
     # Do the actual installation
     try:
@@ -147,11 +183,17 @@ def install_spec(cli_args, kwargs, spec):
             # Install dependencies as-if they were installed
             # for root (explicit=False in the DB)
             kwargs['explicit'] = False
-            for s in spec.dependencies():
-                s.package.do_install(**kwargs)
+            if cli_args.cooperative or kwargs.get('concurrent_builds', 1) > 1:
+                install_concurrently(spec.dependencies(), kwargs)
+            else:
+                for s in spec.dependencies():
+                    s.package.do_install(**kwargs)
         else:
             kwargs['explicit'] = True
-            spec.package.do_install(**kwargs)
+            if cli_args.cooperative:
+                install_concurrently([spec], kwargs)
+            else:
+                spec.package.do_install(**kwargs)
 
     except spack.build_environment.InstallError as e:
         if cli_args.show_log_on_error:
@@ -173,6 +215,11 @@ def install(parser, args, **kwargs):
         if args.jobs <= 0:
             tty.die("The -j option must be a positive integer!")
 
+    concurrent_builds = args.concurrent_builds or spack.config.get(
+        'config:concurrent_builds', 1)
+    if concurrent_builds <= 0:
+        tty.die("The --concurrent-builds option must be a positive integer!")
+
     if args.no_checksum:
         spack.config.set('config:checksum', False, scope='command_line')
 
@@ -185,6 +232,8 @@ def install(parser, args, **kwargs):
         'install_source': args.install_source,
         'install_deps': 'dependencies' in args.things_to_install,
         'make_jobs': args.jobs,
+        'concurrent_builds': concurrent_builds,
+        'keep_going': args.keep_going,
         'verbose': args.verbose,
         'fake': args.fake,
         'dirty': args.dirty,
@@ -211,7 +260,8 @@ def install(parser, args, **kwargs):
 
     try:
         specs = spack.cmd.parse_specs(
-            args.package, concretize=True, tests=tests)
+            args.package, concretize=True, tests=tests, unify=args.unify,
+            jobs=args.concretize_jobs)
     except SpackError as e:
         reporter.concretization_report(e.message)
         raise
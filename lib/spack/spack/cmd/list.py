@@ -37,6 +37,9 @@ from six import StringIO
 import llnl.util.tty as tty
 from llnl.util.tty.colify import colify
 
+# spack.spec has to be loaded before spack.dependency, which imports it
+# back while it is being initialized.
+import spack.spec
 import spack.dependency
 import spack.repo
 import spack.cmd.common.arguments as arguments
@@ -96,9 +99,9 @@ def filter_by_name(pkgs, args):
                 if f.match(p):
                     return True
 
-                pkg = spack.repo.get(p)
-                if pkg.__doc__:
-                    return f.match(pkg.__doc__)
+                doc = spack.repo.path.package_metadata(p).doc
+                if doc:
+                    return f.match(doc)
                 return False
         else:
             def match(p, f):
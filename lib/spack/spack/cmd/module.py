@@ -29,6 +29,7 @@ import llnl.util.tty as tty
 import spack.cmd.modules.dotkit
 import spack.cmd.modules.lmod
 import spack.cmd.modules.tcl
+import spack.modules
 
 description = "manipulate module files"
 section = "environment"
@@ -28,6 +28,7 @@ import os
 import llnl.util.filesystem
 import spack.cmd.common.arguments
 import spack.cmd.modules
+import spack.modules
 
 
 def add_command(parser, command_dict):
@@ -29,5 +29,15 @@ section = "admin"
 level = "long"
 
 
+def setup_parser(subparser):
+    subparser.add_argument(
+        '--compact', action='store_true',
+        help="fold the database journal into the index without rescanning "
+             "the install tree")
+
+
 def reindex(parser, args):
-    spack.store.store.reindex()
+    if args.compact:
+        spack.store.db.compact()
+    else:
+        spack.store.store.reindex()
@@ -37,6 +37,7 @@ import spack.build_systems.cmake
 import spack.cmd
 import spack.cmd.install as install
 import spack.cmd.common.arguments as arguments
+import spack.config
 from spack.util.executable import which
 
 from spack.stage import DIYStage
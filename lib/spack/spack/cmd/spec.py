@@ -31,7 +31,9 @@ import llnl.util.tty as tty
 
 import spack
 import spack.cmd
+import spack.concretize
 import spack.cmd.common.arguments as arguments
+import spack.repo
 
 description = "show what would be installed, given a spec"
 section = "build"
@@ -39,7 +41,7 @@ level = "short"
 
 
 def setup_parser(subparser):
-    arguments.add_common_arguments(subparser, ['long', 'very_long'])
+    arguments.add_common_arguments(subparser, ['long', 'very_long', 'unify'])
     subparser.add_argument(
         '-y', '--yaml', action='store_true', default=False,
         help='print concrete spec as YAML')
@@ -58,6 +60,13 @@ def setup_parser(subparser):
     subparser.add_argument(
         '-t', '--types', action='store_true', default=False,
         help='show dependency types')
+    subparser.add_argument(
+        '-j', '--jobs', type=int, default=1, metavar='N',
+        help='concretize up to N specs at once, in separate processes')
+    subparser.add_argument(
+        '--no-cache', action='store_false', dest='use_cache', default=None,
+        help='concretize from scratch instead of using the '
+             'concretization cache')
     subparser.add_argument(
         'specs', nargs=argparse.REMAINDER, help="specs of packages")
 
@@ -73,11 +82,23 @@ def spec(parser, args):
     if not args.specs:
         tty.die("spack spec requires at least one spec")
 
-    for spec in spack.cmd.parse_specs(args.specs):
+    specs = spack.cmd.parse_specs(args.specs)
+
+    # concretize everything together, which shares the work between specs
+    if args.yaml:
+        abstract = [s for s in specs
+                    if s.name in spack.repo.path or s.virtual]
+    else:
+        abstract = specs
+    concrete = dict(zip((id(s) for s in abstract),
+                        spack.concretize.concretize_specs(
+                            abstract, unify=args.unify,
+                            use_cache=args.use_cache, jobs=args.jobs)))
+
+    for spec in specs:
         # With -y, just print YAML to output.
         if args.yaml:
-            if spec.name in spack.repo.path or spec.virtual:
-                spec.concretize()
+            spec = concrete.get(id(spec), spec)
 
             # use write because to_yaml already has a newline.
             sys.stdout.write(spec.to_yaml())
@@ -91,5 +112,4 @@ def spec(parser, args):
         kwargs['hashes'] = args.long or args.very_long
         print("Concretized")
         print("--------------------------------")
-        spec.concretize()
-        print(spec.tree(**kwargs))
+        print(concrete[id(spec)].tree(**kwargs))
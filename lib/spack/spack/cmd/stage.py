@@ -29,6 +29,7 @@ import llnl.util.tty as tty
 import spack.repo
 import spack.cmd
 import spack.cmd.common.arguments as arguments
+import spack.config
 
 description = "expand downloaded archive in preparation for install"
 section = "build"
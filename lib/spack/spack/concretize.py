@@ -34,19 +34,29 @@ TODO: make this customizable and allow users to configure
       concretization  policies.
 """
 from __future__ import print_function
+import hashlib
+import json
+import os
 from itertools import chain
 from functools_backport import reverse_order
 from contextlib import contextmanager
 from six import iteritems
 
 import llnl.util.lang
+import llnl.util.multiproc as mp
+import llnl.util.tty as tty
 
+import spack
+import spack.paths
+import spack.caches
+import spack.config
 import spack.repo
 import spack.abi
 import spack.spec
 import spack.compilers
 import spack.architecture
 import spack.error
+import spack.util.spack_json as sjson
 from spack.version import ver, Version, VersionList, VersionRange
 from spack.package_prefs import PackagePrefs, spec_externals, is_spec_buildable
 
@@ -68,6 +78,9 @@ class Concretizer(object):
         # during concretization. Used for testing and for mirror creation
         self.check_for_compiler_existence = True
 
+        # lookups remembered while concretizing a batch of specs
+        self._memo = None
+
     @contextmanager
     def disable_compiler_existence_check(self):
         saved = self.check_for_compiler_existence
@@ -75,6 +88,46 @@ class Concretizer(object):
         yield
         self.check_for_compiler_existence = saved
 
+    @contextmanager
+    def memoize_lookups(self):
+        """Remember provider, external, buildable and compiler lookups
+        until the context exits.
+
+        The answers to these only depend on the configuration and the
+        package repositories, so specs concretized in the same context
+        share them instead of looking them up again.
+        """
+        saved = self._memo
+        if saved is None:
+            self._memo = {}
+        try:
+            yield
+        finally:
+            self._memo = saved
+
+    def _memoized(self, kind, key, function, *args):
+        """Return ``function(*args)``, or the result of the call made for
+        the same ``kind`` and ``key`` in a ``memoize_lookups()`` context.
+        """
+        if self._memo is None:
+            return function(*args)
+
+        memo_key = (kind, key)
+        if memo_key not in self._memo:
+            self._memo[memo_key] = function(*args)
+        return self._memo[memo_key]
+
+    def _memoized_specs(self, kind, key, function, *args):
+        """Like ``_memoized()``, for functions returning lists of specs.
+
+        Concretization modifies the specs it gets, so each caller gets
+        its own copies.
+        """
+        specs = self._memoized(kind, key, function, *args)
+        if self._memo is None:
+            return specs
+        return [s.copy() for s in specs]
+
     def _valid_virtuals_and_externals(self, spec):
         """Returns a list of candidate virtual dep providers and external
            packages that coiuld be used to concretize a spec.
@@ -86,7 +139,8 @@ class Concretizer(object):
         pref_key = lambda spec: 0  # no-op pref key
 
         if spec.virtual:
-            candidates = spack.repo.path.providers_for(spec)
+            candidates = self._memoized_specs(
+                'providers', str(spec), spack.repo.path.providers_for, spec)
             if not candidates:
                 raise spack.spec.UnsatisfiableProviderSpecError(
                     candidates[0], spec)
@@ -105,10 +159,12 @@ class Concretizer(object):
         # the externals.
         usable = []
         for cspec in candidates:
-            if is_spec_buildable(cspec):
+            if self._memoized('buildable', cspec.name,
+                              is_spec_buildable, cspec):
                 usable.append(cspec)
 
-            externals = spec_externals(cspec)
+            externals = self._memoized_specs(
+                'externals', str(cspec), spec_externals, cspec)
             for ext in externals:
                 if ext.satisfies(spec):
                     usable.append(ext)
@@ -306,7 +362,9 @@ class Concretizer(object):
         # compiler_for_spec Should think whether this can be more
         # efficient
         def _proper_compiler_style(cspec, aspec):
-            return spack.compilers.compilers_for_spec(cspec, arch_spec=aspec)
+            return self._memoized(
+                'compilers', (str(cspec), str(aspec)),
+                spack.compilers.compilers_for_spec, cspec, aspec)
 
         if spec.compiler and spec.compiler.concrete:
             if (self.check_for_compiler_existence and not
@@ -460,6 +518,357 @@ def find_spec(spec, condition, default=None):
     return default   # Nothing matched the condition; return default.
 
 
+class ConcretizationCache(object):
+    """Cache of concrete specs, kept in a ``FileCache``.
+
+    Entries are keyed by the abstract spec and by everything else that
+    concretization depends on: the ``compilers`` and ``packages``
+    configuration, the package files in every repository, the host
+    architecture and Spack itself.  When any of them changes, the spec
+    is concretized again under a new key.
+
+    Package files are identified by their modification time and size,
+    like repository indexes do, so files changed without updating them
+    are not noticed.  With ``config:package_digests``, they are identified
+    by a hash of their contents instead.
+    """
+
+    def __init__(self, file_cache):
+        self.file_cache = file_cache
+        self._code = None
+
+    def _code_fingerprint(self):
+        """Hash of the modification times of Spack's own modules.
+
+        Every module of the ``spack`` package is covered, since build
+        systems, platforms, operating systems and utilities all take part
+        in concretization.  The tests are left out.  Modules are imported
+        once per process, so the hash is only computed once.
+        """
+        if self._code is None:
+            sha = hashlib.sha1()
+            root = spack.paths.module_path
+            for dirpath, dirnames, filenames in os.walk(root):
+                if dirpath == root and 'test' in dirnames:
+                    dirnames.remove('test')
+                dirnames.sort()
+                for name in sorted(filenames):
+                    if name.endswith('.py'):
+                        path = os.path.join(dirpath, name)
+                        sha.update('{0} {1}\n'.format(
+                            os.path.relpath(path, root),
+                            os.stat(path).st_mtime).encode('utf-8'))
+            self._code = sha.hexdigest()
+        return self._code
+
+    def _fingerprint(self):
+        """Hash of the state concretization depends on, besides the
+        abstract spec."""
+        sha = hashlib.sha1()
+
+        def update(*fields):
+            sha.update(' '.join(str(f) for f in fields).encode('utf-8'))
+            sha.update(b'\n')
+
+        # Spack itself, including changes to its code in a checkout
+        update(spack.spack_version, spack.architecture.sys_type())
+        update(self._code_fingerprint())
+
+        # compilers as the concretizer sees them, which may have been
+        # detected rather than configured
+        update('compilers', json.dumps(
+            spack.compilers.all_compilers_config(), sort_keys=True))
+        update('packages', json.dumps(
+            spack.config.get('packages'), sort_keys=True))
+
+        digests = spack.config.get('config:package_digests', False)
+        for repo in spack.repo.path.repos:
+            update(repo.namespace, repo.root)
+            checker = repo._pkg_checker
+            for name in sorted(checker):
+                if digests:
+                    update(name, checker.digest(name))
+                else:
+                    update(name, checker[name].st_mtime, checker[name].st_size)
+
+        return sha.hexdigest()
+
+    def key(self, spec, tests=False):
+        """Cache key for the concretization of an abstract spec."""
+        fmt = '$.$@$%@+$+$='
+        abstract = spec.format(fmt) + ''.join(
+            ' ^' + dep.format(fmt) for dep in spec.sorted_deps())
+        if isinstance(tests, (list, tuple, set)):
+            tests = sorted(tests)
+
+        sha = hashlib.sha1()
+        sha.update(self._fingerprint().encode('utf-8'))
+        sha.update(json.dumps([abstract, tests]).encode('utf-8'))
+        return 'concretized/{0}.json'.format(sha.hexdigest())
+
+    def get(self, key, spec):
+        """Return the concrete spec cached under ``key``, or None if there
+        is no usable entry for the abstract ``spec``."""
+        if not self.file_cache.init_entry(key):
+            return None
+
+        try:
+            with self.file_cache.read_transaction(key) as f:
+                concrete = _spec_from_cache_dict(sjson.load(f))
+        except Exception as e:
+            tty.debug('Ignoring concretization cache entry {0}: {1}'.format(
+                key, e))
+            return None
+
+        if not concrete.satisfies(spec):
+            return None
+        return concrete
+
+    def put(self, key, concrete):
+        """Store a concrete spec under ``key``."""
+        self.file_cache.init_entry(key)
+        with self.file_cache.write_transaction(key) as (old, new):
+            sjson.dump(_spec_to_cache_dict(concrete), new)
+
+
+def _spec_to_cache_dict(spec):
+    """Serialize a concrete spec for the concretization cache.
+
+    Unlike ``Spec.to_dict()``, this keeps build dependencies, external
+    modules and the order patches are applied in, which a spec needs to
+    be built.  Nodes are keyed by name, which is unique in a concrete DAG.
+    """
+    nodes = []
+    for s in spec.traverse(deptype=all):
+        node = s.to_node_dict()
+        node[s.name].pop('dependencies', None)
+
+        entry = {
+            'node': node,
+            'external_module': s.external_module,
+            'dependencies': [
+                [dspec.spec.name, sorted(dspec.deptypes)]
+                for dspec in s.dependencies_dict(deptype=all).values()
+            ]
+        }
+        patches = getattr(s.variants.get('patches'),
+                          '_patches_in_order_of_appearance', None)
+        if patches is not None:
+            entry['patches'] = patches
+        nodes.append(entry)
+
+    return {'nodes': nodes}
+
+
+def _spec_from_cache_dict(data):
+    """Rebuild a concrete spec written by ``_spec_to_cache_dict()``."""
+    specs = {}
+    for entry in data['nodes']:
+        s = spack.spec.Spec.from_node_dict(entry['node'])
+        s.external_module = entry['external_module']
+        if 'patches' in entry:
+            s.variants['patches']._patches_in_order_of_appearance = (
+                entry['patches'])
+        specs[s.name] = s
+
+    for entry in data['nodes']:
+        parent = specs[next(iter(entry['node']))]
+        for name, deptypes in entry['dependencies']:
+            parent._add_dependency(specs[name], tuple(deptypes))
+
+    root = specs[next(iter(data['nodes'][0]['node']))]
+    root._mark_concrete()
+    return root
+
+
+#: Concretization cache singleton, kept in the misc_cache
+concretization_cache = llnl.util.lang.Singleton(
+    lambda: ConcretizationCache(spack.caches.misc_cache))
+
+
+def concretized(spec, tests=False, use_cache=None):
+    """Return a concrete version of an abstract spec.
+
+    Results are kept in the concretization cache, so that concretizing
+    the same spec again with the same configuration and packages only
+    reads them back.
+
+    Args:
+        spec (Spec): abstract spec, which is not modified
+        tests (list or bool): as for ``Spec.concretize()``
+        use_cache (bool or None): whether to use the concretization
+            cache.  If None, the ``config:concretization_cache`` setting
+            decides.
+
+    Returns:
+        Spec: the concrete spec
+    """
+    if use_cache is None:
+        use_cache = spack.config.get('config:concretization_cache', False)
+
+    if spec.concrete or not use_cache:
+        concrete = spec.copy(caches=False)
+        concrete.concretize(tests=tests)
+        return concrete
+
+    cache = concretization_cache
+    key = cache.key(spec, tests)
+    concrete = cache.get(key, spec)
+    if concrete is None:
+        concrete = spec.copy(caches=False)
+        concrete.concretize(tests=tests)
+        cache.put(key, concrete)
+
+    return concrete
+
+
+def concretize_specs(specs, tests=False, unify=False, use_cache=None,
+                     jobs=1):
+    """Return concrete versions of several abstract specs.
+
+    Provider, external and compiler lookups are shared by all the specs
+    instead of being repeated for each one.  With ``unify``, the
+    dependencies of each spec are made to match the nodes chosen for
+    the specs before it, wherever those satisfy its constraints, so that
+    shared dependencies have a single concrete configuration.
+
+    With ``jobs`` greater than one, the specs are first concretized
+    independently by a pool of that many forked processes.  Unification
+    then happens in this process, in the order of ``specs``.
+
+    Args:
+        specs (list): abstract specs, which are not modified
+        tests (list or bool): as for ``Spec.concretize()``
+        unify (bool): whether to reuse nodes across the specs
+        use_cache (bool or None): as for ``concretized()``
+        jobs (int): number of processes concretizing specs at once
+
+    Returns:
+        list: the concrete specs, in the order of ``specs``
+    """
+    concrete_specs = []
+    unified = {}
+    with concretizer.memoize_lookups():
+        if jobs > 1 and len(specs) > 1:
+            independent = _concretize_in_pool(specs, tests, use_cache, jobs)
+        else:
+            independent = [None] * len(specs)
+
+        for spec, concrete in zip(specs, independent):
+            if concrete is None:
+                concrete = concretized(
+                    spec, tests=tests, use_cache=use_cache)
+            if unify:
+                concrete = _unify(spec, concrete, unified, tests, use_cache)
+                for node in concrete.traverse(deptype=all):
+                    unified.setdefault(node.name, node)
+            concrete_specs.append(concrete)
+
+    return concrete_specs
+
+
+#: Work for the processes forked by ``_concretize_in_pool()``
+_pool_work = None
+
+
+def _concretize_in_pool(specs, tests, use_cache, jobs):
+    """Concretize ``specs`` in a pool of ``jobs`` forked processes.
+
+    Returns a list with a concrete spec for each of ``specs``, or None
+    where a worker failed; the caller concretizes those again, so that
+    errors are reported as usual.  If processes cannot be forked here,
+    every entry is None.
+    """
+    global _pool_work
+
+    context = mp.fork_context()
+    if context is None:
+        tty.debug('Cannot fork workers; concretizing specs one at a time')
+        return [None] * len(specs)
+
+    # Build what the workers use before forking, so that they inherit
+    # it instead of each building it again.
+    spack.repo.path.provider_index
+    spack.compilers.all_compilers_config()
+    PackagePrefs._packages_config
+
+    _pool_work = (specs, tests, use_cache)
+    pool = context.Pool(processes=min(jobs, len(specs)))
+    try:
+        results = pool.map(_concretize_worker, range(len(specs)))
+    finally:
+        pool.terminate()
+        pool.join()
+        _pool_work = None
+
+    return [_spec_from_cache_dict(r) if r is not None else None
+            for r in results]
+
+
+def _concretize_worker(index):
+    """Concretize one of the specs in ``_pool_work``, in a worker process.
+
+    The result is sent back as a dictionary, like the ones in the
+    concretization cache.
+    """
+    try:
+        specs, tests, use_cache = _pool_work
+        concrete = concretized(specs[index], tests=tests, use_cache=use_cache)
+        return _spec_to_cache_dict(concrete)
+    except Exception as e:
+        tty.debug('Could not concretize spec {0}: {1}'.format(index, e))
+        return None
+
+
+def _unify(abstract, concrete, unified, tests, use_cache):
+    """Concretize ``abstract`` again, with its nodes constrained to the
+    ones in ``unified`` that are compatible with it.
+
+    Returns ``concrete`` if there is nothing to unify, or if the
+    constrained spec cannot be concretized.
+    """
+    try:
+        normal = abstract.copy()
+        normal.normalize(tests=tests)
+    except spack.error.SpackError:
+        return concrete
+
+    constraints = []
+    for node in concrete.traverse(deptype=all):
+        other = unified.get(node.name)
+        if other is None or other.dag_hash() == node.dag_hash():
+            continue
+
+        try:
+            if not other.satisfies(normal[node.name], deps=False):
+                continue
+        except KeyError:
+            pass  # not constrained by the abstract spec
+        constraints.append(other)
+
+    if not constraints:
+        return concrete
+
+    constrained = abstract.copy()
+    try:
+        for other in constraints:
+            constraint = spack.spec.Spec(other.format('$_$@$%@+$+$='))
+            # patches follow from the rest of the DAG
+            constraint.variants.pop('patches', None)
+
+            node = next((s for s in constrained.traverse(deptype=all)
+                         if s.name == other.name), None)
+            if node is None:
+                constrained._add_dependency(constraint, ())
+            else:
+                node.constrain(constraint, deps=False)
+
+        return concretized(constrained, tests=tests, use_cache=use_cache)
+    except spack.error.SpackError as e:
+        tty.debug('Could not unify {0}: {1}'.format(abstract, e))
+        return concrete
+
+
 def _compiler_concretization_failure(compiler_spec, arch):
     # Distinguish between the case that there are compilers for
     # the arch but not with the given compiler spec and the case that
@@ -482,8 +891,8 @@ class NoCompilersForArchError(spack.error.SpackError):
                    (arch.platform_os, arch.target))
 
         available_os_target_strs = list()
-        for os, t in available_os_targets:
-            os_target_str = "%s-%s" % (os, t) if t else os
+        for op_sys, t in available_os_targets:
+            os_target_str = "%s-%s" % (op_sys, t) if t else op_sys
             available_os_target_strs.append(os_target_str)
         err_msg += (
             "\nCompilers are defined for the following"
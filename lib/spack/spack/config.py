@@ -52,12 +52,14 @@ schemas are in submodules of :py:mod:`spack.schema`.
 """
 
 import copy
+import json
 import os
 import re
 import sys
 import multiprocessing
+import zlib
 from contextlib import contextmanager
-from six import string_types
+from six import string_types, text_type
 from six import iteritems
 from ordereddict_backport import OrderedDict
 
@@ -68,6 +70,7 @@ import llnl.util.lang
 import llnl.util.tty as tty
 from llnl.util.filesystem import mkdirp
 
+import spack
 import spack.paths
 import spack.architecture
 import spack.schema
@@ -118,6 +121,10 @@ config_defaults = {
     }
 }
 
+#: Directory where merged configuration sections are cached
+merged_config_cache_path = os.path.join(
+    spack.paths.user_config_path, 'cache', 'config')
+
 #: metavar to use for commands that accept scopes
 #: this is shorter and more readable than listing all choices
 scopes_metavar = '{defaults,system,site,user}[/PLATFORM]'
@@ -260,20 +267,56 @@ class InternalConfigScope(ConfigScope):
         return '<InternalConfigScope: %s>' % self.name
 
 
+def _str_strings(data):
+    """Turns the unicode strings ``json`` returns under Python 2 back
+    into ``str``, as the YAML loader returns them.  Unicode strings are
+    tagged in spec YAML, so they would change the hashes of specs."""
+    if sys.version_info[0] >= 3:
+        return data
+    if isinstance(data, text_type):
+        return data.encode('utf-8')
+    if isinstance(data, list):
+        return [_str_strings(v) for v in data]
+    if isinstance(data, dict):
+        return type(data)((_str_strings(k), _str_strings(v))
+                          for k, v in data.items())
+    return data
+
+
+@llnl.util.lang.memoized
+def _schema_stamp():
+    """Spack's version, with the size and modification time of each
+    schema module, so that cached sections are validated again after an
+    upgrade or a change to the schemas."""
+    schema_path = os.path.dirname(spack.schema.__file__)
+    stamps = []
+    for name in sorted(os.listdir(schema_path)):
+        if name.endswith('.py'):
+            stat = os.stat(os.path.join(schema_path, name))
+            stamps.append([name, stat.st_size, stat.st_mtime])
+    return ['schema', spack.spack_version, stamps]
+
+
 class Configuration(object):
     """A full Spack configuration, from a hierarchy of config files.
 
     This class makes it easy to add a new scope on top of an existing one.
     """
 
-    def __init__(self, *scopes):
+    def __init__(self, *scopes, **kwargs):
         """Initialize a configuration with an initial list of scopes.
 
         Args:
             scopes (list of ConfigScope): list of scopes to add to this
                 Configuration, ordered from lowest to highest precedence
 
+        Keyword Args:
+            cache_path (str or None): directory where merged sections are
+                cached between runs; if ``None``, they are not cached.
+
         """
+        self.cache_path = kwargs.get('cache_path')
+        self.merged_sections = {}   # merged sections, by section name
         self.scopes = OrderedDict()
         for scope in scopes:
             self.push_scope(scope)
@@ -281,10 +324,12 @@ class Configuration(object):
     def push_scope(self, scope):
         """Add a higher precedence scope to the Configuration."""
         self.scopes[scope.name] = scope
+        self.merged_sections = {}
 
     def pop_scope(self):
         """Remove the highest precedence scope and return it."""
         name, scope = self.scopes.popitem(last=True)
+        self.merged_sections = {}
         return scope
 
     @property
@@ -330,6 +375,7 @@ class Configuration(object):
         """Clears the caches for configuration files,
 
         This will cause files to be re-read upon the next request."""
+        self.merged_sections = {}
         for scope in self.scopes.values():
             scope.clear()
 
@@ -347,6 +393,7 @@ class Configuration(object):
         scope = self._validate_scope(scope)  # get ConfigScope object
 
         # read only the requested section's data.
+        self.merged_sections.pop(section, None)
         scope.sections[section] = {section: update_data}
         scope.write_section(section)
 
@@ -376,11 +423,19 @@ class Configuration(object):
         """
         _validate_section_name(section)
 
-        if scope is None:
-            scopes = self.scopes.values()
-        else:
-            scopes = [self._validate_scope(scope)]
+        if scope is not None:
+            return self._merge_scopes(
+                section, [self._validate_scope(scope)])
+
+        # The merged section is kept for the life of this object, and
+        # copied so that callers cannot modify it.
+        if section not in self.merged_sections:
+            self.merged_sections[section] = self._read_merged_section(
+                section)
+        return copy.deepcopy(self.merged_sections[section])
 
+    def _merge_scopes(self, section, scopes):
+        """Merge a section from some scopes, in order of precedence."""
         merged_section = syaml.syaml_dict()
         for scope in scopes:
             # read potentially cached data from the scope.
@@ -403,6 +458,84 @@ class Configuration(object):
         # take the top key off before returning.
         return merged_section[section]
 
+    def _merged_section_key(self, section):
+        """Describe the inputs of a merged section, to validate its cache.
+
+        File scopes are described by the size and modification time of
+        their file for the section, and internal scopes by their data.
+        The schemas the section was validated against are part of it too.
+        """
+        key = [_schema_stamp()]
+        for scope in self.scopes.values():
+            if isinstance(scope, InternalConfigScope):
+                data = scope.get_section(section)
+                key.append([scope.name, json.dumps(data, sort_keys=True)])
+                continue
+
+            try:
+                stat = os.stat(scope.get_section_filename(section))
+                key.append([scope.name, scope.path,
+                            stat.st_size, stat.st_mtime])
+            except OSError:
+                key.append([scope.name, scope.path, None])
+        return key
+
+    def _merged_section_cache_file(self, section):
+        # different Spack instances have different scopes
+        prefix_hash = zlib.crc32(spack.paths.prefix.encode('utf-8'))
+        return os.path.join(self.cache_path, '{0}-{1:08x}.json'.format(
+            section, prefix_hash & 0xffffffff))
+
+    def _read_merged_section(self, section):
+        """Merge a section from all scopes, or read it from the cache.
+
+        The cache holds the validated, merged section as JSON, so YAML
+        parsing and schema validation only happen when a configuration
+        file, or the data of an internal scope, changes.
+        """
+        scopes = list(self.scopes.values())
+        if not self.cache_path:
+            return self._merge_scopes(section, scopes)
+
+        # json round trip, so that the key compares equal to a cached one
+        try:
+            key = json.loads(json.dumps(self._merged_section_key(section)))
+        except (TypeError, ValueError):
+            return self._merge_scopes(section, scopes)
+
+        cache_file = self._merged_section_cache_file(section)
+        try:
+            with open(cache_file) as f:
+                cached = json.load(f, object_pairs_hook=syaml.syaml_dict)
+            if cached['key'] == key:
+                return _str_strings(cached['data'])
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            pass
+
+        data = self._merge_scopes(section, scopes)
+
+        # only cache data that JSON represents faithfully (e.g., YAML
+        # allows keys that are not strings).
+        try:
+            text = json.dumps({'key': key, 'data': data})
+            if json.loads(text, object_pairs_hook=syaml.syaml_dict)[
+                    'data'] != data:
+                return data
+        except (TypeError, ValueError):
+            return data
+
+        # the cache is only an optimization: failing to write it is fine
+        tmp = '{0}.{1}.tmp'.format(cache_file, os.getpid())
+        try:
+            mkdirp(self.cache_path)
+            with open(tmp, 'w') as f:
+                f.write(text)
+            os.rename(tmp, cache_file)
+        except (IOError, OSError):
+            tty.debug('Could not cache config section: {0}'.format(section))
+
+        return data
+
     def get(self, path, default=None, scope=None):
         """Get a config section or a single value from one.
 
@@ -461,7 +594,13 @@ class Configuration(object):
         """Print a configuration to stdout."""
         try:
             data = syaml.syaml_dict()
-            data[section] = self.get_config(section)
+            if blame:
+                # cached sections do not know where their values came from
+                _validate_section_name(section)
+                data[section] = self._merge_scopes(
+                    section, list(self.scopes.values()))
+            else:
+                data[section] = self.get_config(section)
             syaml.dump(
                 data, stream=sys.stdout, default_flow_style=False, blame=blame)
         except (yaml.YAMLError, IOError):
@@ -541,7 +680,7 @@ def _config():
         (Configuration): object for accessing spack configuration
 
     """
-    cfg = Configuration()
+    cfg = Configuration(cache_path=merged_config_cache_path)
 
     # first do the builtin, hardcoded defaults
     defaults = InternalConfigScope('_builtin', config_defaults)
@@ -0,0 +1,509 @@
+##############################################################################
+# Copyright (c) 2013-2018, Lawrence Livermore National Security, LLC.
+# Produced at the Lawrence Livermore National Laboratory.
+#
+# This file is part of Spack.
+# Created by Todd Gamblin, tgamblin@llnl.gov, All rights reserved.
+# LLNL-CODE-647188
+#
+# For details, see https://github.com/spack/spack
+# Please also see the NOTICE and LICENSE files for our notice and the LGPL.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License (as
+# published by the Free Software Foundation) version 2.1, February 1999.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the IMPLIED WARRANTY OF
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the terms and
+# conditions of the GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+##############################################################################
+"""Server that keeps Spack loaded between commands.
+
+Every ``spack`` command imports Spack, reads all the configuration scopes,
+the repository indexes and the database before doing any work.  A daemon
+started with ``spack daemon start`` does that once, then runs read-only
+commands on behalf of ``bin/spack`` in processes forked from it, which
+inherit everything already loaded.  The client passes its working
+directory, its environment and its standard file descriptors along with
+the command, so output goes straight to the client's terminal.
+
+The daemon watches the files its state was read from: Spack's modules,
+configuration files and package files.  When one of them changes, the
+command runs in the client instead, and the daemon starts over.  The list
+of watched files is made once, and each request only stats them; new files
+are noticed through the directories that contain them, which are watched
+too.
+
+This module is imported by ``bin/spack`` before the rest of Spack, to
+forward commands, so only what the client needs is imported at the top.
+"""
+from __future__ import print_function
+
+import array
+import errno
+import hashlib
+import json
+import os
+import signal
+import socket
+import struct
+import sys
+import time
+
+import spack.error
+import spack.paths
+
+#: Commands that can run in the daemon, mapped to the subcommands that
+#: can, for commands that also have subcommands changing state.
+forwarded_commands = {
+    'dependencies': None,
+    'dependents': None,
+    'find': None,
+    'info': None,
+    'list': None,
+    'location': None,
+    'module': ('find', 'loads'),
+    'providers': None,
+    'spec': None,
+}
+
+# Messages are a one byte kind followed by the length of their payload
+_header = struct.Struct('!cI')
+
+_REQUEST = b'R'   # run a command: JSON payload, with the client's fds
+_PID = b'P'       # pid of the process running the command
+_EXIT = b'X'      # exit code of the command
+_FALLBACK = b'F'  # the command has to run in the client
+_STATUS = b'S'    # query the status of the daemon, or its JSON reply
+_STOP = b'T'      # stop the daemon
+
+
+def socket_path():
+    """Path of the socket of the daemon for this Spack and this host."""
+    prefix_hash = hashlib.sha1(spack.paths.prefix.encode('utf-8'))
+    return os.path.join(
+        spack.paths.user_config_path, 'daemon', '{0}-{1}.sock'.format(
+            socket.gethostname(), prefix_hash.hexdigest()[:12]))
+
+
+def can_forward(argv):
+    """Whether a command line can run in the daemon.
+
+    Only commands given right after ``spack`` are forwarded, since the
+    daemon's configuration does not include options like ``-C``.
+    """
+    if not argv or argv[0] not in forwarded_commands:
+        return False
+
+    subcommands = forwarded_commands[argv[0]]
+    return subcommands is None or (len(argv) > 1 and argv[1] in subcommands)
+
+
+def _send(sock, kind, payload=b''):
+    sock.sendall(_header.pack(kind, len(payload)) + payload)
+
+
+def _recv_exactly(sock, size, data=b''):
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+
+def _recv(sock):
+    """Receives a message, or returns (None, None) if the other end
+    closed the connection."""
+    header = _recv_exactly(sock, _header.size)
+    if header is None:
+        return None, None
+
+    kind, size = _header.unpack(header)
+    payload = _recv_exactly(sock, size)
+    if payload is None:
+        return None, None
+
+    return kind, payload
+
+
+def _connect(path):
+    """Connects to the daemon listening on ``path``, or returns None."""
+    if not os.path.exists(path):
+        return None
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except socket.error:
+        sock.close()
+        return None
+    return sock
+
+
+def forward(argv, path=None):
+    """Runs a command in the daemon, if one is running and the command
+    can run there.
+
+    Args:
+        argv (list of str): command line arguments, NOT including the
+            executable name
+        path (str): socket of the daemon, by default ``socket_path()``
+
+    Returns:
+        the exit code of the command, or None if it has to run in this
+        process
+    """
+    # The file descriptors of the client are passed with sendmsg()
+    if (os.environ.get('SPACK_NO_DAEMON') or not can_forward(argv) or
+            not hasattr(socket.socket, 'sendmsg')):
+        return None
+
+    try:
+        cwd = os.getcwd()
+    except OSError:
+        return None
+
+    conn = _connect(path or socket_path())
+    if conn is None:
+        return None
+
+    pid = None
+    try:
+        for stream in (sys.stdout, sys.stderr):
+            stream.flush()
+
+        request = json.dumps({
+            'argv': argv, 'cwd': cwd, 'env': dict(os.environ)
+        }).encode('utf-8')
+        fds = array.array('i', [0, 1, 2])
+        conn.sendmsg([_header.pack(_REQUEST, len(request)) + request],
+                     [(socket.SOL_SOCKET, socket.SCM_RIGHTS, fds)])
+
+        while True:
+            try:
+                kind, payload = _recv(conn)
+            except KeyboardInterrupt:
+                # The command does not run in our process group
+                if pid is not None:
+                    os.kill(pid, signal.SIGINT)
+                continue
+
+            if kind == _PID:
+                pid = int(payload)
+            elif kind == _EXIT:
+                return int(payload)
+            elif kind == _FALLBACK:
+                return None
+            else:
+                break
+
+    except socket.error:
+        pass
+
+    finally:
+        conn.close()
+
+    if pid is None:
+        return None
+
+    # The command may have written output already, so it cannot run again
+    print('==> Error: lost connection to the spack daemon', file=sys.stderr)
+    return 1
+
+
+def status(path=None):
+    """Returns a dictionary describing the running daemon, or None if
+    there is no daemon."""
+    conn = _connect(path or socket_path())
+    if conn is None:
+        return None
+
+    try:
+        _send(conn, _STATUS)
+        kind, payload = _recv(conn)
+    except socket.error:
+        return None
+    finally:
+        conn.close()
+
+    return json.loads(payload.decode('utf-8')) if kind == _STATUS else None
+
+
+def stop(path=None):
+    """Stops the running daemon.  Returns False if there was none."""
+    conn = _connect(path or socket_path())
+    if conn is None:
+        return False
+
+    try:
+        _send(conn, _STOP)
+        kind, _ = _recv(conn)
+    except socket.error:
+        return False
+    finally:
+        conn.close()
+
+    return kind == _EXIT
+
+
+def _stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime)
+
+
+def watched_files():
+    """Files the state of the daemon is read from: Spack's modules,
+    configuration files and package files, with the directories that
+    contain them so that new files are noticed."""
+    import spack.config
+    import spack.repo
+
+    paths = []
+    for root, dirs, files in os.walk(spack.paths.module_path):
+        if root == spack.paths.module_path and 'test' in dirs:
+            dirs.remove('test')
+        paths.append(root)
+        paths.extend(os.path.join(root, f) for f in files
+                     if f.endswith('.py'))
+
+    for scope in spack.config.config.scopes.values():
+        scope_path = getattr(scope, 'path', None)
+        if scope_path:
+            paths.append(scope_path)
+            if os.path.isdir(scope_path):
+                paths.extend(os.path.join(scope_path, f)
+                             for f in os.listdir(scope_path)
+                             if f.endswith('.yaml'))
+
+    for repo in spack.repo.path.repos:
+        paths.extend([repo.config_file, repo.packages_path])
+        paths.extend(
+            os.path.join(repo.packages_path, pkg_name, 'package.py')
+            for pkg_name in os.listdir(repo.packages_path))
+
+    return paths
+
+
+def watched_stamps(paths):
+    """Maps ``paths`` to their inode, size and modification time."""
+    return dict((path, _stamp(path)) for path in paths)
+
+
+class Daemon(object):
+    """Serves commands on a Unix socket, from a warm Spack."""
+
+    def __init__(self, path):
+        self.path = path
+        self.started = time.time()
+        self.requests = 0
+        self._watched = None
+        self._stamps = None
+        self._socket = None
+
+    def warm_up(self):
+        """Reads everything commands usually need, so that the processes
+        running them inherit it."""
+        import spack.cmd
+        import spack.compilers
+        import spack.config
+        import spack.main  # noqa: F401
+        import spack.repo
+        import spack.store
+
+        for section in spack.config.section_schemas:
+            spack.config.get(section)
+
+        for repo in spack.repo.path.repos:
+            repo.provider_index
+            repo.tag_index
+            repo.metadata_index
+
+        spack.compilers.all_compilers_config()
+
+        with spack.store.db.read_transaction():
+            pass
+
+        for name in forwarded_commands:
+            spack.cmd.get_module(name)
+
+    def listen(self):
+        """Binds the socket of the daemon, replacing a stale one."""
+        if _connect(self.path) is not None:
+            raise DaemonError('a spack daemon is already running',
+                              'its socket is {0}'.format(self.path))
+
+        # Only this user may run commands through the daemon
+        socket_dir = os.path.dirname(self.path)
+        if not os.path.isdir(socket_dir):
+            os.makedirs(socket_dir, 0o700)
+        os.chmod(socket_dir, 0o700)
+
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.bind(self.path)
+        self._socket.listen(16)
+
+        # Taken after creating the socket, which may create its directory
+        self._watched = watched_files()
+        self._stamps = watched_stamps(self._watched)
+
+    def _files_changed(self):
+        """True if files the state of the daemon was read from changed.
+
+        Only the files found when the daemon started are checked, which
+        takes a stat call for each of them.  New files change the
+        directories they are in.
+        """
+        return watched_stamps(self._watched) != self._stamps
+
+    def serve(self):
+        """Serves requests until the daemon is stopped.
+
+        Returns True if the daemon has to start over, as files its state
+        was read from changed, and False if it was stopped.
+        """
+        if self._socket is None:
+            self.listen()
+
+        # Processes running commands are reaped automatically
+        signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+
+        try:
+            while True:
+                try:
+                    conn, _ = self._socket.accept()
+                except socket.error as e:
+                    if e.errno == errno.EINTR:
+                        continue
+                    raise
+
+                try:
+                    result = self._handle(conn)
+                except socket.error:
+                    result = None
+                finally:
+                    conn.close()
+
+                if result is not None:
+                    return result
+        finally:
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            self._socket.close()
+            self._socket = None
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+    def _handle(self, conn):
+        """Handles one request.  Returns what ``serve()`` should return,
+        or None to keep serving."""
+        # The ancillary buffer has room for the client's file descriptors
+        data, ancdata, _, _ = conn.recvmsg(65536, 256)
+
+        fds = array.array('i')
+        for level, kind, cmsg_data in ancdata:
+            if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+                fds.frombytes(cmsg_data[:len(cmsg_data) -
+                                        (len(cmsg_data) % fds.itemsize)])
+
+        try:
+            header = _recv_exactly(conn, _header.size, data)
+            if header is None:
+                return None
+            kind, size = _header.unpack(header[:_header.size])
+            payload = _recv_exactly(conn, size, header[_header.size:])
+
+            if kind == _STATUS:
+                _send(conn, _STATUS, json.dumps({
+                    'pid': os.getpid(),
+                    'uptime': time.time() - self.started,
+                    'requests': self.requests,
+                    'socket': self.path,
+                    'prefix': spack.paths.prefix
+                }).encode('utf-8'))
+
+            elif kind == _STOP:
+                _send(conn, _EXIT, b'0')
+                return False
+
+            elif kind == _REQUEST and payload is not None and len(fds) == 3:
+                if self._files_changed():
+                    _send(conn, _FALLBACK)
+                    return True
+
+                self._run(conn, json.loads(payload.decode('utf-8')), fds)
+
+        finally:
+            for fd in fds:
+                os.close(fd)
+
+        return None
+
+    def _run(self, conn, request, fds):
+        """Runs a command in a forked process."""
+        import spack.store
+
+        # Bring the database up to date, so that the next commands
+        # inherit it as well
+        with spack.store.db.read_transaction():
+            pass
+
+        self.requests += 1
+        pid = os.fork()
+        if pid:
+            return
+
+        code = 1
+        try:
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            self._socket.close()
+            _send(conn, _PID, str(os.getpid()).encode('utf-8'))
+
+            sys.stdout.flush()
+            sys.stderr.flush()
+            for fd, target in zip(fds, (0, 1, 2)):
+                os.dup2(fd, target)
+            sys.stdout = os.fdopen(1, 'w', 1)
+            sys.stderr = os.fdopen(2, 'w', 1)
+
+            os.chdir(request['cwd'])
+            os.environ.clear()
+            os.environ.update(request['env'])
+
+            import spack.main
+            sys.argv = ['spack'] + request['argv']
+            code = spack.main.main(request['argv'])
+
+        except SystemExit as e:
+            code = e.code
+
+        except BaseException:
+            import traceback
+            traceback.print_exc()
+
+        finally:
+            if not isinstance(code, int):
+                if code is not None:
+                    print(code, file=sys.stderr)
+                code = 0 if code is None else 1
+
+            try:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                _send(conn, _EXIT, str(code).encode('utf-8'))
+            finally:
+                os._exit(0)
+
+
+class DaemonError(spack.error.SpackError):
+    """Raised when the daemon cannot start."""
@@ -39,7 +39,9 @@ provides a cache and a sanity checking mechanism for what is in the
 filesystem.
 
 """
+import bisect
 import datetime
+import json
 import time
 import os
 import sys
@@ -47,12 +49,14 @@ import socket
 import contextlib
 from six import string_types
 from six import iteritems
+from six.moves import cPickle as pickle
 
 from ruamel.yaml.error import MarkedYAMLError, YAMLError
 
 import llnl.util.tty as tty
 from llnl.util.filesystem import mkdirp
 
+import spack
 import spack.store
 import spack.repo
 import spack.spec
@@ -78,12 +82,33 @@ _db_lock_timeout = 60
 # Types of dependencies tracked by the database
 _tracked_deps = ('link', 'run')
 
+# Name of the file, in the DB directory, that write transactions append
+# their changes to instead of rewriting the whole index.
+_journal_filename = 'index.journal'
+
+# Name of the file, in the DB directory, holding a pickled snapshot of
+# the records built from the index, for faster reads in new processes.
+_snapshot_filename = 'index.snapshot'
+
+# Pickle protocol for snapshots, readable by both Python 2 and 3
+_snapshot_protocol = 2
+
 
 def _now():
     """Returns the time since the epoch"""
     return time.time()
 
 
+def _file_stamp(path):
+    """Identify the current contents of a file by its inode, size and
+    modification time, or return None if it does not exist."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime)
+
+
 def _autospec(function):
     """Decorator that automatically converts the argument of a single-arg
        function to a Spec."""
@@ -154,12 +179,166 @@ class InstallRecord(object):
         return InstallRecord(spec, **d)
 
 
+class _QueryIndex(object):
+    """Secondary indexes over the install records of a ``Database``.
+
+    ``Database.query`` uses these to narrow down the records it has to
+    test with ``Spec.satisfies`` for abstract query specs.  Each index
+    maps an attribute of installed specs to the set of DAG hashes of the
+    records that have it.  The indexes only ever *narrow* the search:
+    every candidate is still checked with ``satisfies``.
+    """
+
+    def __init__(self, data):
+        self._data = data
+        self.by_name = {}
+        self.by_compiler = {}
+
+        #: str(versions) -> (VersionList, keys)
+        self.by_versions = {}
+
+        #: sorted list of (installation_time, key)
+        self.by_time = []
+
+        #: dependency name -> keys of records depending on it (directly
+        #: or not).  Built lazily, as only anonymous queries use it.
+        self._by_dependency = None
+
+        for key, rec in iteritems(data):
+            self.add(key, rec)
+
+    def add(self, key, rec):
+        spec = rec.spec
+        self.by_name.setdefault(spec.name, set()).add(key)
+
+        compiler = spec.compiler.name if spec.compiler else None
+        self.by_compiler.setdefault(compiler, set()).add(key)
+
+        versions = str(spec.versions)
+        self.by_versions.setdefault(versions, (spec.versions, set()))[1].add(
+            key)
+
+        bisect.insort(self.by_time, (rec.installation_time, key))
+
+        if self._by_dependency is not None:
+            for name in set(d.name for d in spec.traverse(root=False)):
+                self._by_dependency.setdefault(name, set()).add(key)
+
+    def remove(self, key, rec):
+        spec = rec.spec
+        self.by_name[spec.name].discard(key)
+
+        compiler = spec.compiler.name if spec.compiler else None
+        self.by_compiler[compiler].discard(key)
+        self.by_versions[str(spec.versions)][1].discard(key)
+
+        entry = (rec.installation_time, key)
+        i = bisect.bisect_left(self.by_time, entry)
+        if i < len(self.by_time) and self.by_time[i] == entry:
+            del self.by_time[i]
+
+        if self._by_dependency is not None:
+            for keys in self._by_dependency.values():
+                keys.discard(key)
+
+    @property
+    def by_dependency(self):
+        if self._by_dependency is None:
+            # Compute the transitive dependency names of every record
+            # once, reusing those of its dependencies.
+            names = {}
+
+            def dependency_names(spec):
+                key = spec.dag_hash()
+                if key not in names:
+                    result = set()
+                    for dep in spec.dependencies():
+                        result.add(dep.name)
+                        result |= dependency_names(dep)
+                    names[key] = result
+                return names[key]
+
+            self._by_dependency = {}
+            for key, rec in iteritems(self._data):
+                for name in dependency_names(rec.spec):
+                    self._by_dependency.setdefault(name, set()).add(key)
+
+        return self._by_dependency
+
+    def _between(self, start_date, end_date):
+        """Keys installed between two dates (with a second of slack, as
+        the exact comparison is still done on each candidate)."""
+        try:
+            start = (time.mktime(start_date.timetuple()) - 1
+                     if start_date else None)
+            end = time.mktime(end_date.timetuple()) + 1 if end_date else None
+        except (OverflowError, ValueError):
+            return None
+
+        lo = 0
+        if start is not None:
+            lo = bisect.bisect_left(self.by_time, (start,))
+        hi = len(self.by_time)
+        if end is not None:
+            hi = bisect.bisect_right(self.by_time, (end,))
+        return set(key for _, key in self.by_time[lo:hi])
+
+    def candidates(self, query_spec, start_date=None, end_date=None):
+        """Keys of the records that can possibly match a query.
+
+        Returns ``None`` if no index applies and every record has to be
+        checked.
+        """
+        subsets = []
+
+        if start_date or end_date:
+            subsets.append(self._between(start_date, end_date))
+
+        # A concrete record satisfies a virtual spec if it provides it, so
+        # none of its own attributes are checked against the query.
+        if isinstance(query_spec, spack.spec.Spec) and not query_spec.virtual:
+            if query_spec.name:
+                subsets.append(self.by_name.get(query_spec.name, set()))
+
+            versions = query_spec.versions
+            if versions and versions != spack.spec._any_version:
+                keys = set()
+                for record_versions, vkeys in self.by_versions.values():
+                    if (not record_versions or
+                            record_versions.satisfies(versions)):
+                        keys |= vkeys
+                subsets.append(keys)
+
+            if query_spec.compiler:
+                keys = set(self.by_compiler.get(None, ()))
+                keys |= self.by_compiler.get(query_spec.compiler.name, set())
+                subsets.append(keys)
+
+            # Named queries only constrain dependencies the record has,
+            # but anonymous ones (e.g., ``^mpich``) require them.
+            if not query_spec.name:
+                for dep in query_spec.traverse(root=False):
+                    if not dep.virtual:
+                        subsets.append(
+                            self.by_dependency.get(dep.name, set()))
+
+        subsets = [keys for keys in subsets if keys is not None]
+        if not subsets:
+            return None
+
+        subsets.sort(key=len)
+        result = set(subsets[0])
+        for keys in subsets[1:]:
+            result &= keys
+        return result
+
+
 class Database(object):
 
     """Per-process lock objects for each install prefix."""
     _prefix_locks = {}
 
-    def __init__(self, root, db_dir=None):
+    def __init__(self, root, db_dir=None, snapshot=False):
         """Create a Database for Spack installations under ``root``.
 
         A Database is a cache of Specs data from ``$prefix/spec.yaml``
@@ -176,6 +355,19 @@ class Database(object):
         Database root for ``spec.yaml`` files according to Spack's
         ``DirectoryLayout``.
 
+        Write transactions do not rewrite ``index.json``.  The records
+        they change are appended to an ``index.journal`` file next to
+        it, which is replayed on top of the index when the database is
+        read.  The journal is folded back into the index (compacted)
+        once it grows larger than the index itself, on reindex, or with
+        ``spack reindex --compact``.
+
+        The index is only parsed again when it changed since it was last
+        read or written by this instance; otherwise only new journal
+        entries are applied.  If ``snapshot`` is True, the records built
+        from the index are also pickled to an ``index.snapshot`` file,
+        from which new processes load them instead of parsing the index.
+
         Caller may optionally provide a custom ``db_dir`` parameter
         where data will be stored.  This is intended to be used for
         testing the Database class.
@@ -193,6 +385,8 @@ class Database(object):
         # Set up layout of database files within the db dir
         self._old_yaml_index_path = os.path.join(self._db_dir, 'index.yaml')
         self._index_path = os.path.join(self._db_dir, 'index.json')
+        self._journal_path = os.path.join(self._db_dir, _journal_filename)
+        self._snapshot_path = os.path.join(self._db_dir, _snapshot_filename)
         self._lock_path = os.path.join(self._db_dir, 'lock')
 
         # This is for other classes to use to lock prefix directories.
@@ -209,6 +403,26 @@ class Database(object):
         # whether there was an error at the start of a read transaction
         self._error = None
 
+        # secondary indexes for queries, built for the _data they index
+        self._query_index = None
+
+        # generation of the index file; journal entries written for
+        # another generation were already compacted into the index.
+        self._generation = 0
+
+        # size in bytes of the complete entries in the journal
+        self._journal_size = 0
+
+        # keys changed since the last read, to be journaled on write,
+        # and whether the next write must rewrite the whole index.
+        self._changed = set()
+        self._compact = False
+
+        # stamp of the index file when this instance last read or wrote
+        # it, and whether to keep a snapshot of the records built from it
+        self._index_stamp = None
+        self._snapshot = snapshot
+
     def write_transaction(self, timeout=_db_lock_timeout):
         """Get a write lock context manager for use in a `with` block."""
         return WriteTransaction(self.lock, self._read, self._write, timeout)
@@ -275,7 +489,8 @@ class Database(object):
         database = {
             'database': {
                 'installs': installs,
-                'version': str(_db_version)
+                'version': str(_db_version),
+                'generation': self._generation
             }
         }
 
@@ -320,11 +535,14 @@ class Database(object):
                 child = data[dhash].spec
                 spec._add_dependency(child, dtypes)
 
-    def _read_from_file(self, stream, format='json'):
+    def _read_from_file(self, stream, format='json', journal=False):
         """
         Fill database from file, do not maintain old data
         Translate the spec portions from node-dict form to spec form
 
+        If ``journal`` is True, changes recorded in the journal are
+        replayed on top of the records read from the file.
+
         Does not do any locking.
         """
         if format.lower() == 'json':
@@ -361,6 +579,9 @@ class Database(object):
         check('version' in db, "No 'version' in YAML DB.")
 
         installs = db['installs']
+        self._generation = db.get('generation', 0)
+        if journal:
+            self._read_journal(installs)
 
         # TODO: better version checking semantics.
         version = Version(db['version'])
@@ -417,6 +638,186 @@ class Database(object):
             rec.spec._mark_concrete()
 
         self._data = data
+        self._changed.clear()
+
+    def _journal_entries(self):
+        """Yield the changes journaled after the first ``_journal_size``
+        bytes of the journal, advancing ``_journal_size`` past them.
+
+        Each line of the journal is one committed write transaction,
+        mapping the hashes it touched to their new record (or to None
+        if the record was removed).  A trailing line without a newline
+        was left by an interrupted write and is ignored.
+
+        Does not do any locking.
+        """
+        if not os.path.isfile(self._journal_path):
+            return
+
+        with open(self._journal_path, 'rb') as f:
+            f.seek(self._journal_size)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+
+                try:
+                    entry = sjson.load(line.decode('utf-8'))
+                except Exception as e:
+                    raise CorruptDatabaseError(
+                        "error parsing database journal:", str(e))
+                self._journal_size += len(line)
+
+                if entry.get('generation') == self._generation:
+                    yield entry['installs']
+
+    def _read_journal(self, installs):
+        """Replay the whole journal onto the ``installs`` read from the
+        index file.
+
+        Does not do any locking.
+        """
+        self._journal_size = 0
+        for changes in self._journal_entries():
+            for hash_key, rec in changes.items():
+                if rec is None:
+                    installs.pop(hash_key, None)
+                else:
+                    installs[hash_key] = rec
+
+    def _replay_journal(self):
+        """Apply the changes journaled since the last read to the records
+        in memory.
+
+        Returns False if the journal was truncated or removed since, in
+        which case the database has to be read again from its files.
+
+        Does not do any locking.
+        """
+        size = 0
+        if os.path.isfile(self._journal_path):
+            size = os.path.getsize(self._journal_path)
+        if size < self._journal_size:
+            return False
+
+        for changes in self._journal_entries():
+            added = []
+            for hash_key, rec in changes.items():
+                if hash_key in self._data:
+                    self._unindex_record(hash_key)
+                    if rec is None:
+                        del self._data[hash_key]
+                        continue
+                    spec = self._data[hash_key].spec
+                    self._data[hash_key] = InstallRecord.from_dict(spec, rec)
+                    self._index_record(hash_key)
+                elif rec is not None:
+                    added.append(hash_key)
+
+            # New records are built like in _read_from_file()
+            for hash_key in added:
+                spec = self._read_spec_from_dict(hash_key, changes)
+                self._data[hash_key] = InstallRecord.from_dict(
+                    spec, changes[hash_key])
+            for hash_key in added:
+                self._assign_dependencies(hash_key, changes, self._data)
+            for hash_key in added:
+                self._data[hash_key].spec._mark_concrete()
+                self._index_record(hash_key)
+
+        return True
+
+    def _read_snapshot(self, stamp):
+        """Load the records from the snapshot, if it was taken from the
+        index file with the given stamp, and replay the journal since.
+
+        Returns False if there is no usable snapshot.
+
+        Does not do any locking.
+        """
+        if not self._snapshot or not os.path.isfile(self._snapshot_path):
+            return False
+
+        try:
+            with open(self._snapshot_path, 'rb') as f:
+                snapshot = pickle.load(f)
+        except Exception as e:
+            # Truncated, or written by an incompatible Spack or Python.
+            tty.debug('Ignoring database snapshot: {0}'.format(e))
+            return False
+
+        if (snapshot.get('spack') != spack.spack_version or
+                snapshot.get('index') != stamp):
+            return False
+
+        self._data = snapshot['data']
+        self._generation = snapshot['generation']
+        self._journal_size = snapshot['journal_size']
+        self._changed.clear()
+        return self._replay_journal()
+
+    def _write_snapshot(self):
+        """Pickle the records read from the index file, if snapshots are
+        enabled.  Failing to do so is not an error.
+
+        Does not do any locking.
+        """
+        if not self._snapshot:
+            return
+
+        snapshot = {
+            'spack': spack.spack_version,
+            'index': self._index_stamp,
+            'generation': self._generation,
+            'journal_size': self._journal_size,
+            'data': self._data
+        }
+
+        temp_file = self._snapshot_path + (
+            '.%s.%s.temp' % (socket.getfqdn(), os.getpid()))
+        try:
+            with open(temp_file, 'wb') as f:
+                pickle.dump(snapshot, f, _snapshot_protocol)
+            os.rename(temp_file, self._snapshot_path)
+        except Exception as e:
+            tty.debug('Could not write database snapshot: {0}'.format(e))
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+
+    def _write_journal(self):
+        """Append the records changed since the last read to the journal.
+
+        Does not do any locking.
+        """
+        installs = {}
+        for key in self._changed:
+            rec = self._data.get(key)
+            installs[key] = rec.to_dict() if rec is not None else None
+
+        entry = {'generation': self._generation, 'installs': installs}
+        line = json.dumps(entry, separators=(',', ':')) + '\n'
+
+        with open(self._journal_path, 'ab') as f:
+            # drop anything left by an interrupted write before appending
+            f.seek(0, os.SEEK_END)
+            if f.tell() != self._journal_size:
+                f.truncate(self._journal_size)
+            f.write(line.encode('utf-8'))
+        self._journal_size += len(line)
+
+    def _needs_compaction(self):
+        """Whether the next write should rewrite the whole index.
+
+        The journal is compacted once it is larger than the index, so
+        that rewriting the index stays amortized over many writes.
+        """
+        if self._compact or not os.path.isfile(self._index_path):
+            return True
+        return self._journal_size > os.path.getsize(self._index_path)
+
+    def compact(self):
+        """Fold the journal into the index file."""
+        with self.write_transaction():
+            self._compact = True
 
     def reindex(self, directory_layout):
         """Build database index from scratch based on a directory layout.
@@ -429,7 +830,7 @@ class Database(object):
         def _read_suppress_error():
             try:
                 if os.path.isfile(self._index_path):
-                    self._read_from_file(self._index_path)
+                    self._read_from_file(self._index_path, journal=True)
             except CorruptDatabaseError as e:
                 self._error = e
                 self._data = {}
@@ -446,6 +847,9 @@ class Database(object):
                 )
                 self._error = None
 
+            # The rebuilt index replaces the old one and its journal
+            self._compact = True
+
             # Read first the `spec.yaml` files in the prefixes. They should be
             # considered authoritative with respect to DB reindexing, as
             # entries in the DB may be corrupted in a way that still makes
@@ -562,13 +966,29 @@ class Database(object):
         database *may* be left in an inconsistent state.  It will be consistent
         after the start of the next transaction, when it read from disk again.
 
+        Records changed in the transaction are appended to the journal,
+        unless the journal is due for compaction, in which case the
+        whole index is rewritten and the journal is discarded.
+
         This routine does no locking.
 
         """
-        # Do not write if exceptions were raised
+        # Do not write if exceptions were raised, and read the files
+        # again at the start of the next transaction.
         if type is not None:
+            self._index_stamp = None
             return
 
+        if not self._needs_compaction():
+            if self._changed:
+                self._write_journal()
+                self._changed.clear()
+            return
+
+        # Entries journaled against the previous generation are already
+        # in the new index, and must be skipped if the journal survives.
+        self._generation += 1
+
         temp_file = self._index_path + (
             '.%s.%s.temp' % (socket.getfqdn(), os.getpid()))
 
@@ -583,17 +1003,43 @@ class Database(object):
                 os.remove(temp_file)
             raise
 
+        if os.path.exists(self._journal_path):
+            os.remove(self._journal_path)
+        self._journal_size = 0
+        self._changed.clear()
+        self._compact = False
+
+        self._index_stamp = _file_stamp(self._index_path)
+        self._write_snapshot()
+
     def _read(self):
         """Re-read Database from the data in the set location.
 
+        If the index file did not change since this instance last read
+        or wrote it, only the changes journaled since are applied.
+
         This does no locking, with one exception: it will automatically
         migrate an index.yaml to an index.json if possible. This requires
         taking a write lock.
 
         """
-        if os.path.isfile(self._index_path):
-            # Read from JSON file if a JSON database exists
-            self._read_from_file(self._index_path, format='json')
+        stamp = _file_stamp(self._index_path)
+        if stamp is not None:
+            # Records changed in memory but not written out are discarded
+            # by reading the files again.
+            if stamp == self._index_stamp and not self._changed:
+                if self._replay_journal():
+                    return
+
+            self._index_stamp = None
+            if self._read_snapshot(stamp):
+                self._index_stamp = stamp
+            else:
+                # Read from JSON file if a JSON database exists
+                self._read_from_file(
+                    self._index_path, format='json', journal=True)
+                self._index_stamp = stamp
+                self._write_snapshot()
 
         elif os.path.isfile(self._old_yaml_index_path):
             if os.access(self._db_dir, os.R_OK | os.W_OK):
@@ -660,6 +1106,7 @@ class Database(object):
                 self._add(dep, directory_layout, **extra_args)
 
         key = spec.dag_hash()
+        self._changed.add(key)
         if key not in self._data:
             installed = bool(spec.external)
             path = None
@@ -688,11 +1135,13 @@ class Database(object):
                 dkey = dep.spec.dag_hash()
                 new_spec._add_dependency(self._data[dkey].spec, dep.deptypes)
                 self._data[dkey].ref_count += 1
+                self._changed.add(dkey)
 
             # Mark concrete once everything is built, and preserve
             # the original hash of concrete specs.
             new_spec._mark_concrete()
             new_spec._hash = key
+            self._index_record(key)
 
         else:
             # If it is already there, mark it as installed.
@@ -700,6 +1149,26 @@ class Database(object):
 
         self._data[key].explicit = explicit
 
+    def _get_query_index(self):
+        """Return query indexes for the current data, building them if
+        the data was replaced (e.g., re-read) since they were built."""
+        if self._query_index is None or (
+                self._query_index._data is not self._data):
+            self._query_index = _QueryIndex(self._data)
+        return self._query_index
+
+    def _index_record(self, key):
+        """Add a new record to the query indexes, if they are current."""
+        index = self._query_index
+        if index is not None and index._data is self._data:
+            index.add(key, self._data[key])
+
+    def _unindex_record(self, key):
+        """Remove a record from the query indexes, if they are current."""
+        index = self._query_index
+        if index is not None and index._data is self._data:
+            index.remove(key, self._data[key])
+
     @_autospec
     def add(self, spec, directory_layout, explicit=False):
         """Add spec at path to database, locking and reading DB to sync.
@@ -727,6 +1196,18 @@ class Database(object):
         key = self._get_matching_spec_key(spec, **kwargs)
         return self._data[key]
 
+    @_autospec
+    def update_explicit(self, spec, explicit):
+        """Update the explicit flag of an installed spec.
+
+        Records must be changed through the database, rather than
+        directly, so that the change is written out.
+        """
+        with self.write_transaction():
+            key = self._get_matching_spec_key(spec)
+            self._data[key].explicit = explicit
+            self._changed.add(key)
+
     def _decrement_ref_count(self, spec):
         key = spec.dag_hash()
 
@@ -737,8 +1218,10 @@ class Database(object):
 
         rec = self._data[key]
         rec.ref_count -= 1
+        self._changed.add(key)
 
         if rec.ref_count == 0 and not rec.installed:
+            self._unindex_record(key)
             del self._data[key]
             for dep in spec.dependencies(_tracked_deps):
                 self._decrement_ref_count(dep)
@@ -748,11 +1231,13 @@ class Database(object):
         """
         key = self._get_matching_spec_key(spec)
         rec = self._data[key]
+        self._changed.add(key)
 
         if rec.ref_count > 0:
             rec.installed = False
             return rec.spec
 
+        self._unindex_record(key)
         del self._data[key]
         for dep in rec.spec.dependencies(_tracked_deps):
             self._decrement_ref_count(dep)
@@ -882,6 +1367,9 @@ class Database(object):
         # TODO: wildcard spec object, and should specs have attributes
         # TODO: like installed and known that can be queried?  Or are
         # TODO: these really special cases that only belong here?
+        if isinstance(query_spec, string_types):
+            query_spec = spack.spec.Spec(query_spec)
+
         with self.read_transaction():
             # Just look up concrete specs with hashes; no fancy search.
             if isinstance(query_spec, spack.spec.Spec) and query_spec.concrete:
@@ -892,22 +1380,32 @@ class Database(object):
                 else:
                     return []
 
-            # Abstract specs require more work -- currently we test
-            # against everything.
+            # Abstract specs require more work: use the indexes to find
+            # the records that can match, then test each of them.
+            keys = self._get_query_index().candidates(
+                query_spec, start_date, end_date)
+            if keys is None:
+                keys = self._data.keys()
+
             results = []
             start_date = start_date or datetime.datetime.min
             end_date = end_date or datetime.datetime.max
+            known_names = {}
 
-            for key, rec in self._data.items():
+            for key in keys:
+                rec = self._data[key]
                 if installed is not any and rec.installed != installed:
                     continue
 
                 if explicit is not any and rec.explicit != explicit:
                     continue
 
-                if known is not any and spack.repo.path.exists(
-                        rec.spec.name) != known:
-                    continue
+                if known is not any:
+                    name = rec.spec.name
+                    if name not in known_names:
+                        known_names[name] = spack.repo.path.exists(name)
+                    if known_names[name] != known:
+                        continue
 
                 inst_date = datetime.datetime.fromtimestamp(
                     rec.installation_time
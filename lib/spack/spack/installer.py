@@ -0,0 +1,375 @@
+##############################################################################
+# Copyright (c) 2013-2018, Lawrence Livermore National Security, LLC.
+# Produced at the Lawrence Livermore National Laboratory.
+#
+# This file is part of Spack.
+# Created by Todd Gamblin, tgamblin@llnl.gov, All rights reserved.
+# LLNL-CODE-647188
+#
+# For details, see https://github.com/spack/spack
+# Please also see the NOTICE and LICENSE files for our notice and the LGPL.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License (as
+# published by the Free Software Foundation) version 2.1, February 1999.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the IMPLIED WARRANTY OF
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the terms and
+# conditions of the GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+##############################################################################
+"""Concurrent, DAG-aware installation of concrete specs.
+
+``PackageBase.do_install`` installs the dependencies of a spec one at a
+time, in post-order.  On machines with many cores this leaves most of
+the machine idle while a single ``make -j`` runs.  The
+:class:`DagInstaller` in this module instead builds every node of the
+DAG whose dependencies are already installed concurrently, up to a
+configurable number of builds, and splits the total job budget across
+the builds that are running.
+
+Each node is installed in its own worker process, which calls
+``do_install(install_deps=False)`` on the node's package.  Using
+processes rather than threads means that the per-prefix locks taken by
+``Database.prefix_write_lock`` (which are POSIX locks, and hence per
+process) keep protecting each install prefix exactly as they do for
+concurrent ``spack install`` invocations.
+
+The prefix locks also let several Spack processes (e.g., one per node
+of a batch job) cooperate on a shared install tree.  A worker *claims*
+its node by taking the node's prefix write lock without waiting before
+it starts, and holds it for the whole install.  If another process
+already holds it, the node is being built elsewhere: the installer
+sets it aside, keeps building other nodes, and checks back until the
+lock is released.  At that point the node is either installed, and is
+not rebuilt, or the other process failed and this one builds it.
+
+"""
+import multiprocessing
+import select
+import time
+
+import llnl.util.tty as tty
+from llnl.util.lock import LockTimeoutError
+from llnl.util.tty.color import colorize
+
+import spack.config
+import spack.package
+import spack.store
+from spack.error import SpackError
+
+__all__ = ['DagInstaller', 'DagInstallError']
+
+#: Results sent back by worker processes.
+_installed, _failed, _busy = 'installed', 'failed', 'busy'
+
+
+def _install_node(conn, spec, explicit, kwargs):
+    """Body of the worker process that installs a single DAG node.
+
+    Sends a tuple ``(status, elapsed time, error message)`` back to the
+    parent through ``conn``.  The status is ``'busy'`` if another process
+    holds the node's prefix lock, i.e., is installing it.
+    """
+    start_time = time.time()
+    claim = spack.store.db.prefix_lock(spec)
+    try:
+        claim.acquire_write(timeout=0)
+    except LockTimeoutError:
+        result = (_busy, 0.0, None)
+    else:
+        try:
+            spec.package.do_install(install_deps=False, explicit=explicit,
+                                    **kwargs)
+            result = (_installed, time.time() - start_time, None)
+
+        except BaseException as e:
+            msg = '{0}: {1}'.format(type(e).__name__, str(e))
+            result = (_failed, time.time() - start_time, msg)
+
+        finally:
+            claim.release_write()
+
+    try:
+        conn.send(result)
+    finally:
+        conn.close()
+
+
+def _prefix_is_locked(spec):
+    """True if some process holds the write lock on ``spec``'s prefix."""
+    lock = spack.store.db.prefix_lock(spec)
+    try:
+        lock.acquire_read(timeout=0)
+    except LockTimeoutError:
+        return True
+    lock.release_read()
+    return False
+
+
+class DagInstaller(object):
+    """Installs the DAGs of several concrete specs, building independent
+    nodes concurrently.
+
+    Args:
+        specs (list of Spec): concrete root specs to install, along with
+            all of their dependencies
+        explicit (bool): whether the roots are marked as explicitly
+            installed in the database.  Dependencies never are.
+        jobs (int): total number of make jobs to split among the builds
+            that run at the same time. Defaults to ``config:build_jobs``.
+        concurrent_builds (int): maximum number of packages built at the
+            same time. Defaults to ``config:concurrent_builds``.
+        fail_fast (bool): if True, stop starting new builds as soon as
+            one fails; builds already running are allowed to finish.
+            If False, keep installing every node that does not depend
+            on a failed one.
+        **kwargs: passed through to ``PackageBase.do_install`` for each
+            node.
+    """
+
+    #: Seconds to wait for a running build to finish between checks
+    poll_interval = 0.1
+
+    #: Seconds between checks on nodes being built by other processes
+    busy_interval = 1.0
+
+    def __init__(self, specs, explicit=False, jobs=None,
+                 concurrent_builds=None, fail_fast=True, **kwargs):
+        self.explicit = explicit
+        self.jobs = jobs or spack.config.get(
+            'config:build_jobs') or multiprocessing.cpu_count()
+        self.concurrent_builds = max(1, concurrent_builds or spack.config.get(
+            'config:concurrent_builds', 1))
+        self.fail_fast = fail_fast
+        self.install_args = kwargs
+
+        #: nodes by DAG hash, in a post-order (dependencies first)
+        self.nodes = {}
+        self.order = []
+        self.roots = set()
+
+        #: uninstalled dependencies of each node
+        self.pending = {}
+
+        #: reverse edges, used to release dependents of installed nodes
+        self.dependents = {}
+
+        for root in specs:
+            self.roots.add(root.dag_hash())
+            for spec in root.traverse(order='post'):
+                key = spec.dag_hash()
+                if key in self.nodes:
+                    continue
+                self.nodes[key] = spec
+                self.order.append(key)
+                deps = set(d.dag_hash() for d in spec.dependencies())
+                self.pending[key] = deps
+                for dkey in deps:
+                    self.dependents.setdefault(dkey, set()).add(key)
+
+        #: wall time spent installing each node
+        self.timings = {}
+
+        #: error messages of nodes whose install failed
+        self.failed = {}
+
+        #: nodes not attempted because a dependency failed
+        self.skipped = set()
+
+        #: nodes being installed by another process, with the time they
+        #: were last found busy
+        self.busy = {}
+
+        #: nodes we found being installed by another process
+        self.waited_for = set()
+
+    def _make_jobs_for_next_build(self, nready):
+        """Share of the job budget given to a build that is starting now.
+
+        The budget is split among the builds that can run right now, so
+        a lone build at the bottom or top of the DAG gets all of it.
+        """
+        nbuilds = min(self.concurrent_builds, max(1, nready))
+        return max(1, self.jobs // nbuilds)
+
+    def _start(self, key, nready):
+        spec = self.nodes[key]
+        kwargs = dict(self.install_args)
+        kwargs['make_jobs'] = self._make_jobs_for_next_build(nready)
+
+        parent_conn, child_conn = multiprocessing.Pipe(False)
+        process = multiprocessing.Process(
+            target=_install_node,
+            args=(child_conn, spec, self.explicit and key in self.roots,
+                  kwargs))
+        process.start()
+
+        # Close our end of the child's pipe, so that a worker that dies
+        # without reporting shows up as EOF on parent_conn.
+        child_conn.close()
+
+        tty.debug('Started install of {0} with {1} make jobs'.format(
+            spec.cshort_spec, kwargs['make_jobs']))
+        return process, parent_conn
+
+    def _skip_dependents(self, key):
+        for dkey in self.dependents.get(key, ()):
+            if dkey not in self.skipped:
+                self.skipped.add(dkey)
+                self._skip_dependents(dkey)
+
+    def _check_busy(self, ready):
+        """Put nodes whose prefix lock was released back in ``ready``."""
+        now = time.time()
+        for key, last_check in list(self.busy.items()):
+            if now - last_check < self.busy_interval:
+                continue
+            if _prefix_is_locked(self.nodes[key]):
+                self.busy[key] = now
+            else:
+                del self.busy[key]
+                ready.append(key)
+
+    def _finished(self, key, success, elapsed, msg, ready):
+        self.timings[key] = elapsed
+        if not success:
+            self.failed[key] = msg
+            self._skip_dependents(key)
+            tty.error('Failed to install {0}: {1}'.format(
+                self.nodes[key].name, msg))
+            return
+
+        for dkey in self.dependents.get(key, ()):
+            self.pending[dkey].discard(key)
+            if not self.pending[dkey] and dkey not in self.skipped:
+                ready.append(dkey)
+
+    def install(self):
+        """Install every node, returning the install time of each node.
+
+        Raises:
+            DagInstallError: if any node failed to install.
+        """
+        ready = [k for k in self.order if not self.pending[k]]
+        running = {}
+
+        while ready or running or self.busy:
+            stop = self.failed and self.fail_fast
+            if stop and not running:
+                break
+
+            self._check_busy(ready)
+            while ready and not stop and (
+                    len(running) < self.concurrent_builds):
+                key = ready.pop(0)
+                spec = self.nodes[key]
+
+                # Skip the fork for dependencies that are already there.
+                # Other processes write the DB, so re-read it first.
+                if key not in self.roots:
+                    with spack.store.db.read_transaction():
+                        installed = spec.package.installed
+                    if installed:
+                        if key in self.waited_for:
+                            tty.msg('{0} was installed by another '
+                                    'process'.format(spec.name))
+                        self._finished(key, True, 0.0, None, ready)
+                        continue
+
+                running[key] = self._start(
+                    key, len(ready) + len(running) + 1)
+
+            # Without running builds, this just waits for busy nodes.
+            conns = dict((conn.fileno(), key)
+                         for key, (_, conn) in running.items())
+            readable, _, _ = select.select(
+                list(conns), [], [], self.poll_interval)
+
+            for fd in readable:
+                key = conns[fd]
+                process, conn = running.pop(key)
+                try:
+                    status, elapsed, msg = conn.recv()
+                except EOFError:
+                    status, elapsed, msg = (
+                        _failed, 0.0, 'install process exited unexpectedly')
+                conn.close()
+                process.join()
+
+                if status == _busy:
+                    tty.msg('{0} is being installed by another process, '
+                            'waiting for it'.format(self.nodes[key].name))
+                    self.busy[key] = time.time()
+                    self.waited_for.add(key)
+                else:
+                    self._finished(
+                        key, status == _installed, elapsed, msg, ready)
+
+        self._report()
+
+        if self.failed or self.skipped:
+            failed = [k for k in self.order if k in self.failed]
+            skipped = [k for k in self.order if k in self.skipped]
+            # left over when fail_fast stopped the installation
+            not_started = [k for k in self.order if k not in self.timings
+                           and k not in self.skipped]
+            raise DagInstallError(
+                [self.nodes[k] for k in failed],
+                [self.nodes[k] for k in skipped],
+                [self.failed[k] for k in failed],
+                [self.nodes[k] for k in not_started])
+
+        return dict((self.nodes[k], t) for k, t in self.timings.items())
+
+    def _report(self):
+        """Print the wall time taken by each node that was installed."""
+        built = [k for k in self.order if self.timings.get(k)]
+        if not built:
+            return
+
+        width = max(len(self.nodes[k].cshort_spec) for k in built)
+        lines = []
+        for key in built:
+            status = 'failed' if key in self.failed else 'done'
+            lines.append('    {0:<{1}}  {2:>10}  {3}'.format(
+                self.nodes[key].cshort_spec, width,
+                spack.package._hms(self.timings[key]), status))
+
+        tty.msg(colorize('@*{Install times} (%d concurrent builds, '
+                         '%d jobs)' % (self.concurrent_builds, self.jobs)),
+                *lines)
+
+
+class DagInstallError(SpackError):
+    """Raised when some nodes of a DAG could not be installed.
+
+    Args:
+        failed (list): nodes whose installation failed
+        skipped (list): nodes not installed because a dependency failed
+        messages (list): error message of each of the ``failed`` nodes
+        not_started (list): nodes that were not installed because the
+            installation stopped at the first failure
+    """
+
+    def __init__(self, failed, skipped, messages, not_started=()):
+        self.failed = failed
+        self.skipped = skipped
+        self.not_started = list(not_started)
+        long_msg = '\n'.join(
+            '{0}: {1}'.format(s.cshort_spec, m)
+            for s, m in zip(failed, messages))
+        if skipped:
+            long_msg += '\nNot installed because a dependency failed: '
+            long_msg += ', '.join(s.name for s in skipped)
+        if self.not_started:
+            long_msg += '\nNot installed after the first failure: '
+            long_msg += ', '.join(s.name for s in self.not_started)
+        super(DagInstallError, self).__init__(
+            'Failed to install %d package(s): %s' % (
+                len(failed), ', '.join(s.name for s in failed)),
+            long_msg)
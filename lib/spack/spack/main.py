@@ -33,25 +33,22 @@ import sys
 import re
 import os
 import inspect
+import json
 import pstats
 import argparse
+import zlib
 from six import StringIO
 
 import llnl.util.tty as tty
-from llnl.util.tty.log import log_output
 
 import spack
-import spack.architecture
-import spack.config
-import spack.cmd
-import spack.hooks
 import spack.paths
-import spack.repo
-import spack.store
-import spack.util.debug
-import spack.util.path
 from spack.error import SpackError
 
+# Everything else (spack.config, spack.cmd, spack.repo, spack.spec, ...)
+# is imported where it is needed, so that `spack --version`, `spack help`
+# and commands that do not need them start quickly.
+
 
 #: names of profile statistics
 stat_names = pstats.Stats.sort_arg_dict_default
@@ -113,13 +110,43 @@ def set_working_dir():
 
 def add_all_commands(parser):
     """Add all spack subcommands to the parser."""
+    import spack.cmd
     for cmd in spack.cmd.all_commands():
         parser.add_command(cmd)
 
 
-def index_commands():
-    """create an index of commands by section for this help level"""
-    index = {}
+#: Cached properties of all commands, read by ``command_index()``
+_command_index = None
+
+
+def command_index_path():
+    """Path of the file caching the properties of all commands.
+
+    It lives in the user's Spack directory, so that it is found without
+    reading any configuration, and its name depends on the Spack prefix
+    so that different Spack instances do not share it.
+    """
+    prefix_hash = zlib.crc32(spack.paths.prefix.encode('utf-8')) & 0xffffffff
+    return os.path.join(
+        spack.paths.user_config_path, 'cache',
+        'commands-{0:08x}.json'.format(prefix_hash))
+
+
+def _command_stamps():
+    """Modification times of the command modules, by file name."""
+    stamps = {}
+    for name in os.listdir(spack.paths.command_path):
+        if name.endswith('.py'):
+            path = os.path.join(spack.paths.command_path, name)
+            stamps[name] = os.stat(path).st_mtime
+    return stamps
+
+
+def _read_command_properties():
+    """Import all command modules and read the properties help needs."""
+    import spack.cmd
+
+    commands = {}
     for command in spack.cmd.all_commands():
         cmd_module = spack.cmd.get_module(command)
 
@@ -130,12 +157,59 @@ def index_commands():
                 tty.die("Command doesn't define a property '%s': %s"
                         % (p, command))
 
+        commands[command] = dict(
+            (p, getattr(cmd_module, p)) for p in required_command_properties)
+    return commands
+
+
+def command_index():
+    """Level, section and description of all commands, by command name.
+
+    Reading them requires importing every command module, which is slow,
+    so they are cached in ``command_index_path()`` and read from there
+    until a command module changes.
+    """
+    global _command_index
+    if _command_index is not None:
+        return _command_index
+
+    path = command_index_path()
+    stamps = _command_stamps()
+    try:
+        with open(path) as f:
+            data = json.load(f)
+        if data['stamps'] == stamps:
+            _command_index = data['commands']
+    except (IOError, OSError, ValueError, KeyError, TypeError):
+        pass
+
+    if _command_index is None:
+        _command_index = _read_command_properties()
+
+        # the cache is only an optimization: failing to write it is fine
+        tmp = '{0}.{1}.tmp'.format(path, os.getpid())
+        try:
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(tmp, 'w') as f:
+                json.dump({'stamps': stamps, 'commands': _command_index}, f)
+            os.rename(tmp, path)
+        except (IOError, OSError):
+            tty.debug('Could not write command index: {0}'.format(path))
+
+    return _command_index
+
+
+def index_commands():
+    """create an index of commands by section for this help level"""
+    index = {}
+    for command, properties in command_index().items():
         # add commands to lists for their level and higher levels
         for level in reversed(levels):
             level_sections = index.setdefault(level, {})
-            commands = level_sections.setdefault(cmd_module.section, [])
+            commands = level_sections.setdefault(properties['section'], [])
             commands.append(command)
-            if level == cmd_module.level:
+            if level == properties['level']:
                 break
 
     return index
@@ -167,19 +241,12 @@ class SpackArgumentParser(argparse.ArgumentParser):
         if level not in levels:
             raise ValueError("level must be one of: %s" % levels)
 
-        # lazily add all commands to the parser when needed.
-        add_all_commands(self)
-
         """Print help on subcommands in neatly formatted sections."""
         formatter = self._get_formatter()
 
-        # Create a list of subcommand actions. Argparse internals are nasty!
-        # Note: you can only call _get_subactions() once.  Even nastier!
-        if not hasattr(self, 'actions'):
-            self.actions = self._subparsers._actions[-1]._get_subactions()
-
-        # make a set of commands not yet added.
-        remaining = set(spack.cmd.all_commands())
+        # Commands are listed from the command index rather than from
+        # subparsers, so that help does not import every command module.
+        cmd_index = command_index()
 
         def add_group(group):
             formatter.start_section(group.title)
@@ -189,18 +256,11 @@ class SpackArgumentParser(argparse.ArgumentParser):
 
         def add_subcommand_group(title, commands):
             """Add informational help group for a specific subcommand set."""
-            cmd_set = set(c for c in commands)
-
-            # make a dict of commands of interest
-            cmds = dict((a.metavar, a) for a in self.actions
-                        if a.metavar in cmd_set)
-
-            # add commands to a group in order, and add the group
             group = argparse._ArgumentGroup(self, title=title)
             for name in commands:
-                group._add_action(cmds[name])
-                if name in remaining:
-                    remaining.remove(name)
+                group._add_action(argparse.Action(
+                    option_strings=[], dest=name, metavar=name,
+                    help=cmd_index[name]['description']))
             add_group(group)
 
         # select only the options for the particular level we're showing.
@@ -214,7 +274,9 @@ class SpackArgumentParser(argparse.ArgumentParser):
 
         # custom, more concise usage for top level
         help_options = self._optionals._group_actions
-        help_options = help_options + [self._positionals._group_actions[-1]]
+        help_options = help_options + [argparse.Action(
+            option_strings=[], dest='command', metavar='COMMAND',
+            nargs=argparse.PARSER)]
         formatter.add_usage(
             self.usage, help_options, self._mutually_exclusive_groups)
 
@@ -288,6 +350,7 @@ class SpackArgumentParser(argparse.ArgumentParser):
 
         # each command module implements a parser() function, to which we
         # pass its subparser for setup.
+        import spack.cmd
         module = spack.cmd.get_module(cmd_name)
         subparser = self.subparsers.add_parser(
             cmd_name, help=module.description, description=module.description)
@@ -373,6 +436,9 @@ def make_argument_parser(**kwargs):
     parser.add_argument(
         '--print-shell-vars', action='store',
         help="print info needed by setup-env.[c]sh")
+    parser.add_argument(
+        '--time-startup', action='store_true',
+        help="report CPU time spent starting up before running the command")
 
     return parser
 
@@ -384,6 +450,22 @@ def setup_main_options(args):
     tty.set_debug(args.debug)
     tty.set_stacktrace(args.stacktrace)
 
+    # only import the configuration if an option changes it, so that
+    # commands that do not need it (like help) start faster.
+    if args.debug or args.locks is not None or args.mock or args.insecure:
+        _setup_config_options(args)
+
+    # when to use color (takes always, auto, or never)
+    tty.color.set_color_when(args.color)
+
+
+def _setup_config_options(args):
+    """Apply the basic options that modify configuration or repositories."""
+    import spack.config
+    import spack.repo
+    import spack.util.debug
+    import spack.util.lock
+
     # debug must be set first so that it can even affect behvaior of
     # errors raised by spack.config.
     if args.debug:
@@ -405,9 +487,6 @@ def setup_main_options(args):
         tty.warn("You asked for --insecure. Will NOT check SSL certificates.")
         spack.config.set('config:verify_ssl', False, scope='command_line')
 
-    # when to use color (takes always, auto, or never)
-    tty.color.set_color_when(args.color)
-
 
 def allows_unknown_args(command):
     """Implements really simple argument injection for unknown arguments.
@@ -481,6 +560,8 @@ class SpackCommand(object):
 
         fail_on_error = kwargs.get('fail_on_error', True)
 
+        from llnl.util.tty.log import log_output
+
         out = StringIO()
         try:
             with log_output(out):
@@ -548,6 +629,11 @@ def print_setup_info(*info):
     invoke spack in login scripts, and it needs to be quick.
 
     """
+    import spack.architecture
+    import spack.config
+    import spack.store
+    import spack.util.path
+
     shell = 'csh' if 'csh' in info else 'sh'
 
     def shell_set(var, value):
@@ -577,6 +663,17 @@ def print_setup_info(*info):
             shell_set('_sp_module_prefix', 'not_installed')
 
 
+def report_startup_time():
+    """Print CPU time used by this process so far, for ``--time-startup``.
+
+    This includes starting the interpreter and importing Spack, which is
+    what makes short commands like ``spack --version`` slow.
+    """
+    times = os.times()
+    tty.info('Startup took {0:.0f} ms (user + system CPU time)'.format(
+        (times[0] + times[1]) * 1000), stream=sys.stderr)
+
+
 def main(argv=None):
     """This is the entry point for the Spack command.
 
@@ -594,7 +691,7 @@ def main(argv=None):
 
     # make spack.config aware of any command line configuration scopes
     if args.config_scopes:
-        spack.config.command_line_scopes = args.config_scopes
+        _set_command_line_scopes(args.config_scopes)
 
     if args.print_shell_vars:
         print_setup_info(*args.print_shell_vars.split(','))
@@ -609,10 +706,15 @@ def main(argv=None):
     # -h, -H, and -V are special as they do not require a command, but
     # all the other options do nothing without a command.
     if args.version:
+        if args.time_startup:
+            report_startup_time()
         print(spack.spack_version)
         return 0
     elif args.help:
-        sys.stdout.write(parser.format_help(level=args.help))
+        help_text = parser.format_help(level=args.help)
+        if args.time_startup:
+            report_startup_time()
+        sys.stdout.write(help_text)
         return 0
     elif not args.command:
         parser.print_help()
@@ -628,18 +730,24 @@ def main(argv=None):
         try:
             command = parser.add_command(cmd_name)
         except ImportError:
-            if spack.config.get('config:debug'):
+            if _debug_enabled():
                 raise
             tty.die("Unknown command: %s" % args.command[0])
 
         # Re-parse with the proper sub-parser added.
-        args, unknown = parser.parse_known_args()
+        args, unknown = parser.parse_known_args(argv)
 
         # many operations will fail without a working directory.
         set_working_dir()
 
-        # pre-run hooks happen after we know we have a valid working dir
-        spack.hooks.pre_run()
+        # pre-run hooks happen after we know we have a valid working dir.
+        # They check the configuration, which help does not read, so skip
+        # them (and loading the hook modules) there.
+        if cmd_name != 'help':
+            _run_pre_run_hooks()
+
+        if args.time_startup:
+            report_startup_time()
 
         # now we can actually execute the command.
         if args.spack_profile or args.sorted_profile:
@@ -656,7 +764,7 @@ def main(argv=None):
         e.die()  # gracefully die on any SpackErrors
 
     except Exception as e:
-        if spack.config.get('config:debug'):
+        if _debug_enabled():
             raise
         tty.die(str(e))
 
@@ -668,5 +776,23 @@ def main(argv=None):
         return e.code
 
 
+# The helpers below import modules for main(), which cannot do it itself:
+# a local import would make ``spack`` a local variable there.
+def _set_command_line_scopes(scopes):
+    import spack.config
+    spack.config.command_line_scopes = scopes
+
+
+def _run_pre_run_hooks():
+    import spack.hooks
+    spack.hooks.pre_run()
+
+
+def _debug_enabled():
+    """Whether ``config:debug`` is set, to let errors propagate."""
+    import spack.config
+    return spack.config.get('config:debug')
+
+
 class SpackCommandError(Exception):
     """Raised when SpackCommand execution fails."""
@@ -58,6 +58,7 @@ import spack.directory_layout
 import spack.error
 import spack.fetch_strategy as fs
 import spack.hooks
+import spack.installer
 import spack.mirror
 import spack.mixins
 import spack.repo
@@ -1306,27 +1307,38 @@ class PackageBase(with_metaclass(PackageMeta, PackageViewMixin, object)):
     def _update_explicit_entry_in_db(self, rec, explicit):
         if explicit and not rec.explicit:
             with spack.store.db.write_transaction():
-                rec = spack.store.db.get_record(self.spec)
-                rec.explicit = True
+                spack.store.db.update_explicit(self.spec, True)
                 message = '{s.name}@{s.version} : marking the package explicit'
                 tty.msg(message.format(s=self))
 
     def try_install_from_binary_cache(self, explicit):
         tty.msg('Searching for binary cache of %s' % self.name)
-        specs = binary_distribution.get_specs()
+        if self.spec.dag_hash() not in binary_distribution.binary_index():
+            return False
         binary_spec = spack.spec.Spec.from_dict(self.spec.to_dict())
         binary_spec._mark_concrete()
-        if binary_spec not in specs:
-            return False
         tty.msg('Installing %s from binary cache' % self.name)
-        tarball = binary_distribution.download_tarball(binary_spec)
-        binary_distribution.extract_tarball(
-            binary_spec, tarball, allow_root=False,
-            unsigned=False, force=False)
-        spack.store.db.add(
-            self.spec, spack.store.layout, explicit=explicit)
+        binary_distribution.install_from_cache(
+            [binary_spec], allow_root=False, unsigned=False, force=False,
+            explicit=explicit)
         return True
 
+    def _install_dependencies_from_binary_cache(self):
+        """Install the dependencies of this package that have a binary
+        package on a mirror with :func:`install_from_cache`, which
+        downloads and extracts them concurrently.  Dependencies that
+        could not be installed this way are left to ``do_install``."""
+        index = binary_distribution.binary_index()
+        deps = [d for d in self.spec.traverse(root=False)
+                if d.dag_hash() in index and not d.external]
+        if not deps:
+            return
+        try:
+            binary_distribution.install_from_cache(
+                deps, explicit=False, hooks=True)
+        except spack.installer.DagInstallError as e:
+            tty.debug(e.message, e.long_message)
+
     def do_install(self,
                    keep_prefix=False,
                    keep_stage=False,
@@ -1367,6 +1379,12 @@ class PackageBase(with_metaclass(PackageMeta, PackageViewMixin, object)):
                 all packages, or a list of package names to run tests for some
             dirty (bool): Don't clean the build environment before installing.
             force (bool): Install again, even if already installed.
+            concurrent_builds (int): Install up to this many dependencies
+                at the same time, splitting ``make_jobs`` among them. See
+                :class:`spack.installer.DagInstaller`. Default is 1.
+            keep_going (bool): With ``concurrent_builds``, keep installing
+                the dependencies that do not depend on a failed one
+                instead of stopping at the first failure.
         """
         if not self.spec.concrete:
             raise ValueError("Can only install concrete packages: %s."
@@ -1397,10 +1415,37 @@ class PackageBase(with_metaclass(PackageMeta, PackageViewMixin, object)):
                     self.stage.destroy()
                 return self._update_explicit_entry_in_db(rec, explicit)
 
+        concurrent_builds = kwargs.pop('concurrent_builds', None) or 1
+        keep_going = kwargs.pop('keep_going', False)
         self._do_install_pop_kwargs(kwargs)
 
+        # Restore the dependencies that have binaries all at once, and
+        # install the rest below.
+        if install_deps and kwargs.get('use_cache', False):
+            self._install_dependencies_from_binary_cache()
+
         # First, install dependencies recursively.
-        if install_deps:
+        if install_deps and concurrent_builds > 1:
+            tty.debug('Installing {0} dependencies concurrently'.format(
+                self.name))
+            installer = spack.installer.DagInstaller(
+                self.spec.dependencies(),
+                explicit=False,
+                jobs=make_jobs,
+                concurrent_builds=concurrent_builds,
+                fail_fast=not keep_going,
+                keep_prefix=keep_prefix,
+                keep_stage=keep_stage,
+                install_source=install_source,
+                fake=fake,
+                skip_patch=skip_patch,
+                verbose=verbose,
+                tests=tests,
+                dirty=dirty,
+                **kwargs)
+            installer.install()
+
+        elif install_deps:
             tty.debug('Installing {0} dependencies'.format(self.name))
             for dep in self.spec.traverse(order='post', root=False):
                 dep.package.do_install(
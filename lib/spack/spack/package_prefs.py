@@ -93,6 +93,7 @@ class PackagePrefs(object):
 
     """
     _packages_config_cache = None
+    _order_cache = {}
     _spec_cache = {}
 
     def __init__(self, pkgname, component, vpkg=None):
@@ -136,6 +137,15 @@ class PackagePrefs(object):
         """Given a package name, sort component (e.g, version, compiler, ...),
            and an optional vpkg, return the list from the packages config.
         """
+        key = (pkgname, component, vpkg, all)
+        order = cls._order_cache.get(key)
+        if order is None:
+            order = cls._order_from_config(pkgname, component, vpkg, all)
+            cls._order_cache[key] = order
+        return order
+
+    @classmethod
+    def _order_from_config(cls, pkgname, component, vpkg, all):
         pkglist = [pkgname]
         if all:
             pkglist.append('all')
@@ -178,6 +188,7 @@ class PackagePrefs(object):
     @classmethod
     def clear_caches(cls):
         cls._packages_config_cache = None
+        cls._order_cache = {}
         cls._spec_cache = {}
 
     @classmethod
@@ -31,6 +31,10 @@ from six import string_types
 import spack.error
 
 
+#: Characters for which text is split into words by shlex
+_shell_chars = re.compile(r'[\'"\\]')
+
+
 class Token:
     """Represents tokens; generated from input by lexer and fed to parse()."""
 
@@ -54,56 +58,55 @@ class Token:
 
 
 class Lexer(object):
-    """Base class for Lexers that keep track of line numbers."""
+    """Base class for Lexers that keep track of line numbers.
+
+    A lexicon is a list of ``(regex, type)`` pairs.  Text matching
+    ``regex`` becomes a token of that type, or is skipped if the type is
+    None; earlier pairs take precedence.  The lexer starts with
+    ``lexicon0``, switches to ``lexicon1`` after a token with a type in
+    ``mode_switches_01``, and back after one in ``mode_switches_10``.
+
+    The patterns of each lexicon are compiled into a single regular
+    expression, and the type of a match is found from the group that
+    matched, so each word is scanned in one pass.
+    """
 
     def __init__(self, lexicon0, mode_switches_01=[],
                  lexicon1=[], mode_switches_10=[]):
-        self.scanner0 = re.Scanner(lexicon0)
-        self.mode_switches_01 = mode_switches_01
-        self.scanner1 = re.Scanner(lexicon1)
-        self.mode_switches_10 = mode_switches_10
-        self.mode = 0
-
-    def token(self, type, value=''):
-        if self.mode == 0:
-            return Token(type, value,
-                         self.scanner0.match.start(0),
-                         self.scanner0.match.end(0))
-        else:
-            return Token(type, value,
-                         self.scanner1.match.start(0),
-                         self.scanner1.match.end(0))
-
-    def lex_word(self, word):
-        scanner = self.scanner0
-        mode_switches = self.mode_switches_01
-        if self.mode == 1:
-            scanner = self.scanner1
-            mode_switches = self.mode_switches_10
-
-        tokens, remainder = scanner.scan(word)
-        remainder_used = 0
-
-        for i, t in enumerate(tokens):
-            if t.type in mode_switches:
-                # Combine post-switch tokens with remainder and
-                # scan in other mode
-                self.mode = 1 - self.mode  # swap 0/1
-                remainder_used = 1
-                tokens = tokens[:i + 1] + self.lex_word(
-                    word[word.index(t.value) + len(t.value):])
-                break
-
-        if remainder and not remainder_used:
-            raise LexError("Invalid character", word, word.index(remainder))
-
-        return tokens
+        self.scanners = (self._compile(lexicon0), self._compile(lexicon1))
+        self.mode_switches = (frozenset(mode_switches_01),
+                              frozenset(mode_switches_10))
+
+    @staticmethod
+    def _compile(lexicon):
+        """Return the regular expression matching any token of
+        ``lexicon``, and the token types by the index of their group."""
+        patterns, types, group = [], {}, 1
+        for regex, type in lexicon:
+            patterns.append('(%s)' % regex)
+            types[group] = type
+            group += 1 + re.compile(regex).groups
+        return re.compile('|'.join(patterns)), types
 
     def lex(self, text):
+        """Return the tokens in ``text``, a list of words."""
         lexed = []
+        mode = 0
+        regex, types = self.scanners[mode]
         for word in text:
-            tokens = self.lex_word(word)
-            lexed.extend(tokens)
+            pos, end = 0, len(word)
+            while pos < end:
+                match = regex.match(word, pos)
+                if match is None or match.end() == pos:
+                    raise LexError("Invalid character", word, pos)
+                pos = match.end()
+                type = types[match.lastindex]
+                if type is None:
+                    continue
+                lexed.append(Token(type, match.group(), match.start(), pos))
+                if type in self.mode_switches[mode]:
+                    mode = 1 - mode
+                    regex, types = self.scanners[mode]
         return lexed
 
 
@@ -162,7 +165,11 @@ class Parser(object):
 
     def setup(self, text):
         if isinstance(text, string_types):
-            text = shlex.split(text)
+            # shlex is slow, and only needed for quotes and escapes
+            if _shell_chars.search(text):
+                text = shlex.split(text)
+            else:
+                text = text.split()
         self.text = text
         self.push_tokens(self.lexer.lex(text))
 
@@ -29,11 +29,11 @@ throughout Spack and should bring in a minimal number of external
 dependencies.
 """
 import os
-from llnl.util.filesystem import ancestor
 
 
 #: This file lives in $prefix/lib/spack/spack/__file__
-prefix = ancestor(__file__, 4)
+prefix = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..', '..', '..'))
 
 #: synonym for prefix
 spack_root = prefix
@@ -85,7 +85,15 @@ class ProviderIndex(object):
 
             self.update(spec)
 
-    def update(self, spec):
+    def update(self, spec, provided=None):
+        """Add the virtual packages provided by ``spec`` to the index.
+
+        Args:
+            spec (Spec or str): provider to add
+            provided (dict): the ``provided`` attribute of the provider's
+                package, if already known.  It is read from the package
+                class otherwise.
+        """
         if not isinstance(spec, spack.spec.Spec):
             spec = spack.spec.Spec(spec)
 
@@ -95,7 +103,9 @@ class ProviderIndex(object):
 
         assert(not spec.virtual)
 
-        pkg_provided = spec.package_class.provided
+        pkg_provided = provided
+        if pkg_provided is None:
+            pkg_provided = spec.package_class.provided
         for provided_spec, provider_specs in iteritems(pkg_provided):
             for provider_spec in provider_specs:
                 # TODO: fix this comment.
@@ -188,31 +198,25 @@ class ProviderIndex(object):
 
         return all(c in result for c in common)
 
-    def to_yaml(self, stream=None):
+    def to_dict(self):
+        """Dictionary of this index, with its specs as node dicts."""
         provider_list = self._transform(
             lambda vpkg, pset: [
                 vpkg.to_node_dict(), [p.to_node_dict() for p in pset]], list)
-
-        syaml.dump({'provider_index': {'providers': provider_list}},
-                   stream=stream)
+        return {'provider_index': {'providers': provider_list}}
 
     @staticmethod
-    def from_yaml(stream):
-        try:
-            yfile = syaml.load(stream)
-        except MarkedYAMLError as e:
-            raise spack.spec.SpackYAMLError(
-                "error parsing YAML ProviderIndex cache:", str(e))
+    def from_dict(d):
+        """Read an index from a dictionary made by ``to_dict()``."""
+        if not isinstance(d, dict):
+            raise ProviderIndexError("ProviderIndex was not a dict.")
 
-        if not isinstance(yfile, dict):
-            raise ProviderIndexError("YAML ProviderIndex was not a dict.")
-
-        if 'provider_index' not in yfile:
+        if 'provider_index' not in d:
             raise ProviderIndexError(
-                "YAML ProviderIndex does not start with 'provider_index'")
+                "ProviderIndex does not start with 'provider_index'")
 
         index = ProviderIndex()
-        providers = yfile['provider_index']['providers']
+        providers = d['provider_index']['providers']
         index.providers = _transform(
             providers,
             lambda vpkg, plist: (
@@ -220,6 +224,19 @@ class ProviderIndex(object):
                 set(spack.spec.Spec.from_node_dict(p) for p in plist)))
         return index
 
+    def to_yaml(self, stream=None):
+        syaml.dump(self.to_dict(), stream=stream)
+
+    @staticmethod
+    def from_yaml(stream):
+        try:
+            yfile = syaml.load(stream)
+        except MarkedYAMLError as e:
+            raise spack.spec.SpackYAMLError(
+                "error parsing YAML ProviderIndex cache:", str(e))
+
+        return ProviderIndex.from_dict(yfile)
+
     def merge(self, other):
         """Merge `other` ProviderIndex into this one."""
         other = other.copy()   # defensive copy.
@@ -23,13 +23,19 @@
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
 ##############################################################################
 
+import mmap
 import os
 import platform
 import re
+import struct
+import threading
+from contextlib import closing
+
 import spack.repo
 import spack.cmd
+import spack.util.elf as elf
 from spack.util.executable import Executable, ProcessError
-from llnl.util.filesystem import filter_file
+from llnl.util.filesystem import writable
 import llnl.util.tty as tty
 
 
@@ -45,6 +51,11 @@ class InstallRootStringException(spack.error.SpackError):
             (file_path, root_path))
 
 
+#: Serializes get_patchelf(), which binary packages installed in parallel
+#: threads may call at the same time
+_patchelf_lock = threading.Lock()
+
+
 def get_patchelf():
     """
     Builds and installs spack patchelf package on linux platforms
@@ -54,20 +65,26 @@ def get_patchelf():
     # as we may need patchelf, find out where it is
     if platform.system() == 'Darwin':
         return None
-    patchelf_spec = spack.cmd.parse_specs("patchelf", concretize=True)[0]
-    patchelf = spack.repo.get(patchelf_spec)
-    if not patchelf.installed:
-        patchelf.do_install()
+    with _patchelf_lock:
+        patchelf_spec = spack.cmd.parse_specs("patchelf", concretize=True)[0]
+        patchelf = spack.repo.get(patchelf_spec)
+        if not patchelf.installed:
+            patchelf.do_install()
     patchelf_executable = os.path.join(patchelf.prefix.bin, "patchelf")
     return patchelf_executable
 
 
 def get_existing_elf_rpaths(path_name):
     """
-    Return the RPATHS returned by patchelf --print-rpath path_name
-    as a list of strings.
+    Return the RPATHS of the ELF object path_name as a list of strings,
+    like patchelf --print-rpath path_name would.
     """
     if platform.system() == 'Linux':
+        try:
+            return (elf.get_rpath(path_name) or '').split(':')
+        except elf.ElfParsingError as e:
+            tty.debug('Reading the RPATH of %s failed, using patchelf' %
+                      path_name, e)
         patchelf = Executable(get_patchelf())
         try:
             output = patchelf('--print-rpath', '%s' %
@@ -260,18 +277,28 @@ def strings_contains_installroot(path_name, root_dir):
     """
     Check if the file contain the install root string.
     """
-    strings = Executable('strings')
-    output = strings('%s' % path_name,
-                     output=str, err=str)
-    return (root_dir in output)
+    if not os.path.isfile(path_name) or not os.path.getsize(path_name):
+        return False
+    with open(path_name, 'rb') as f:
+        with closing(mmap.mmap(f.fileno(), 0,
+                               access=mmap.ACCESS_READ)) as contents:
+            return contents.find(root_dir.encode('utf-8')) != -1
 
 
 def modify_elf_object(path_name, new_rpaths):
     """
-    Replace orig_rpath with new_rpath in RPATH of elf object path_name
+    Replace orig_rpath with new_rpath in RPATH of elf object path_name.
+    The RPATH is overwritten in place if the new one is not longer, and
+    with patchelf otherwise.
     """
     if platform.system() == 'Linux':
         new_joined = ':'.join(new_rpaths)
+        try:
+            if elf.replace_rpath(path_name, new_joined):
+                return
+        except elf.ElfParsingError as e:
+            tty.debug('Rewriting the RPATH of %s failed, using patchelf' %
+                      path_name, e)
         patchelf = Executable(get_patchelf())
         try:
             patchelf('--force-rpath', '--set-rpath', '%s' % new_joined,
@@ -284,6 +311,54 @@ def modify_elf_object(path_name, new_rpaths):
         tty.die('relocation not supported for this platform')
 
 
+#: Magic numbers of Mach-O files, thin and universal
+macho_magic = (b'\xfe\xed\xfa\xce', b'\xfe\xed\xfa\xcf',
+               b'\xce\xfa\xed\xfe', b'\xcf\xfa\xed\xfe',
+               b'\xca\xfe\xba\xbe')
+
+#: Bytes that do not occur in text files: control characters other than
+#: whitespace, backspace and escape
+binary_bytes = bytes(bytearray(
+    sorted(set(range(32)) - set(bytearray(b'\t\n\x0b\x0c\r\x1b\x08'))) +
+    [127]))
+
+
+def classify_file(path_name):
+    """
+    Describe the type of file path_name from its first bytes, in the words
+    of ``file -b -h``, to the extent needs_binary_relocation and
+    needs_text_relocation need, without running ``file``.
+    """
+    if os.path.islink(path_name):
+        return 'symbolic link to %s' % os.readlink(path_name)
+    if not os.path.isfile(path_name):
+        return 'special'
+
+    with open(path_name, 'rb') as f:
+        head = f.read(1024)
+        if head.startswith(b'\x7fELF'):
+            try:
+                return elf.parse_elf(f, dynamic=False).description
+            except elf.ElfParsingError:
+                return 'data'
+
+    if not head:
+        return 'empty'
+    if head[:4] in macho_magic:
+        # Java class files share the magic of universal binaries, but
+        # have a version number where these have a small number of archs
+        if head[:4] == b'\xca\xfe\xba\xbe' and len(head) >= 8 and \
+                struct.unpack('>I', head[4:8])[0] > 30:
+            return 'compiled Java class data'
+        return 'Mach-O binary'
+
+    if head.translate(None, binary_bytes) != head:
+        return 'data'
+    if head.startswith(b'#!'):
+        return 'script, text executable'
+    return 'text'
+
+
 def needs_binary_relocation(filetype, os_id=None):
     """
     Check whether the given filetype is a binary that may need relocation.
@@ -434,12 +509,83 @@ def make_binary_placeholder(cur_path_names, allow_root):
         tty.die("Placeholder not implemented for %s" % platform.system())
 
 
-def relocate_text(path_names, old_dir, new_dir):
+def _replace_prefixes(path_name, regex, replacements, dry_run):
+    """
+    Replace the prefixes matched by regex in file path_name, and return
+    the number of replacements.  Files are searched through mmap, and only
+    read and written if they contain a prefix.
+    """
+    if not os.path.isfile(path_name) or os.path.islink(path_name) or \
+            not os.path.getsize(path_name):
+        return 0
+    with open(path_name, 'rb') as f:
+        with closing(mmap.mmap(f.fileno(), 0,
+                               access=mmap.ACCESS_READ)) as contents:
+            if not regex.search(contents):
+                return 0
+            data = contents[:]
+
+    data, count = regex.subn(lambda m: replacements[m.group(0)], data)
+    if not dry_run:
+        with writable(path_name):
+            with open(path_name, 'wb') as f:
+                f.write(data)
+    return count
+
+
+def prefix_regex(prefixes):
+    """
+    Return a regular expression that matches any of the old prefixes in
+    bytes, longest first, and a dict mapping each of them to its new
+    prefix.  prefixes is a list of (old, new) pairs of strings.  The
+    regular expression is None if no prefix changes.
+    """
+    replacements = dict((old.encode('utf-8'), new.encode('utf-8'))
+                        for old, new in prefixes if old != new)
+    if not replacements:
+        return None, replacements
+    regex = re.compile(b'|'.join(
+        re.escape(old) for old in sorted(replacements, key=len,
+                                         reverse=True)))
+    return regex, replacements
+
+
+def relocate_text_files(path_names, prefixes, dry_run=False):
+    """
+    Replace old prefixes with new ones in text files path_names.
+
+    All the old prefixes are searched for at once, with a regular
+    expression that matches the longest one at each position.
+
+    Args:
+        path_names (list): the files to relocate
+        prefixes (list): (old, new) pairs of prefixes to replace
+        dry_run (bool): only count the replacements, and leave the
+            files as they are
+
+    Returns:
+        dict: the number of replacements in each file that contains an
+        old prefix
+    """
+    path_names = list(path_names)
+    regex, replacements = prefix_regex(prefixes)
+    if not path_names or not replacements:
+        return {}
+
+    counts = {}
+    for path_name in path_names:
+        count = _replace_prefixes(path_name, regex, replacements, dry_run)
+        if count:
+            counts[path_name] = count
+    return counts
+
+
+def relocate_text(path_names, old_dir, new_dir, dry_run=False):
     """
-    Replace old path with new path in text file path_name
+    Replace old path with new path in text files path_names.
+    See relocate_text_files.
     """
-    filter_file('%s' % old_dir, '%s' % new_dir,
-                *path_names, backup=False)
+    return relocate_text_files(path_names, [(old_dir, new_dir)], dry_run)
 
 
 def substitute_rpath(orig_rpath, topdir, new_root_path):
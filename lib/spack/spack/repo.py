@@ -27,13 +27,17 @@ import os
 import stat
 import shutil
 import errno
+import hashlib
 import sys
 import inspect
 import re
 import traceback
 import json
+import multiprocessing
+import time
 from contextlib import contextmanager
 from six import string_types
+from ordereddict_backport import OrderedDict
 
 try:
     from collections.abc import Mapping
@@ -45,6 +49,7 @@ from types import ModuleType
 import ruamel.yaml as yaml
 
 import llnl.util.lang
+import llnl.util.multiproc as mp
 import llnl.util.tty as tty
 from llnl.util.filesystem import mkdirp, install
 
@@ -52,11 +57,14 @@ import spack.config
 import spack.caches
 import spack.error
 import spack.spec
+import spack.dependency  # after spack.spec, which it imports
 import spack.util.imp as simp
+import spack.util.spack_json as sjson
 from spack.provider_index import ProviderIndex
 from spack.util.path import canonicalize_path
 from spack.util.naming import NamespaceTrie, valid_module_name
 from spack.util.naming import mod_to_class, possible_spack_module_names
+from spack.version import Version
 
 
 #: Super-namespace for all packages.
@@ -127,10 +135,17 @@ class FastPackageChecker(Mapping):
     For each repository a cache is maintained at class level, and shared among
     all instances referring to it. Update of the global cache is done lazily
     during instance initialization.
+
+    Besides stats, the checker can hash the contents of package files, so
+    that files touched without being changed, e.g. by a ``git checkout``,
+    can be told apart from files that really changed.
     """
     #: Global cache, reused by every instance
     _paths_cache = {}
 
+    #: Digests of package files, computed lazily and reused by every instance
+    _digests_cache = {}
+
     def __init__(self, packages_path):
         # The path of the repository managed by this instance
         self.packages_path = packages_path
@@ -200,6 +215,58 @@ class FastPackageChecker(Mapping):
     def __len__(self):
         return len(self._packages_to_stats)
 
+    def digest(self, pkg_name):
+        """SHA-1 hash of the contents of a package's file."""
+        sinfo = self[pkg_name]
+        key = (sinfo.st_mtime, sinfo.st_size, sinfo.st_ino)
+
+        digests = self._digests_cache.setdefault(self.packages_path, {})
+        if pkg_name not in digests or digests[pkg_name][0] != key:
+            pkg_file = os.path.join(
+                self.packages_path, pkg_name, package_file_name)
+            with open(pkg_file, 'rb') as f:
+                digests[pkg_name] = (key, hashlib.sha1(f.read()).hexdigest())
+
+        return digests[pkg_name][1]
+
+    def stamp(self, pkg_name, digest=False):
+        """What identifies the current contents of a package's file.
+
+        This is the modification time of the file or, with ``digest``, a
+        list of its modification time, size, inode number and SHA-1 hash.
+        """
+        sinfo = self[pkg_name]
+        if not digest:
+            return sinfo.st_mtime
+
+        return [sinfo.st_mtime, sinfo.st_size, sinfo.st_ino,
+                self.digest(pkg_name)]
+
+    def restamp(self, pkg_name, stamp, digest=False):
+        """Compares a package's file with a ``stamp()`` taken earlier.
+
+        Returns the current stamp of the file if its contents are the ones
+        ``stamp`` was taken from, and None if they changed.  With
+        ``digest``, the file is hashed only when its stats differ from the
+        ones in ``stamp``, and its new stamp is returned if its contents are
+        the same.
+        """
+        sinfo = self[pkg_name]
+        if not digest:
+            return stamp if stamp == sinfo.st_mtime else None
+
+        if not isinstance(stamp, list) or len(stamp) != 4:
+            return None
+
+        stats = [sinfo.st_mtime, sinfo.st_size, sinfo.st_ino]
+        if stamp[:3] == stats:
+            return stamp
+
+        if stamp[1] != sinfo.st_size or stamp[3] != self.digest(pkg_name):
+            return None
+
+        return stats + [stamp[3]]
+
 
 class TagIndex(Mapping):
     """Maps tags to list of packages."""
@@ -207,13 +274,11 @@ class TagIndex(Mapping):
     def __init__(self):
         self._tag_dict = collections.defaultdict(list)
 
-    def to_json(self, stream):
-        json.dump({'tags': self._tag_dict}, stream)
+    def to_dict(self):
+        return {'tags': self._tag_dict}
 
     @staticmethod
-    def from_json(stream):
-        d = json.load(stream)
-
+    def from_dict(d):
         r = TagIndex()
 
         for tag, list in d['tags'].items():
@@ -230,130 +295,560 @@ class TagIndex(Mapping):
     def __len__(self):
         return len(self._tag_dict)
 
-    def update_package(self, pkg_name):
+    def update_package(self, pkg_name, metadata):
         """Updates a package in the tag index.
 
         Args:
-            pkg_name (str): name of the package to be removed from the index
-
+            pkg_name (str): name of the package to be updated
+            metadata (PackageMetadata): metadata of the package
         """
-        package = path.get(pkg_name)
-
         # Remove the package from the list of packages, if present
-        for pkg_list in self._tag_dict.values():
+        self.remove_package(pkg_name)
+
+        # Add it again under the appropriate tags
+        for tag in metadata.tags:
+            self._tag_dict[tag].append(pkg_name)
+
+    def remove_package(self, pkg_name):
+        """Removes a package from the tag index."""
+        for tag, pkg_list in list(self._tag_dict.items()):
             if pkg_name in pkg_list:
                 pkg_list.remove(pkg_name)
+                if not pkg_list:
+                    del self._tag_dict[tag]
 
-        # Add it again under the appropriate tags
-        for tag in getattr(package, 'tags', []):
-            self._tag_dict[tag].append(package.name)
 
+def _json_value(value):
+    """Directive arguments as stored in the metadata index."""
+    if value is None or isinstance(value, (string_types, bool, int, float)):
+        return value
+    return str(value)
 
-@llnl.util.lang.memoized
-def make_provider_index_cache(packages_path, namespace):
-    """Lazily updates the provider index cache associated with a repository,
-    if need be, then returns it. Caches results for later look-ups.
 
-    Args:
-        packages_path: path of the repository
-        namespace: namespace of the repository
+class PackageMetadata(object):
+    """Directive metadata of a package, read from the metadata index.
 
-    Returns:
-        instance of ProviderIndex
+    This has the attributes that directives set on package classes
+    (``versions``, ``variants``, ``dependencies``, ``provided`` and
+    ``tags``), plus ``homepage`` and the package docstring, so they can
+    be queried without importing the package.  Specs are only parsed
+    when an attribute is first used.
+
+    Variants are plain dictionaries with the ``default``, ``description``,
+    ``values`` and ``multi`` arguments of the ``variant`` directive;
+    ``values`` is None when the directive used a callable.
     """
-    # Map that goes from package names to stat info
-    fast_package_checker = FastPackageChecker(packages_path)
 
-    # Filename of the provider index cache
-    cache_filename = 'providers/{0}-index.yaml'.format(namespace)
+    def __init__(self, data):
+        self._data = data
+        self.name = data['name']
+        self.doc = data['doc']
+        self.homepage = data['homepage']
+        self.tags = data['tags']
+        self.variants = data['variants']
+        self.dependency_names = sorted(data['dependencies'])
 
-    # Compute which packages needs to be updated in the cache
-    misc_cache = spack.caches.misc_cache
-    index_mtime = misc_cache.mtime(cache_filename)
+        # parsed lazily
+        self._versions = None
+        self._dependencies = None
+        self._provided = None
 
-    needs_update = [
-        x for x, sinfo in fast_package_checker.items()
-        if sinfo.st_mtime > index_mtime
-    ]
+    @staticmethod
+    def from_package_class(pkg_cls):
+        """Read the metadata of a package class."""
+        variants = {}
+        for name, variant in pkg_cls.variants.items():
+            values = variant.values
+            if values is not None:
+                values = [_json_value(v) for v in values]
+            variants[name] = {
+                'default': _json_value(variant.default),
+                'description': variant.description,
+                'values': values,
+                'multi': variant.multi
+            }
+
+        dependencies = {}
+        for name, conditions in pkg_cls.dependencies.items():
+            dependencies[name] = [
+                [str(when), str(dep.spec), sorted(dep.type)]
+                for when, dep in conditions.items()]
+
+        return PackageMetadata({
+            'name': pkg_cls.name,
+            'doc': pkg_cls.__doc__,
+            'homepage': getattr(pkg_cls, 'homepage', None),
+            'tags': list(getattr(pkg_cls, 'tags', [])),
+            'versions': [
+                [str(v), dict((k, _json_value(a)) for k, a in args.items())]
+                for v, args in pkg_cls.versions.items()],
+            'variants': variants,
+            'dependencies': dependencies,
+            'provided': [
+                [str(vspec), sorted(str(when) for when in whens)]
+                for vspec, whens in pkg_cls.provided.items()]
+        })
+
+    def to_dict(self):
+        return self._data
 
-    # Read the old ProviderIndex, or make a new one.
-    index_existed = misc_cache.init_entry(cache_filename)
+    @property
+    def versions(self):
+        """Versions, mapped to the arguments of their directive."""
+        if self._versions is None:
+            self._versions = dict(
+                (Version(v), args) for v, args in self._data['versions'])
+        return self._versions
 
-    if index_existed and not needs_update:
+    @property
+    def dependencies(self):
+        """Like ``Package.dependencies``: maps dependency names to
+        conditions, and conditions to ``Dependency`` objects."""
+        if self._dependencies is None:
+            self._dependencies = {}
+            for name, conditions in self._data['dependencies'].items():
+                self._dependencies[name] = dict(
+                    (spack.spec.Spec(when),
+                     spack.dependency.Dependency(
+                         self, spack.spec.Spec(spec), type=deptypes))
+                    for when, spec, deptypes in conditions)
+        return self._dependencies
 
-        # If the provider index exists and doesn't need an update
-        # just read from it
-        with misc_cache.read_transaction(cache_filename) as f:
-            index = ProviderIndex.from_yaml(f)
+    @property
+    def provided(self):
+        """Like ``Package.provided``: maps virtual specs to the set of
+        conditions under which the package provides them."""
+        if self._provided is None:
+            self._provided = dict(
+                (spack.spec.Spec(vspec),
+                 set(spack.spec.Spec(w) for w in whens))
+                for vspec, whens in self._data['provided'])
+        return self._provided
+
+    def dependencies_of_type(self, *deptypes):
+        """Names of the dependencies that can have any of ``deptypes``."""
+        return set(
+            name for name, conditions in self._data['dependencies'].items()
+            if any(dt in types for _, _, types in conditions
+                   for dt in deptypes))
+
+
+class MetadataIndex(Mapping):
+    """Maps package names to their ``PackageMetadata``."""
 
-    else:
+    def __init__(self):
+        self._metadata = {}
 
-        # Otherwise we need a write transaction to update it
-        with misc_cache.write_transaction(cache_filename) as (old, new):
+    def to_dict(self):
+        return dict(
+            (name, md.to_dict()) for name, md in self._metadata.items())
 
-            index = ProviderIndex.from_yaml(old) if old else ProviderIndex()
+    @staticmethod
+    def from_dict(d):
+        r = MetadataIndex()
 
-            for pkg_name in needs_update:
-                namespaced_name = '{0}.{1}'.format(namespace, pkg_name)
-                index.remove_provider(namespaced_name)
-                index.update(namespaced_name)
+        for name, data in d.items():
+            r._metadata[name] = PackageMetadata(data)
 
-            index.to_yaml(new)
+        return r
 
-    return index
+    def __getitem__(self, item):
+        return self._metadata[item]
 
+    def __iter__(self):
+        return iter(self._metadata)
 
-@llnl.util.lang.memoized
-def make_tag_index_cache(packages_path, namespace):
-    """Lazily updates the tag index cache associated with a repository,
-    if need be, then returns it. Caches results for later look-ups.
+    def __len__(self):
+        return len(self._metadata)
 
-    Args:
-        packages_path: path of the repository
-        namespace: namespace of the repository
+    def update_package(self, pkg_name, metadata):
+        """Updates the metadata of a package in the index."""
+        self._metadata[pkg_name] = metadata
 
-    Returns:
-        instance of TagIndex
+    def remove_package(self, pkg_name):
+        """Removes a package from the index."""
+        self._metadata.pop(pkg_name, None)
+
+
+class DependentsIndex(Mapping):
+    """Maps package names to the names of the packages that can depend on
+    them, i.e. reverse dependencies.
+
+    Virtual dependencies are recorded under the virtual's name.  The index
+    also keeps which virtuals each package provides, so that dependents
+    of a provider can include the dependents of its virtuals.
+    """
+
+    def __init__(self):
+        self._dependents = {}
+        self._dependencies = {}
+        self._provided = {}
+
+    def to_dict(self):
+        return {
+            'dependents': dict(
+                (name, sorted(dependents))
+                for name, dependents in self._dependents.items()),
+            'dependencies': self._dependencies,
+            'provided': self._provided
+        }
+
+    @staticmethod
+    def from_dict(d):
+        r = DependentsIndex()
+
+        for name, dependents in d['dependents'].items():
+            r._dependents[name] = set(dependents)
+        r._dependencies = d['dependencies']
+        r._provided = d['provided']
+
+        return r
+
+    def __getitem__(self, item):
+        return self._dependents[item]
+
+    def __iter__(self):
+        return iter(self._dependents)
+
+    def __len__(self):
+        return len(self._dependents)
+
+    @property
+    def packages(self):
+        """Names of the packages in the index."""
+        return self._dependencies.keys()
+
+    def provided(self, pkg_name):
+        """Names of the virtual packages a package provides."""
+        return self._provided.get(pkg_name, [])
+
+    def update_package(self, pkg_name, metadata):
+        """Updates a package in the dependents index.
+
+        Args:
+            pkg_name (str): name of the package to be updated
+            metadata (PackageMetadata): metadata of the package
+        """
+        self.remove_package(pkg_name)
+
+        for dep_name in metadata.dependency_names:
+            self._dependents.setdefault(dep_name, set()).add(pkg_name)
+
+        self._dependencies[pkg_name] = metadata.dependency_names
+        self._provided[pkg_name] = sorted(
+            set(vspec.name for vspec in metadata.provided))
+
+    def remove_package(self, pkg_name):
+        """Removes a package from the dependents index."""
+        for dep_name in self._dependencies.pop(pkg_name, []):
+            dependents = self._dependents.get(dep_name)
+            if dependents is not None:
+                dependents.discard(pkg_name)
+                if not dependents:
+                    del self._dependents[dep_name]
+        self._provided.pop(pkg_name, None)
+
+
+class Indexer(object):
+    """Keeps an index of a repository up to date, package by package,
+    from the metadata of its packages.
+
+    This works for the index classes of this module, which can be
+    converted to and from a dictionary and updated one package at a time.
     """
-    # Map that goes from package names to stat info
-    fast_package_checker = FastPackageChecker(packages_path)
 
-    # Filename of the provider index cache
-    cache_filename = 'tags/{0}-index.json'.format(namespace)
+    def __init__(self, index_class):
+        self.index_class = index_class
+
+    def create(self):
+        """Returns a new, empty index."""
+        return self.index_class()
 
-    # Compute which packages needs to be updated in the cache
-    misc_cache = spack.caches.misc_cache
-    index_mtime = misc_cache.mtime(cache_filename)
+    def from_dict(self, d):
+        return self.index_class.from_dict(d)
 
-    needs_update = [
-        x for x, sinfo in fast_package_checker.items()
-        if sinfo.st_mtime > index_mtime
-    ]
+    def to_dict(self, index):
+        return index.to_dict()
 
-    # Read the old ProviderIndex, or make a new one.
-    index_existed = misc_cache.init_entry(cache_filename)
+    def update(self, index, pkg_name, metadata):
+        """Updates a package in ``index``, given its ``PackageMetadata``."""
+        index.update_package(pkg_name, metadata)
 
-    if index_existed and not needs_update:
+    def remove(self, index, pkg_name):
+        """Removes a deleted package from ``index``."""
+        index.remove_package(pkg_name)
+
+
+class ProviderIndexer(Indexer):
+    """Indexer for the ``ProviderIndex``, which uses namespaced names."""
+
+    def __init__(self, namespace):
+        super(ProviderIndexer, self).__init__(ProviderIndex)
+        self.namespace = namespace
+
+    def update(self, index, pkg_name, metadata):
+        namespaced_name = '{0}.{1}'.format(self.namespace, pkg_name)
+        index.remove_provider(namespaced_name)
+        index.update(namespaced_name, provided=metadata.provided)
+
+    def remove(self, index, pkg_name):
+        index.remove_provider('{0}.{1}'.format(self.namespace, pkg_name))
+
+
+def _read_package_metadata(pkg_name):
+    """Reads the metadata of a package, in a worker process.
+
+    The metadata is sent back as a dictionary, or None if the package
+    could not be read.
+    """
+    try:
+        pkg_cls = path.get_pkg_class(pkg_name)
+        return PackageMetadata.from_package_class(pkg_cls).to_dict()
+    except Exception as e:
+        tty.debug('Could not read package {0}: {1}'.format(pkg_name, e))
+        return None
+
+
+class RepoIndex(object):
+    """The indexes of a repository, stored in the misc_cache.
+
+    Each cache file records a stamp of every package file the index was
+    built from, so that only packages that changed are read again, and
+    packages that were deleted are removed.  When an index needs an
+    update, all of them are updated in one pass, reading each stale
+    package only once.
+
+    Stamps are modification times, unless ``digests`` is true, or
+    ``config:package_digests`` is set: then they include a hash of the
+    contents of package files, and files touched without being changed
+    are only hashed again instead of being read.
+    """
+
+    #: Stale packages are read in a pool of processes when there are
+    #: at least this many of them.
+    pool_threshold = 32
+
+    #: Number of processes that read stale packages.
+    jobs = multiprocessing.cpu_count()
+
+    def __init__(self, packages_path, namespace, digests=None):
+        self.packages_path = packages_path
+        self.namespace = namespace
+
+        if digests is None:
+            digests = spack.config.get('config:package_digests', False)
+        self.digests = digests
+
+        # The metadata index comes first, as the others are built from it
+        self.indexers = OrderedDict([
+            ('metadata', Indexer(MetadataIndex)),
+            ('providers', ProviderIndexer(namespace)),
+            ('tags', Indexer(TagIndex)),
+            ('dependents', Indexer(DependentsIndex))
+        ])
+        self.indexes = {}
+
+    def __getitem__(self, name):
+        if name not in self.indexers:
+            raise KeyError('no such index: {0}'.format(name))
+
+        if name not in self.indexes:
+            self._read_index(name)
+
+        if name not in self.indexes:
+            self._update_indexes()
+
+        return self.indexes[name]
+
+    def _cache_filename(self, name):
+        return '{0}/{1}-index.json'.format(name, self.namespace)
+
+    def _stale_packages(self, stamps, package_checker):
+        """Compares the packages in the repo with the ``stamps`` recorded
+        in an index.
+
+        Returns the names of the packages that changed, the names of the
+        packages that were deleted, and the new stamps of the packages
+        that were touched without being changed.
+        """
+        changed, restamped = [], {}
+        for pkg_name in package_checker:
+            stamp = stamps.get(pkg_name)
+            if stamp is not None:
+                stamp = package_checker.restamp(pkg_name, stamp, self.digests)
+
+            if stamp is None:
+                changed.append(pkg_name)
+            elif stamp != stamps[pkg_name]:
+                restamped[pkg_name] = stamp
+
+        removed = [name for name in stamps if name not in package_checker]
+        return changed, removed, restamped
+
+    def _read_index(self, name, package_checker=None):
+        """Reads an index from its cache file, if it is up to date."""
+        cache_filename = self._cache_filename(name)
+
+        misc_cache = spack.caches.misc_cache
+        if not misc_cache.init_entry(cache_filename):
+            return
 
-        # If the provider index exists and doesn't need an update
-        # just read from it
         with misc_cache.read_transaction(cache_filename) as f:
-            index = TagIndex.from_json(f)
+            data = _load_index_file(f)
+
+        if data is None:
+            return
+
+        if package_checker is None:
+            package_checker = FastPackageChecker(self.packages_path)
+        changed, removed, restamped = self._stale_packages(
+            data['stamps'], package_checker)
+        if not (changed or removed or restamped):
+            indexer = self.indexers[name]
+            self.indexes[name] = indexer.from_dict(data['index'])
+
+    def _update_indexes(self):
+        """Updates every index that was not read yet, and writes them."""
+        start = time.time()
+        package_checker = FastPackageChecker(self.packages_path)
+
+        updated = set()
+        for name in self.indexers:
+            if name in self.indexes:
+                continue
+
+            if name == 'metadata':
+                read_metadata = self._read_metadata
+            else:
+                read_metadata = self._indexed_metadata
+
+            updated.update(
+                self._update_index(name, package_checker, read_metadata))
+
+        if updated:
+            tty.debug('Updated {0} packages in the indexes of {1} '
+                      'in {2:.2f}s'.format(len(updated), self.namespace,
+                                           time.time() - start))
+
+    def _update_index(self, name, package_checker, read_metadata):
+        """Updates an index in its cache file.  Indexes that are up to
+        date are only read, without taking the write lock of the file.
+
+        Args:
+            name (str): name of the index
+            package_checker (FastPackageChecker): packages of the repo
+            read_metadata (callable): takes a list of package names, and
+                returns a list of (name, ``PackageMetadata``) pairs
+
+        Returns:
+            names of the packages that were updated or removed
+        """
+        self._read_index(name, package_checker)
+        if name in self.indexes:
+            return []
+
+        indexer = self.indexers[name]
+        cache_filename = self._cache_filename(name)
 
-    else:
+        misc_cache = spack.caches.misc_cache
+        misc_cache.init_entry(cache_filename)
 
-        # Otherwise we need a write transaction to update it
         with misc_cache.write_transaction(cache_filename) as (old, new):
+            data = _load_index_file(old) if old else None
+            if data is None:
+                stamps, index = {}, indexer.create()
+            else:
+                stamps = data['stamps']
+                index = indexer.from_dict(data['index'])
+
+            changed, removed, restamped = self._stale_packages(
+                stamps, package_checker)
+            stamps.update(restamped)
+
+            for pkg_name in removed:
+                indexer.remove(index, pkg_name)
+                del stamps[pkg_name]
+
+            for pkg_name, metadata in read_metadata(changed):
+                indexer.update(index, pkg_name, metadata)
+                stamps[pkg_name] = package_checker.stamp(
+                    pkg_name, self.digests)
+
+            json.dump({'stamps': stamps, 'index': indexer.to_dict(index)},
+                      new, separators=(',', ':'))
+
+        self.indexes[name] = index
+        return changed + removed
+
+    def _indexed_metadata(self, pkg_names):
+        """Metadata of packages, from the up to date metadata index."""
+        metadata_index = self['metadata']
+        return [(pkg_name, metadata_index[pkg_name]) for pkg_name in pkg_names]
+
+    def _read_metadata(self, pkg_names):
+        """Reads the metadata of packages, importing them.
+
+        Returns a list of (name, ``PackageMetadata``) pairs.
+        """
+        namespaced_names = ['{0}.{1}'.format(self.namespace, pkg_name)
+                            for pkg_name in pkg_names]
+        results = [None] * len(namespaced_names)
+
+        # Workers import packages through the repositories of this
+        # process, so they are forked; without fork, packages are read here
+        jobs = min(self.jobs, len(namespaced_names))
+        context = mp.fork_context()
+        if (context is not None and
+                len(namespaced_names) >= self.pool_threshold and jobs > 1):
+            pool = context.Pool(processes=jobs)
+            try:
+                results = pool.map(_read_package_metadata, namespaced_names)
+            finally:
+                pool.terminate()
+                pool.join()
+
+        # Packages that were not read by a worker are read here, so that
+        # errors are reported as usual
+        metadata = []
+        for pkg_name, namespaced_name, data in zip(
+                pkg_names, namespaced_names, results):
+            if data is None:
+                pkg_cls = path.get_pkg_class(namespaced_name)
+                metadata.append(
+                    (pkg_name, PackageMetadata.from_package_class(pkg_cls)))
+            else:
+                metadata.append((pkg_name, PackageMetadata(data)))
+
+        return metadata
+
+
+def _load_index_file(stream):
+    """Reads the contents of an index cache file, or returns None if it
+    is not a valid one, e.g. if it was written by an older Spack."""
+    try:
+        data = sjson.load(stream)
+    except ValueError:
+        return None
+
+    if not isinstance(data, dict) or 'stamps' not in data:
+        return None
+
+    return data
 
-            index = TagIndex.from_json(old) if old else TagIndex()
 
-            for pkg_name in needs_update:
-                namespaced_name = '{0}.{1}'.format(namespace, pkg_name)
-                index.update_package(namespaced_name)
+@llnl.util.lang.memoized
+def make_repo_index_cache(packages_path, namespace):
+    """Returns the ``RepoIndex`` of a repository. Caches results for
+    later look-ups.
 
-            index.to_json(new)
+    Args:
+        packages_path: path of the repository
+        namespace: namespace of the repository
 
-    return index
+    Returns:
+        instance of RepoIndex
+    """
+    return RepoIndex(packages_path, namespace)
 
 
 class RepoPath(object):
@@ -580,6 +1075,49 @@ class RepoPath(object):
         """Find a class for the spec's package and return the class object."""
         return self.repo_for_pkg(pkg_name).get_pkg_class(pkg_name)
 
+    def package_metadata(self, pkg_name):
+        """Find the metadata of a package, without importing it."""
+        return self.repo_for_pkg(pkg_name).package_metadata(pkg_name)
+
+    def possible_dependents(self, pkg_name, transitive=False):
+        """Names of the packages that can depend on a package.
+
+        Packages that depend on a virtual package the given one provides
+        are included.  This only reads the dependents indexes of the
+        repositories, and does not import any package.
+
+        Args:
+            pkg_name (str): name of a package, or of a virtual package
+            transitive (bool): also return dependents of dependents
+
+        Returns:
+            set: names of the dependents, without ``pkg_name`` itself
+        """
+        indexes = [repo.dependents_index for repo in self.repos]
+
+        def direct_dependents(name):
+            names = set([name])
+            for index in indexes:
+                names.update(index.provided(name))
+
+            dependents = set()
+            for index in indexes:
+                for n in names:
+                    dependents.update(index.get(n, ()))
+            return dependents
+
+        dependents = direct_dependents(pkg_name)
+        if transitive:
+            queue = list(dependents)
+            while queue:
+                for name in direct_dependents(queue.pop()):
+                    if name not in dependents:
+                        dependents.add(name)
+                        queue.append(name)
+
+        dependents.discard(pkg_name)
+        return dependents
+
     @_autospec
     def dump_provenance(self, spec, path):
         """Dump provenance information for a spec to a particular path.
@@ -685,11 +1223,9 @@ class Repo(object):
         # Maps that goes from package name to corresponding file stat
         self._fast_package_checker = None
 
-        # Index of virtual dependencies, computed lazily
-        self._provider_index = None
-
-        # Index of tags, computed lazily
-        self._tag_index = None
+        # Indexes of virtual dependencies, tags, package metadata and
+        # reverse dependencies, computed lazily
+        self._repo_index = None
 
         # make sure the namespace for packages in this repo exists.
         self._create_namespace()
@@ -875,26 +1411,35 @@ class Repo(object):
         self._instances.clear()
 
     @property
-    def provider_index(self):
-        """A provider index with names *specific* to this repo."""
+    def index(self):
+        """The ``RepoIndex`` holding all the indexes of this repo."""
 
-        if self._provider_index is None:
-            self._provider_index = make_provider_index_cache(
+        if self._repo_index is None:
+            self._repo_index = make_repo_index_cache(
                 self.packages_path, self.namespace
             )
 
-        return self._provider_index
+        return self._repo_index
+
+    @property
+    def provider_index(self):
+        """A provider index with names *specific* to this repo."""
+        return self.index['providers']
 
     @property
     def tag_index(self):
         """A provider index with names *specific* to this repo."""
+        return self.index['tags']
 
-        if self._tag_index is None:
-            self._tag_index = make_tag_index_cache(
-                self.packages_path, self.namespace
-            )
+    @property
+    def metadata_index(self):
+        """An index of the directive metadata of this repo's packages."""
+        return self.index['metadata']
 
-        return self._tag_index
+    @property
+    def dependents_index(self):
+        """An index of the packages that can depend on each package."""
+        return self.index['dependents']
 
     @_autospec
     def providers_for(self, vpkg_spec):
@@ -907,6 +1452,18 @@ class Repo(object):
     def extensions_for(self, extendee_spec):
         return [p for p in self.all_packages() if p.extends(extendee_spec)]
 
+    @_autospec
+    def package_metadata(self, spec):
+        """Get the ``PackageMetadata`` of a package, without importing it.
+
+        Raises UnknownPackageError if the package does not exist.
+        """
+        self._check_namespace(spec)
+        try:
+            return self.metadata_index[spec.name]
+        except KeyError:
+            raise UnknownPackageError(spec.name, self)
+
     def _check_namespace(self, spec):
         """Check that the spec's namespace is the same as this repository's."""
         if spec.namespace and spec.namespace != self.namespace:
@@ -42,6 +42,7 @@ schema = {
                 'install_tree': {'type': 'string'},
                 'install_hash_length': {'type': 'integer', 'minimum': 1},
                 'install_path_scheme': {'type': 'string'},
+                'db_snapshot': {'type': 'boolean'},
                 'build_stage': {
                     'oneOf': [
                         {'type': 'string'},
@@ -63,12 +64,16 @@ schema = {
                 },
                 'source_cache': {'type': 'string'},
                 'misc_cache': {'type': 'string'},
+                'concretization_cache': {'type': 'boolean'},
+                'package_digests': {'type': 'boolean'},
+                'binary_index_ttl': {'type': 'integer', 'minimum': 0},
                 'verify_ssl': {'type': 'boolean'},
                 'debug': {'type': 'boolean'},
                 'checksum': {'type': 'boolean'},
                 'locks': {'type': 'boolean'},
                 'dirty': {'type': 'boolean'},
                 'build_jobs': {'type': 'integer', 'minimum': 1},
+                'concurrent_builds': {'type': 'integer', 'minimum': 1},
                 'ccache': {'type': 'boolean'},
             }
         },
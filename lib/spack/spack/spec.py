@@ -98,7 +98,6 @@ expansion when it is the first character in an id typed on the command line.
 import base64
 import sys
 import collections
-import ctypes
 import hashlib
 import itertools
 import os
@@ -111,7 +110,7 @@ from six import iteritems
 
 from llnl.util.filesystem import find_headers, find_libraries, is_exe
 from llnl.util.lang import key_ordering, HashableMap, ObjectWrapper, dedupe
-from llnl.util.lang import check_kwargs
+from llnl.util.lang import check_kwargs, LRUCache
 from llnl.util.tty.color import cwrite, colorize, cescape, get_color_when
 
 import spack.architecture
@@ -202,9 +201,6 @@ _separators = '[\\%s]' % '\\'.join(color_formats.keys())
 #: every time we call str()
 _any_version = VersionList([':'])
 
-#: Max integer helps avoid passing too large a value to cyaml.
-maxint = 2 ** (ctypes.sizeof(ctypes.c_int) * 8 - 1) - 1
-
 
 def colorize_spec(spec):
     """Returns a spec colorized according to the colors specified in
@@ -622,8 +618,7 @@ class FlagMap(HashableMap):
 
     def copy(self):
         clone = FlagMap(None)
-        for name, value in self.items():
-            clone[name] = value
+        clone.dict.update(self.dict)
         return clone
 
     def _cmp_key(self):
@@ -1070,12 +1065,26 @@ class Spec(object):
         if not isinstance(spec_like, string_types):
             raise TypeError("Can't make spec out of %s" % type(spec_like))
 
-        # parse string types *into* this spec
-        spec_list = SpecParser(self).parse(spec_like)
-        if len(spec_list) > 1:
-            raise ValueError("More than one spec in string: " + spec_like)
-        if len(spec_list) < 1:
-            raise ValueError("String contains no specs: " + spec_like)
+        # Reuse the result of parsing the same string before.  Strings
+        # are only cached the second time they are parsed, so that the
+        # many strings parsed once do not pay for a copy.
+        parsed = _parse_cache.get(spec_like)
+        if isinstance(parsed, Spec):
+            self._dup(parsed)
+        else:
+            # parse string types *into* this spec
+            parser = SpecParser(self)
+            spec_list = parser.parse(spec_like)
+            if len(spec_list) > 1:
+                raise ValueError("More than one spec in string: " + spec_like)
+            if len(spec_list) < 1:
+                raise ValueError("String contains no specs: " + spec_like)
+
+            # Hashes are looked up in the database, and specs with an
+            # architecture may get the current platform, so those
+            # results can change.
+            if '/' not in spec_like and not parser._with_architecture:
+                _parse_cache[spec_like] = self.copy() if parsed else True
 
         # Specs are by default not assumed to be normal, but in some
         # cases we've read them from a file want to assume normal.
@@ -1415,8 +1424,7 @@ class Spec(object):
         if self._hash:
             return self._hash[:length]
         else:
-            yaml_text = syaml.dump(
-                self.to_node_dict(), default_flow_style=True, width=maxint)
+            yaml_text = syaml.dump_flow(self.to_node_dict())
             sha = hashlib.sha1(yaml_text.encode('utf-8'))
 
             b32_hash = base64.b32encode(sha.digest()).lower()
@@ -1436,9 +1444,8 @@ class Spec(object):
             raise SpecError("Spec is not concrete: " + str(self))
 
         if not self._full_hash:
-            yaml_text = syaml.dump(
-                self.to_node_dict(hash_function=lambda s: s.full_hash()),
-                default_flow_style=True, width=maxint)
+            yaml_text = syaml.dump_flow(
+                self.to_node_dict(hash_function=lambda s: s.full_hash()))
             package_hash = self.package.content_hash()
             sha = hashlib.sha1(yaml_text.encode('utf-8') + package_hash)
 
@@ -2727,6 +2734,8 @@ class Spec(object):
         return changed
 
     def _dup_deps(self, other, deptypes, caches):
+        if not other._dependencies:
+            return
         new_specs = {self.name: self}
         for dspec in other.traverse_edges(cover='edges',
                                           root=False):
@@ -3285,29 +3294,36 @@ class SpecLexer(spack.parse.Lexer):
 
     def __init__(self):
         super(SpecLexer, self).__init__([
-            (r'/', lambda scanner, val: self.token(HASH,  val)),
-            (r'\^', lambda scanner, val: self.token(DEP,   val)),
-            (r'\@', lambda scanner, val: self.token(AT,    val)),
-            (r'\:', lambda scanner, val: self.token(COLON, val)),
-            (r'\,', lambda scanner, val: self.token(COMMA, val)),
-            (r'\+', lambda scanner, val: self.token(ON,    val)),
-            (r'\-', lambda scanner, val: self.token(OFF,   val)),
-            (r'\~', lambda scanner, val: self.token(OFF,   val)),
-            (r'\%', lambda scanner, val: self.token(PCT,   val)),
-            (r'\=', lambda scanner, val: self.token(EQ,    val)),
+            (r'/', HASH),
+            (r'\^', DEP),
+            (r'\@', AT),
+            (r'\:', COLON),
+            (r'\,', COMMA),
+            (r'\+', ON),
+            (r'\-', OFF),
+            (r'\~', OFF),
+            (r'\%', PCT),
+            (r'\=', EQ),
             # This is more liberal than identifier_re (see above).
             # Checked by check_identifier() for better error messages.
-            (r'\w[\w.-]*', lambda scanner, val: self.token(ID,    val)),
-            (r'\s+', lambda scanner, val: None)],
+            (r'\w[\w.-]*', ID),
+            (r'\s+', None)],
             [EQ],
-            [(r'[\S].*', lambda scanner, val: self.token(VAL,    val)),
-             (r'\s+', lambda scanner, val: None)],
+            [(r'[\S].*', VAL),
+             (r'\s+', None)],
             [VAL])
 
 
 # Lexer is always the same for every parser.
 _lexer = SpecLexer()
 
+#: Number of spec strings whose parsed specs are kept by Spec()
+parse_cache_size = 8192
+
+#: Specs parsed from strings by Spec(), by string, or True for strings
+#: parsed once.  Spec() copies them, so they are never modified.
+_parse_cache = LRUCache(parse_cache_size)
+
 
 class SpecParser(spack.parse.Parser):
 
@@ -3322,9 +3338,11 @@ class SpecParser(spack.parse.Parser):
         super(SpecParser, self).__init__(_lexer)
         self.previous = None
         self._initial = initial_spec
+        self._with_architecture = []
 
     def do_parse(self):
         specs = []
+        self._with_architecture = []
 
         try:
             while self.next:
@@ -3403,13 +3421,13 @@ class SpecParser(spack.parse.Parser):
             raise SpecParseError(e)
 
         # If the spec has an os or a target and no platform, give it
-        # the default platform
-        platform_default = spack.architecture.platform().name
-        for spec in specs:
-            for s in spec.traverse():
-                if s.architecture and not s.architecture.platform and \
-                        (s.architecture.platform_os or s.architecture.target):
-                    s._set_architecture(platform=platform_default)
+        # the default platform.  Only nodes parsed with an architecture
+        # need checking: nodes found by hash are concrete.
+        for s in self._with_architecture:
+            if not s.architecture.platform and \
+                    (s.architecture.platform_os or s.architecture.target):
+                s._set_architecture(
+                    platform=spack.architecture.platform().name)
         return specs
 
     def parse_compiler(self, text):
@@ -3524,6 +3542,8 @@ class SpecParser(spack.parse.Parser):
         if not added_version and not spec._hash:
             spec.versions = VersionList(':')
 
+        if spec.architecture:
+            self._with_architecture.append(spec)
         return spec
 
     def variant(self, name=None):
@@ -74,10 +74,13 @@ class Store(object):
             a package prefix in this store
         hash_length (int): length of the hashes used in the directory
             layout; spec hash suffixes will be truncated to this length
+        db_snapshot (bool): whether the database keeps a binary snapshot
+            of its index for faster loading
     """
-    def __init__(self, root, path_scheme=None, hash_length=None):
+    def __init__(self, root, path_scheme=None, hash_length=None,
+                 db_snapshot=False):
         self.root = root
-        self.db = spack.database.Database(root)
+        self.db = spack.database.Database(root, snapshot=db_snapshot)
         self.layout = spack.directory_layout.YamlDirectoryLayout(
             root, hash_len=hash_length, path_scheme=path_scheme)
 
@@ -93,7 +96,8 @@ def _store():
 
     return Store(root,
                  spack.config.get('config:install_path_scheme'),
-                 spack.config.get('config:install_hash_length'))
+                 spack.config.get('config:install_hash_length'),
+                 spack.config.get('config:db_snapshot', False))
 
 
 #: Singleton store instance
@@ -22,8 +22,15 @@
 # License along with this program; if not, write to the Free Software
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
 ##############################################################################
+import os
+import subprocess
+import sys
+
 import pytest
 
+import spack.cmd
+import spack.main
+import spack.paths
 from spack.main import SpackCommand
 
 
@@ -73,3 +80,74 @@ def test_help_subcommand():
     help_cmd = SpackCommand('help')
     out = help_cmd('help')
     assert 'get help on spack and its commands' in out
+
+
+def test_command_index_is_cached(tmpdir, monkeypatch):
+    """Help reads command properties from the cached command index."""
+    index_path = str(tmpdir.join('commands.json'))
+    monkeypatch.setattr(spack.main, 'command_index_path', lambda: index_path)
+    monkeypatch.setattr(spack.main, '_command_index', None)
+
+    index = spack.main.command_index()
+    assert os.path.exists(index_path)
+    assert index['help'] == {
+        'level': 'short',
+        'section': 'help',
+        'description': 'get help on spack and its commands'}
+
+    # a second process would read it from the file, without importing
+    # the command modules
+    def fail():
+        raise AssertionError('command modules should not be read')
+
+    monkeypatch.setattr(spack.main, '_command_index', None)
+    monkeypatch.setattr(spack.main, '_read_command_properties', fail)
+    assert spack.main.command_index() == index
+
+
+@pytest.mark.parametrize('argv', [['--version'], ['help'], ['help', '--all']])
+def test_fast_startup(tmpdir, argv):
+    """Short commands do not import the modules that make startup slow."""
+    heavy_modules = ['spack.config', 'spack.repo', 'spack.spec', 'jinja2']
+    script = """\
+import sys
+sys.path[:0] = {path!r}
+import spack.main
+spack.main.main({argv!r})
+sys.stderr.write(repr(sorted(m for m in {heavy!r} if m in sys.modules)))
+""".format(path=[spack.paths.external_path, spack.paths.lib_path],
+           argv=['--time-startup'] + argv, heavy=heavy_modules)
+
+    # keep the command index of the new process out of the real home
+    env = os.environ.copy()
+    env['HOME'] = str(tmpdir)
+
+    proc = subprocess.Popen(
+        [sys.executable, '-c', script], env=env,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, err = proc.communicate()
+    err = err.decode('utf-8')
+
+    assert proc.returncode == 0
+    assert 'Startup took' in err
+    assert err.endswith('[]')
+
+
+@pytest.mark.parametrize('cmd_name', spack.cmd.all_commands())
+def test_command_help_in_fresh_process(tmpdir, cmd_name):
+    """Every command module can be imported on its own.
+
+    The test process has all of Spack imported already, which hides import
+    cycles that only show up when a command is the first module to import
+    part of Spack, as in a new ``spack`` process.
+    """
+    env = os.environ.copy()
+    env['HOME'] = str(tmpdir)
+
+    proc = subprocess.Popen(
+        [sys.executable, spack.paths.spack_script, cmd_name, '-h'], env=env,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, err = proc.communicate()
+
+    assert proc.returncode == 0, err.decode('utf-8')
+    assert out.decode('utf-8').startswith('usage: spack ' + cmd_name)
@@ -22,11 +22,19 @@
 # License along with this program; if not, write to the Free Software
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
 ##############################################################################
+import os
+
 import pytest
 import llnl.util.lang
+import llnl.util.multiproc
 
 import spack.architecture
+import spack.concretize
+import spack.config
+import spack.error
+import spack.paths
 import spack.repo
+import spack.util.file_cache
 
 from spack.concretize import find_spec
 from spack.spec import Spec, CompilerSpec
@@ -528,3 +536,176 @@ class TestConcretize(object):
         t.concretize()
 
         assert s.dag_hash() == t.dag_hash()
+
+
+@pytest.fixture()
+def concretization_cache(tmpdir, monkeypatch):
+    """Enables the concretization cache, in a temporary directory."""
+    cache = spack.concretize.ConcretizationCache(
+        spack.util.file_cache.FileCache(str(tmpdir)))
+    monkeypatch.setattr(spack.concretize, 'concretization_cache', cache)
+    with spack.config.override('config:concretization_cache', True):
+        yield cache
+
+
+def _fail_to_concretize(*args, **kwargs):
+    raise AssertionError('spec was concretized again')
+
+
+@pytest.mark.usefixtures('config', 'mock_packages')
+@pytest.mark.parametrize('abstract', [
+    'mpileaks ^zmpi', 'mpileaks ^mpi@2:', 'dt-diamond', 'externaltool',
+    'mpich cppflags="-O3"', 'patch-several-dependencies',
+])
+def test_concretization_cache(concretization_cache, monkeypatch, abstract):
+    expected = Spec(abstract).concretized()
+    assert spack.concretize.concretized(Spec(abstract)) == expected
+
+    # the second time, the spec is read from the cache
+    monkeypatch.setattr(Spec, 'concretize', _fail_to_concretize)
+    concrete = spack.concretize.concretized(Spec(abstract))
+
+    assert concrete.concrete
+    assert concrete.dag_hash() == expected.dag_hash()
+    assert concrete.eq_dag(expected, deptypes=True)
+    for node in concrete.traverse(deptype=all):
+        expected_node = expected[node.name]
+        assert node.external_module == expected_node.external_module
+        assert node.external_path == expected_node.external_path
+        if 'patches' in node.variants:
+            assert node.patches == expected_node.patches
+
+
+def test_concretization_cache_covers_all_modules(tmpdir, monkeypatch):
+    """Changes to modules in subpackages of spack invalidate the cache,
+    but changes to the tests do not."""
+    for path in ('spec.py', 'util/executable.py', 'test/spec.py'):
+        tmpdir.ensure(path)
+    monkeypatch.setattr(spack.paths, 'module_path', str(tmpdir))
+
+    def fingerprint():
+        cache = spack.concretize.ConcretizationCache(None)
+        return cache._code_fingerprint()
+
+    def touch(path, mtime):
+        os.utime(str(tmpdir.join(path)), (mtime, mtime))
+
+    before = fingerprint()
+    touch('test/spec.py', 1000)
+    assert fingerprint() == before
+    touch('util/executable.py', 1000)
+    assert fingerprint() != before
+
+
+@pytest.mark.usefixtures('config', 'mock_packages')
+def test_concretization_cache_invalidation(concretization_cache):
+    abstract = Spec('mpileaks')
+    key = concretization_cache.key(abstract)
+    assert spack.concretize.concretized(abstract).satisfies('^mpich')
+    assert concretization_cache.key(Spec('mpileaks')) == key
+
+    # a different spec, or the same spec under a different configuration,
+    # has a different key
+    assert concretization_cache.key(Spec('mpileaks ^zmpi')) != key
+    assert concretization_cache.key(abstract, tests=True) != key
+
+    spack.config.config.push_scope(spack.config.InternalConfigScope(
+        'zmpi-first', {'packages': {'all': {'providers': {'mpi': ['zmpi']}}}}))
+    spack.package_prefs.PackagePrefs.clear_caches()
+    try:
+        assert concretization_cache.key(abstract) != key
+        assert spack.concretize.concretized(abstract).satisfies('^zmpi')
+    finally:
+        spack.config.config.pop_scope()
+        spack.package_prefs.PackagePrefs.clear_caches()
+
+    # the cache can be bypassed
+    assert spack.concretize.concretized(abstract, use_cache=False) == \
+        abstract.concretized()
+
+
+@pytest.mark.usefixtures('config', 'mock_packages')
+def test_concretize_specs(monkeypatch):
+    abstract = [Spec('mpileaks'), Spec('callpath ^zmpi'), Spec('mpi'),
+                Spec('externaltool'), Spec('mpileaks')]
+    expected = [s.concretized() for s in abstract]
+
+    # lookups are shared by the whole batch
+    lookups = []
+    providers_for = spack.repo.path.providers_for
+
+    def count_lookups(vspec):
+        lookups.append(str(vspec))
+        return providers_for(vspec)
+
+    monkeypatch.setattr(spack.repo.path, 'providers_for', count_lookups)
+
+    concrete = spack.concretize.concretize_specs(abstract, use_cache=False)
+    assert [s.dag_hash() for s in concrete] == \
+        [s.dag_hash() for s in expected]
+    assert all(not s.concrete for s in abstract)
+    assert sorted(lookups) == sorted(set(lookups))
+
+
+@pytest.mark.usefixtures('config', 'mock_packages')
+def test_concretize_specs_unify():
+    def together(*specs, **kwargs):
+        return spack.concretize.concretize_specs(
+            [Spec(s) for s in specs], use_cache=False, **kwargs)
+
+    # without unify, each spec gets its own preferred dependencies
+    callpath, mpileaks = together('callpath ^mpich@1.0', 'mpileaks')
+    assert mpileaks['mpich'].satisfies('@3.0.4')
+
+    callpath, mpileaks = together(
+        'callpath ^mpich@1.0', 'mpileaks', unify=True)
+    assert mpileaks['mpich'].satisfies('@1.0')
+    assert mpileaks['mpich'].dag_hash() == callpath['mpich'].dag_hash()
+    assert mpileaks['callpath'].dag_hash() == callpath.dag_hash()
+
+    # nodes that do not satisfy a later spec are not reused
+    callpath, mpileaks = together(
+        'callpath ^mpich@1.0', 'mpileaks ^mpich@3:', unify=True)
+    assert mpileaks['mpich'].satisfies('@3.0.4')
+    assert mpileaks['dyninst'].dag_hash() == callpath['dyninst'].dag_hash()
+
+
+@pytest.mark.usefixtures('config', 'mock_packages')
+def test_concretize_specs_in_parallel():
+    abstract = [Spec(s) for s in (
+        'mpileaks', 'callpath ^zmpi', 'externaltool', 'dt-diamond',
+        'patch-several-dependencies', 'libelf', 'mpich')]
+    expected = spack.concretize.concretize_specs(abstract, use_cache=False)
+
+    # all the specs are concretized by the workers
+    concrete = spack.concretize._concretize_in_pool(
+        abstract, tests=False, use_cache=False, jobs=3)
+    assert [s.dag_hash() for s in concrete] == \
+        [s.dag_hash() for s in expected]
+    for s, e in zip(concrete, expected):
+        assert s.concrete
+        assert s.eq_dag(e, deptypes=True)
+
+
+@pytest.mark.usefixtures('config', 'mock_packages')
+def test_concretize_specs_without_fork(monkeypatch):
+    abstract = [Spec('mpileaks'), Spec('libelf')]
+    expected = spack.concretize.concretize_specs(abstract, use_cache=False)
+
+    monkeypatch.setattr(llnl.util.multiproc, 'fork_context', lambda: None)
+    assert spack.concretize._concretize_in_pool(
+        abstract, tests=False, use_cache=False, jobs=2) == [None, None]
+    concrete = spack.concretize.concretize_specs(
+        abstract, use_cache=False, jobs=2)
+    assert [s.dag_hash() for s in concrete] == \
+        [s.dag_hash() for s in expected]
+
+
+@pytest.mark.usefixtures('config', 'mock_packages')
+def test_concretize_specs_in_parallel_reports_errors():
+    abstract = [Spec('mpileaks'), Spec('mpileaks %gcc@0.1'), Spec('libelf')]
+    with pytest.raises(spack.error.SpackError) as serial:
+        spack.concretize.concretize_specs(abstract, use_cache=False)
+    with pytest.raises(spack.error.SpackError) as parallel:
+        spack.concretize.concretize_specs(abstract, use_cache=False, jobs=2)
+    assert type(parallel.value) is type(serial.value)
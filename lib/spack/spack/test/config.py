@@ -33,7 +33,10 @@ import pytest
 import ruamel.yaml as yaml
 
 import spack.paths
+import spack.compilers
 import spack.config
+import spack.package_prefs
+from spack.spec import Spec
 from spack.util.path import canonicalize_path
 
 
@@ -664,3 +667,81 @@ config:
 
     with pytest.raises(spack.config.ConfigError):
         scope.write_section('config')
+
+
+@pytest.mark.usefixtures('mock_packages')
+def test_merged_section_cache_keeps_spec_hashes(
+        tmpdir, configuration_dir, monkeypatch):
+    """Specs hash the same with a cold and a warm configuration cache."""
+    hashes = []
+    for i in range(2):
+        monkeypatch.setattr(spack.config, 'config', spack.config.Configuration(
+            *[spack.config.ConfigScope(name, str(configuration_dir.join(name)))
+              for name in ['site', 'system', 'user']],
+            cache_path=str(tmpdir)))
+        monkeypatch.setattr(spack.compilers, '_cache_config_file', [])
+        monkeypatch.setattr(spack.compilers, '_compiler_cache', {})
+        spack.package_prefs.PackagePrefs.clear_caches()
+
+        hashes.append(Spec('libdwarf').concretized().dag_hash())
+        assert tmpdir.listdir()
+
+    spack.package_prefs.PackagePrefs.clear_caches()
+    assert hashes[0] == hashes[1]
+
+
+def test_merged_section_cache(tmpdir, write_config_file, monkeypatch):
+    """Merged sections are cached until a configuration file changes."""
+    write_config_file('config', config_low, 'low')
+    write_config_file('config', config_merge_list, 'high')
+    expected = {
+        'install_tree': 'install_tree_path',
+        'build_stage': ['patha', 'pathb', 'path1', 'path2', 'path3']
+    }
+
+    def make_config():
+        return spack.config.Configuration(
+            *[spack.config.ConfigScope(name, str(tmpdir.join(name)))
+              for name in ['low', 'high']],
+            cache_path=str(tmpdir.join('cache')))
+
+    # the first configuration reads and caches the files
+    assert make_config().get('config') == expected
+    assert tmpdir.join('cache').listdir()
+
+    # the next one reads the cache only
+    read_files = []
+    real_read_config_file = spack.config._read_config_file
+
+    def read_config_file(filename, schema):
+        read_files.append(filename)
+        return real_read_config_file(filename, schema)
+
+    monkeypatch.setattr(spack.config, '_read_config_file', read_config_file)
+    cfg = make_config()
+    assert cfg.get('config') == expected
+    assert not read_files
+
+    # returned data is a copy of the cached section
+    cfg.get('config')['install_tree'] = 'changed'
+    assert cfg.get('config:install_tree') == 'install_tree_path'
+
+    # changing a file, or an internal scope, invalidates the cache
+    write_config_file('config', config_override_list, 'high')
+    cfg = make_config()
+    assert cfg.get('config')['build_stage'] == ['patha', 'pathb']
+    assert read_files
+
+    cfg.push_scope(spack.config.InternalConfigScope('command_line'))
+    cfg.set('config:install_tree', 'foo/bar', scope='command_line')
+    assert cfg.get('config:install_tree') == 'foo/bar'
+    assert make_config().get('config:install_tree') == 'install_tree_path'
+
+    # so does a new Spack, or a change to the schemas
+    del read_files[:]
+    make_config().get('config')
+    assert not read_files
+    monkeypatch.setattr(spack.config, '_schema_stamp',
+                        lambda: ['schema', '0.0.0', []])
+    assert make_config().get('config:install_tree') == 'install_tree_path'
+    assert read_files
@@ -0,0 +1,129 @@
+##############################################################################
+# Copyright (c) 2013-2018, Lawrence Livermore National Security, LLC.
+# Produced at the Lawrence Livermore National Laboratory.
+#
+# This file is part of Spack.
+# Created by Todd Gamblin, tgamblin@llnl.gov, All rights reserved.
+# LLNL-CODE-647188
+#
+# For details, see https://github.com/spack/spack
+# Please also see the NOTICE and LICENSE files for our notice and the LGPL.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License (as
+# published by the Free Software Foundation) version 2.1, February 1999.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the IMPLIED WARRANTY OF
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the terms and
+# conditions of the GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+##############################################################################
+import os
+import socket
+import time
+
+import pytest
+
+import spack.daemon
+import spack.paths
+import spack.repo
+
+pytestmark = pytest.mark.skipif(
+    not hasattr(socket.socket, 'sendmsg'),
+    reason='the daemon passes file descriptors with sendmsg()')
+
+
+@pytest.fixture()
+def daemon(tmpdir):
+    path = str(tmpdir.join('spack.sock'))
+
+    pid = os.fork()
+    if pid == 0:
+        try:
+            spack.daemon.Daemon(path).serve()
+        finally:
+            os._exit(0)
+
+    for i in range(100):
+        if spack.daemon.status(path):
+            break
+        time.sleep(0.05)
+
+    yield path
+
+    spack.daemon.stop(path)
+    os.waitpid(pid, 0)
+
+
+@pytest.mark.parametrize('argv,expected', [
+    (['find', 'mpileaks'], True),
+    (['location', '-r'], True),
+    (['module', 'loads', 'mpileaks'], True),
+    (['module', 'refresh'], False),
+    (['module', 'rm', 'find'], False),
+    (['install', 'mpileaks'], False),
+    (['-C', 'scope', 'find'], False),
+    ([], False),
+])
+def test_can_forward(argv, expected):
+    assert spack.daemon.can_forward(argv) == expected
+
+
+def test_forward_without_daemon(tmpdir):
+    path = str(tmpdir.join('spack.sock'))
+    assert spack.daemon.status(path) is None
+    assert spack.daemon.forward(['location', '-r'], path) is None
+
+
+def test_daemon_runs_commands(database, daemon, capfd):
+    assert spack.daemon.forward(['location', '-r'], daemon) == 0
+    assert spack.daemon.forward(['find', 'mpileaks'], daemon) == 0
+    assert spack.daemon.forward(['location', '-i', 'nosuchpkg'], daemon) == 1
+
+    out, err = capfd.readouterr()
+    assert spack.paths.prefix in out
+    assert 'mpileaks@2.3' in out
+    assert 'nosuchpkg' in err
+
+    running = spack.daemon.status(daemon)
+    assert running['pid'] != os.getpid()
+    assert running['requests'] == 3
+
+    # commands changing state run in the client
+    assert spack.daemon.forward(['install', 'mpileaks'], daemon) is None
+
+
+def test_daemon_falls_back_when_files_change(database, daemon):
+    packages_path = spack.repo.path.repos[0].packages_path
+    st = os.stat(packages_path)
+    os.utime(packages_path, (st.st_atime, st.st_mtime + 10))
+    try:
+        assert spack.daemon.forward(['location', '-r'], daemon) is None
+    finally:
+        os.utime(packages_path, (st.st_atime, st.st_mtime))
+
+    # the daemon stopped serving, to start over
+    time.sleep(0.1)
+    assert spack.daemon.status(daemon) is None
+
+
+def test_daemon_checks_package_files(tmpdir):
+    daemon = spack.daemon.Daemon(str(tmpdir.join('spack.sock')))
+    daemon.listen()
+    try:
+        assert not daemon._files_changed()
+
+        repo = spack.repo.path.repos[0]
+        package_file = repo.filename_for_package_name('mpileaks')
+        st = os.stat(package_file)
+        os.utime(package_file, (st.st_atime, st.st_mtime + 10))
+        try:
+            assert daemon._files_changed()
+        finally:
+            os.utime(package_file, (st.st_atime, st.st_mtime))
+    finally:
+        daemon._socket.close()
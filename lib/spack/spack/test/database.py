@@ -34,6 +34,7 @@ import pytest
 
 from llnl.util.tty.colify import colify
 
+import spack.database
 import spack.repo
 import spack.store
 from spack.test.conftest import MockPackageMultiRepo
@@ -335,6 +336,224 @@ def test_050_basic_query(database):
     assert len(database.query(end_date=datetime.datetime.max)) == 16
 
 
+def _query_by_full_scan(database, query_spec, **kwargs):
+    """Reference implementation of query() that tests every record."""
+    query_spec = spack.spec.Spec(query_spec)
+    with database.read_transaction():
+        return sorted(
+            rec.spec for rec in database._data.values()
+            if rec.installed and rec.spec.satisfies(query_spec))
+
+
+@pytest.mark.parametrize('query', [
+    'mpileaks', 'mpi', 'mpich', 'libelf', 'nonexistent-package',
+    'mpileaks@2.3', 'mpileaks@:1', 'callpath@1.0:', '@0.8.13', '@1.0:',
+    '%gcc', '%gcc@4.5.0', '%clang', 'mpileaks%gcc', 'mpileaks %clang',
+    '^mpich', '^mpi', '^libelf', '^mpich2 ^libdwarf', '^fake',
+    'mpileaks ^mpich', 'mpileaks ^zmpi', 'callpath ^mpi@2:',
+    'mpileaks ^libelf@0.8.13', 'dyninst ^nonexistent-package',
+    'arch=test-debian6-x86_64', '+debug', 'mpileaks~debug',
+])
+def test_indexed_query_matches_full_scan(database, query):
+    assert database.query(query) == _query_by_full_scan(database, query)
+
+
+def test_query_index_follows_add_and_remove(mutable_database):
+    db = mutable_database
+    with db.write_transaction():
+        # build the indexes, then modify the records they index
+        assert len(db.query('mpileaks')) == 3
+        assert len(db.query('^zmpi')) == 2    # mpileaks and callpath
+
+        db._remove(db.query_one('mpileaks ^zmpi'))
+        assert len(db.query('mpileaks')) == 2
+        assert len(db.query('^zmpi')) == 1
+
+        db._remove(db.query_one('callpath ^zmpi'))
+        assert len(db.query('^zmpi')) == 0
+        assert len(db.query('zmpi')) == 1
+
+        spec = spack.spec.Spec('mpileaks ^zmpi').concretized()
+        db._add(spec, spack.store.layout)
+        assert len(db.query('mpileaks')) == 3
+        assert len(db.query('^zmpi')) == 2
+        assert db.query('mpileaks ^zmpi') == [spec]
+
+
+def _read_index_file(database):
+    with open(database._index_path) as f:
+        return f.read()
+
+
+def test_write_transactions_append_to_journal(mutable_database):
+    mutable_database.compact()
+    assert not os.path.exists(mutable_database._journal_path)
+    index = _read_index_file(mutable_database)
+
+    with mutable_database.write_transaction():
+        _mock_remove('mpileaks ^zmpi')
+    mutable_database.update_explicit('callpath ^zmpi', True)
+
+    # the index is untouched, and the journal has one line per transaction
+    assert _read_index_file(mutable_database) == index
+    with open(mutable_database._journal_path) as f:
+        assert len(f.readlines()) == 2
+
+    # another instance replays the journal on top of the index
+    other = spack.database.Database(mutable_database.root)
+    with other.read_transaction():
+        assert len(other.query('mpileaks ^zmpi')) == 0
+        assert other.get_record('callpath ^zmpi').explicit
+        other._check_ref_counts()
+
+    # compaction folds the journal into the index
+    mutable_database.compact()
+    assert not os.path.exists(mutable_database._journal_path)
+    assert _read_index_file(mutable_database) != index
+
+    other = spack.database.Database(mutable_database.root)
+    with other.read_transaction():
+        assert len(other.query('mpileaks ^zmpi')) == 0
+        assert other.get_record('callpath ^zmpi').explicit
+
+
+def test_interrupted_journal_write_is_ignored(mutable_database):
+    mutable_database.compact()
+    mutable_database.update_explicit('callpath ^zmpi', True)
+    with open(mutable_database._journal_path, 'a') as f:
+        f.write('{"generation":')
+
+    with mutable_database.read_transaction():
+        assert mutable_database.get_record('callpath ^zmpi').explicit
+
+    # the partial entry is dropped by the next write
+    mutable_database.update_explicit('callpath ^mpich', True)
+    with open(mutable_database._journal_path) as f:
+        lines = f.readlines()
+    assert len(lines) == 2
+    assert all(line.endswith('\n') for line in lines)
+
+
+def test_stale_journal_is_skipped_after_compaction(mutable_database):
+    mutable_database.compact()
+    mutable_database.update_explicit('callpath ^zmpi', True)
+    with open(mutable_database._journal_path) as f:
+        journal = f.read()
+
+    # simulate a crash between rewriting the index and removing the journal
+    mutable_database.compact()
+    mutable_database.update_explicit('callpath ^zmpi', False)
+    mutable_database.compact()
+    with open(mutable_database._journal_path, 'w') as f:
+        f.write(journal)
+
+    with mutable_database.read_transaction():
+        assert not mutable_database.get_record('callpath ^zmpi').explicit
+
+
+@pytest.fixture()
+def count_index_reads(monkeypatch):
+    """Count the times a database parses its index file."""
+    reads = []
+    read_from_file = spack.database.Database._read_from_file
+
+    def _read_from_file(self, *args, **kwargs):
+        reads.append(args)
+        return read_from_file(self, *args, **kwargs)
+
+    monkeypatch.setattr(
+        spack.database.Database, '_read_from_file', _read_from_file)
+    return reads
+
+
+def _in_another_process(function):
+    p = multiprocessing.Process(target=function)
+    p.start()
+    p.join()
+
+
+def test_read_skips_unchanged_index(mutable_database, count_index_reads):
+    db = mutable_database
+    with db.read_transaction():
+        query_index = db._get_query_index()
+    del count_index_reads[:]
+
+    with db.read_transaction():
+        assert len(db.query('mpileaks')) == 3
+    assert not count_index_reads
+    assert db._get_query_index() is query_index
+
+    # changes journaled by another process are applied incrementally
+    def remove():
+        with db.write_transaction():
+            _mock_remove('mpileaks ^zmpi')
+    _in_another_process(remove)
+
+    with db.read_transaction():
+        assert len(db.query('mpileaks')) == 2
+        assert len(db.query('^zmpi')) == 1
+        db._check_ref_counts()
+    assert not count_index_reads
+
+    def install():
+        with db.write_transaction():
+            _mock_install('mpileaks ^zmpi')
+    _in_another_process(install)
+
+    with db.read_transaction():
+        assert len(db.query('mpileaks')) == 3
+        assert db.query_one('mpileaks ^zmpi') in db.query('^zmpi')
+        db._check_ref_counts()
+    assert not count_index_reads
+    _check_merkleiness()
+
+    # a compacted index is read again
+    _in_another_process(db.compact)
+    with db.read_transaction():
+        assert len(db.query('mpileaks')) == 3
+    assert len(count_index_reads) == 1
+
+
+def test_aborted_write_reads_index_again(mutable_database, count_index_reads):
+    with pytest.raises(Exception):
+        with mutable_database.write_transaction():
+            _mock_remove('mpileaks ^zmpi')
+            raise Exception()
+
+    with mutable_database.read_transaction():
+        assert len(mutable_database.query('mpileaks ^zmpi')) == 1
+    assert len(count_index_reads) == 1
+
+
+def test_read_from_snapshot(mutable_database, count_index_reads):
+    root = mutable_database.root
+    mutable_database.compact()
+
+    db = spack.database.Database(root, snapshot=True)
+    with db.read_transaction():
+        expected = db.query()
+    assert os.path.exists(db._snapshot_path)
+    del count_index_reads[:]
+
+    # records journaled after the snapshot are replayed on top of it
+    mutable_database.update_explicit('callpath ^zmpi', True)
+
+    db = spack.database.Database(root, snapshot=True)
+    with db.read_transaction():
+        assert db.query() == expected
+        assert db.get_record('callpath ^zmpi').explicit
+        db._check_ref_counts()
+    assert not count_index_reads
+
+    # the snapshot is not used once the index changed
+    mutable_database.compact()
+    os.utime(db._index_path, (0, 0))
+    db = spack.database.Database(root, snapshot=True)
+    with db.read_transaction():
+        assert db.query() == expected
+    assert len(count_index_reads) == 1
+
+
 def test_060_remove_and_add_root_package(database):
     _check_remove_and_add_package(database, 'mpileaks ^mpich')
 
@@ -22,9 +22,11 @@
 # License along with this program; if not, write to the Free Software
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
 ##############################################################################
+import multiprocessing
 import os
 import pytest
 
+import spack.installer
 import spack.repo
 import spack.store
 from spack.spec import Spec
@@ -205,5 +207,105 @@ def test_failing_build(install_mockery, mock_fetch):
         pkg.do_install()
 
 
+def test_concurrent_install_dependencies(install_mockery, mock_fetch):
+    spec = Spec('dt-diamond').concretized()
+    spec.package.do_install(
+        fake=True, explicit=True, concurrent_builds=3, make_jobs=6)
+
+    # dependencies were added to the DB by other processes
+    with spack.store.db.read_transaction():
+        for s in spec.traverse():
+            assert s.package.installed
+    assert spack.store.db.query_one('dt-diamond').dag_hash() == \
+        spec.dag_hash()
+    assert len(spack.store.db.query(explicit=True)) == 1
+
+
+@pytest.mark.disable_clean_stage_check
+def test_concurrent_install_keep_going(install_mockery, mock_fetch):
+    failing = Spec('failing-build').concretized()
+    trivial = Spec('trivial-install-test-package').concretized()
+
+    installer = spack.installer.DagInstaller(
+        [failing, trivial], explicit=True, concurrent_builds=2,
+        fail_fast=False)
+    with pytest.raises(spack.installer.DagInstallError) as exc_info:
+        installer.install()
+
+    assert exc_info.value.failed == [failing]
+    with spack.store.db.read_transaction():
+        assert trivial.package.installed
+    assert not failing.package.installed
+    assert trivial.dag_hash() in installer.timings
+
+
+@pytest.mark.disable_clean_stage_check
+def test_concurrent_install_fail_fast(install_mockery, mock_fetch):
+    failing = Spec('failing-build').concretized()
+    trivial = Spec('trivial-install-test-package').concretized()
+
+    installer = spack.installer.DagInstaller(
+        [failing, trivial], concurrent_builds=1, fail_fast=True)
+    with pytest.raises(spack.installer.DagInstallError) as exc_info:
+        installer.install()
+
+    # the failure stops the second root from being started, which is
+    # not reported as depending on the failed one
+    assert exc_info.value.skipped == []
+    assert exc_info.value.not_started == [trivial]
+    assert 'after the first failure: trivial' in exc_info.value.long_message
+    assert not trivial.package.installed
+
+
+def test_cooperative_install_waits_for_other_process(
+        install_mockery, mock_fetch):
+    spec = Spec('dt-diamond').concretized()
+    bottom = spec['dt-diamond-bottom']
+    started, release = multiprocessing.Event(), multiprocessing.Event()
+
+    def other_spack():
+        # Another process claims the bottom of the diamond and installs it
+        with spack.store.db.prefix_write_lock(bottom):
+            started.set()
+            release.wait(10)
+            bottom.package.do_install(fake=True)
+
+    other = multiprocessing.Process(target=other_spack)
+    other.start()
+    started.wait(10)
+
+    installer = spack.installer.DagInstaller(
+        [spec], explicit=True, concurrent_builds=2, fake=True)
+    installer.busy_interval = 0.05
+
+    original_check = installer._check_busy
+
+    def check_busy(ready):
+        # let the other process finish once we know it is busy
+        if installer.busy:
+            release.set()
+        original_check(ready)
+
+    installer._check_busy = check_busy
+    installer.install()
+    other.join()
+
+    assert bottom.dag_hash() in installer.waited_for
+    assert installer.timings[bottom.dag_hash()] == 0.0
+    with spack.store.db.read_transaction():
+        for s in spec.traverse():
+            assert s.package.installed
+
+
+def test_concurrent_builds_split_jobs(install_mockery):
+    spec = Spec('dt-diamond').concretized()
+    installer = spack.installer.DagInstaller(
+        [spec], jobs=16, concurrent_builds=4)
+
+    assert installer._make_jobs_for_next_build(1) == 16
+    assert installer._make_jobs_for_next_build(2) == 8
+    assert installer._make_jobs_for_next_build(10) == 4
+
+
 class MockInstallError(spack.error.SpackError):
     pass
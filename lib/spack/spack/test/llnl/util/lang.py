@@ -127,3 +127,22 @@ def test_match_predicate():
     with pytest.raises(ValueError):
         matcher = match_predicate(object())
         matcher('foo')
+
+
+def test_lru_cache():
+    cache = llnl.util.lang.LRUCache(2)
+    cache['a'] = 1
+    cache['b'] = 2
+    assert cache.get('a') == 1
+
+    # 'b' is now the least recently used
+    cache['c'] = 3
+    assert 'b' not in cache
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert len(cache) == 2
+    assert (cache.hits, cache.misses) == (3, 1)
+
+    cache.clear()
+    assert len(cache) == 0
@@ -334,6 +334,22 @@ def test_write_lock_timeout_on_write(lock_path):
         timeout_write(lock_path))
 
 
+def test_nonblocking_write_lock(lock_path):
+    def try_write(barrier):
+        lock = lk.Lock(lock_path)
+        barrier.wait()  # wait for lock acquire in first process
+        with pytest.raises(lk.LockTimeoutError):
+            lock.acquire_write(0)
+        barrier.wait()
+
+    multiproc_test(acquire_write(lock_path), try_write)
+
+    # a single attempt is enough when the lock is free
+    lock = lk.Lock(lock_path)
+    assert lock.acquire_write(0)
+    lock.release_write()
+
+
 def test_write_lock_timeout_on_write_2(lock_path):
     multiproc_test(
         acquire_write(lock_path),
@@ -812,6 +828,22 @@ def test_transaction(lock_path):
     assert not vals['exception']
 
 
+def test_transaction_release_fn_runs_with_lock_held(lock_path):
+    lock = lk.Lock(lock_path)
+    held = []
+
+    def exit_fn(t, v, tb):
+        held.append(lock._file is not None)
+
+    with lk.WriteTransaction(lock, release_fn=exit_fn):
+        pass
+    with lk.ReadTransaction(lock, release_fn=exit_fn):
+        pass
+
+    assert held == [True, True]
+    assert lock._file is None
+
+
 def test_transaction_with_exception(lock_path):
     def enter_fn():
         vals['entered'] = True
@@ -25,26 +25,43 @@
 """
 This test checks the binary packaging infrastructure
 """
+import gzip
+import hashlib
+import json
+import multiprocessing
 import os
+import re
 import stat
 import sys
 import shutil
+import tarfile
 import pytest
 import argparse
+from contextlib import closing
+from io import BytesIO
+
+import ruamel.yaml as yaml
+from six.moves.urllib.error import HTTPError
 
 from llnl.util.filesystem import mkdirp
 
+import spack.caches
+import spack.config
+import spack.installer
 import spack.repo
 import spack.store
+import spack.util.content_store
 import spack.binary_distribution as bindist
 import spack.cmd.buildcache as buildcache
 from spack.spec import Spec
 from spack.paths import mock_gpg_keys_path
 from spack.fetch_strategy import URLFetchStrategy, FetchStrategyComposite
-from spack.util.executable import ProcessError
+from spack.main import SpackCommand
+from spack.util.executable import ProcessError, which
+from spack.util.file_cache import FileCache
 from spack.relocate import needs_binary_relocation, needs_text_relocation
 from spack.relocate import strings_contains_installroot
-from spack.relocate import get_patchelf, relocate_text
+from spack.relocate import get_patchelf, relocate_text, relocate_text_files
 from spack.relocate import substitute_rpath, get_relative_rpaths
 from spack.relocate import macho_replace_paths, macho_make_paths_relative
 from spack.relocate import modify_macho_object, macho_get_paths
@@ -218,6 +235,69 @@ echo $PATH"""
     stage.destroy()
 
 
+def test_buildcache_index(tmpdir, mutable_config, mock_packages,
+                          monkeypatch):
+    """The index of a build cache is used, and cached, to find specs."""
+    mirror_path = str(tmpdir.join('mirror'))
+    cache_dir = os.path.join(mirror_path, 'build_cache')
+    mkdirp(cache_dir)
+
+    # write the spec.yaml and .spack files of a fake, signed binary package
+    spec = Spec('libdwarf')
+    spec.concretize()
+    spec_dict = spec.to_dict()
+    spec_dict['binary_cache_checksum'] = {
+        'hash_algorithm': 'sha256', 'hash': '0' * 64}
+    spec_dict['full_hash'] = spec.full_hash()
+    specfile_path = os.path.join(
+        cache_dir, bindist.tarball_name(spec, '.spec.yaml'))
+    with open(specfile_path, 'w') as f:
+        f.write(yaml.dump(spec_dict))
+
+    spackfile_path = os.path.join(
+        cache_dir, bindist.tarball_path_name(spec, '.spack'))
+    mkdirp(os.path.dirname(spackfile_path))
+    with closing(tarfile.open(spackfile_path, 'w')) as tar:
+        tar.add(specfile_path, arcname=os.path.basename(specfile_path))
+        tar.add(specfile_path, arcname=os.path.basename(specfile_path) +
+                '.asc')
+
+    index = bindist.generate_package_index(mirror_path)
+    entry = index['specs'][spec.dag_hash()]
+    assert entry['signed']
+    assert entry['spackfile'] == bindist.tarball_path_name(spec, '.spack')
+    assert entry['spec']['full_hash'] == spec.full_hash()
+
+    # specs are read from the index, which is cached
+    monkeypatch.setattr(spack.caches, 'misc_cache',
+                        FileCache(str(tmpdir.join('cache'))))
+    monkeypatch.setattr(bindist, '_cached_specs', None)
+    monkeypatch.setattr(bindist, '_binary_index', None)
+    spack.config.set('mirrors', {'test': 'file://' + mirror_path})
+
+    specs = bindist.get_specs()
+    assert [s.dag_hash() for s in specs] == [spec.dag_hash()]
+    assert all(s.concrete for s in specs)
+
+    def fail(data):
+        raise AssertionError('the cached index should be used')
+
+    parse_index = bindist._parse_index
+    monkeypatch.setattr(bindist, '_parse_index', fail)
+    monkeypatch.setattr(bindist, '_cached_specs', None)
+    monkeypatch.setattr(bindist, '_binary_index', None)
+    assert bindist.get_specs() == specs
+    monkeypatch.setattr(bindist, '_parse_index', parse_index)
+
+    # updating the index drops specs whose files are gone
+    os.remove(specfile_path)
+    assert bindist.generate_package_index(mirror_path)['specs'] == {}
+
+    monkeypatch.setattr(bindist, '_cached_specs', None)
+    monkeypatch.setattr(bindist, '_binary_index', None)
+    assert not bindist.get_specs()
+
+
 def test_relocate_text(tmpdir):
     with tmpdir.as_cwd():
         # Validate the text path replacement
@@ -235,6 +315,31 @@ def test_relocate_text(tmpdir):
         assert(strings_contains_installroot(filename, old_dir) is False)
 
 
+def test_relocate_text_files(tmpdir):
+    old_dir, new_dir = '/home/spack/opt/spack', '/opt/spack'
+    script = tmpdir.join('script.sh')
+    script.write('#!/home/spack/opt/spack/bin/sh\n'
+                 'export PATH=/home/spack/opt/spack/bin:/home/spack/bin\n')
+    script.chmod(0o555)
+    untouched = tmpdir.join('untouched.txt')
+    untouched.write('/usr/local/bin\n')
+    untouched.setmtime(0)
+    paths = [str(script), str(untouched), str(tmpdir.join('missing'))]
+
+    # both prefixes are replaced in one pass, longest first
+    prefixes = [('/home/spack', '/home/user'), (old_dir, new_dir)]
+    report = relocate_text_files(paths, prefixes, dry_run=True)
+    assert report == {str(script): 3}
+    assert old_dir in script.read()
+
+    assert relocate_text_files(paths, prefixes) == report
+    assert script.read() == (
+        '#!/opt/spack/bin/sh\n'
+        'export PATH=/opt/spack/bin:/home/user/bin\n')
+    assert script.stat().mode & 0o777 == 0o555
+    assert untouched.mtime() == 0
+
+
 def test_needs_relocation():
     binary_type = (
         'ELF 64-bit LSB executable, x86-64, version 1 (SYSV),'
@@ -377,3 +482,276 @@ def test_relocate_macho(tmpdir):
             'libncurses.5.4.dylib',
             rpaths, deps, idpath,
             nrpaths, ndeps, nid)
+
+
+def test_remote_index_ttl(tmpdir, mutable_config, monkeypatch):
+    """Remote indexes are used for a while, then checked conditionally."""
+    index = {'index_version': bindist.index_version, 'specs': {}}
+    data = BytesIO()
+    with closing(gzip.GzipFile(fileobj=data, mode='wb')) as f:
+        f.write(json.dumps(index).encode('utf-8'))
+
+    class MockResponse(object):
+        headers = {'ETag': '"abc"'}
+
+        def read(self):
+            return data.getvalue()
+
+    requests = []
+
+    def read_from_url(url, headers=None):
+        requests.append(headers)
+        if headers.get('If-None-Match') == '"abc"':
+            raise HTTPError(url, 304, 'Not Modified', {}, None)
+        return MockResponse()
+
+    monkeypatch.setattr(bindist, 'read_from_url', read_from_url)
+    monkeypatch.setattr(spack.caches, 'misc_cache',
+                        FileCache(str(tmpdir.join('cache'))))
+
+    url = 'https://mirror.example.com'
+    assert bindist._mirror_index(url) == index
+    assert bindist._mirror_index(url) == index
+    assert requests == [{}]
+
+    spack.config.set('config:binary_index_ttl', 0)
+    assert bindist._mirror_index(url) == index
+    assert requests == [{}, {'If-None-Match': '"abc"'}]
+
+
+@pytest.mark.usefixtures('install_mockery')
+def test_buildcache_check(monkeypatch):
+    """`spack buildcache check` tells which nodes have binaries."""
+    spec = Spec('libdwarf')
+    spec.concretize()
+    monkeypatch.setattr(bindist, '_binary_index', {
+        spec['libelf'].dag_hash(): {'mirror': 'file:///mirror'}})
+
+    out = SpackCommand('buildcache')('check', 'libdwarf')
+    assert re.search(r'fetch\s+%s\s+libelf.*file:///mirror' %
+                     spec['libelf'].dag_hash(7), out)
+    assert re.search(r'build\s+%s\s+libdwarf' % spec.dag_hash(7), out)
+
+
+@pytest.mark.disable_clean_stage_check
+@pytest.mark.usefixtures('install_mockery')
+def test_install_from_cache(tmpdir, monkeypatch):
+    """Binaries are installed after their dependencies, and the ones
+    that depend on a package that failed are skipped."""
+    spec = Spec('mpileaks')
+    spec.concretize()
+    monkeypatch.setattr(bindist, '_binary_index', dict(
+        (s.dag_hash(), {'mirror': 'file:///mirror'})
+        for s in spec.traverse() if s.name != 'callpath'))
+
+    def fetch_and_verify(spec, stage_path, unsigned):
+        return str(tmpdir.join(spec.name)), None
+
+    installed = []
+
+    def install_verified(spec, verified, allow_root, force, dry_run):
+        for dep in spec.dependencies(deptype=('link', 'run')):
+            assert dep.name in installed
+        spack.store.layout.create_install_directory(spec)
+        installed.append(spec.name)
+
+    monkeypatch.setattr(bindist, '_fetch_and_verify', fetch_and_verify)
+    monkeypatch.setattr(bindist, '_install_verified', install_verified)
+
+    spack.config.set('mirrors', {'test': 'file:///mirror'})
+    with pytest.raises(spack.installer.DagInstallError) as e:
+        bindist.install_from_cache([spec], jobs=4)
+
+    assert [s.name for s in e.value.failed] == ['callpath']
+    assert [s.name for s in e.value.skipped] == ['mpileaks']
+    assert sorted(installed) == ['dyninst', 'libdwarf', 'libelf', 'mpich']
+    assert spack.store.db.query_one('libdwarf', installed=True)
+
+
+@pytest.mark.disable_clean_stage_check
+@pytest.mark.usefixtures('install_mockery')
+def test_install_from_cache_waits_for_other_process(tmpdir, monkeypatch):
+    """A package whose prefix lock is held by another process is not
+    extracted over it, and its dependents wait until it is installed."""
+    spec = Spec('mpileaks')
+    spec.concretize()
+    libelf = spec['libelf']
+    monkeypatch.setattr(bindist, '_binary_index', dict(
+        (s.dag_hash(), {'mirror': 'file:///mirror'})
+        for s in spec.traverse()))
+    monkeypatch.setattr(bindist, 'busy_interval', 0.05)
+
+    def fetch_and_verify(spec, stage_path, unsigned):
+        return str(tmpdir.join(spec.name)), None
+
+    installed = []
+
+    def install_verified(spec, verified, allow_root, force, dry_run):
+        for dep in spec.dependencies(deptype=('link', 'run')):
+            with spack.store.db.read_transaction():
+                assert dep.package.installed
+        spack.store.layout.create_install_directory(spec)
+        installed.append(spec.name)
+
+    monkeypatch.setattr(bindist, '_fetch_and_verify', fetch_and_verify)
+    monkeypatch.setattr(bindist, '_install_verified', install_verified)
+
+    started, release = multiprocessing.Event(), multiprocessing.Event()
+
+    def other_spack():
+        with spack.store.db.prefix_write_lock(libelf):
+            started.set()
+            release.wait(10)
+            spack.store.layout.create_install_directory(libelf)
+            spack.store.db.add(libelf, spack.store.layout)
+
+    other = multiprocessing.Process(target=other_spack)
+    other.start()
+    started.wait(10)
+
+    # let the other process finish once it was found busy
+    original_msg = bindist.tty.msg
+
+    def msg(message, *args):
+        if 'being installed by another process' in message:
+            release.set()
+        original_msg(message, *args)
+
+    monkeypatch.setattr(bindist.tty, 'msg', msg)
+
+    spack.config.set('mirrors', {'test': 'file:///mirror'})
+    result = bindist.install_from_cache([spec], jobs=4)
+    other.join()
+
+    assert 'libelf' not in installed
+    assert libelf not in result
+    assert 'libdwarf' in installed
+    with spack.store.db.read_transaction():
+        for s in spec.traverse(deptype=('link', 'run')):
+            assert s.package.installed
+
+
+@pytest.mark.parametrize('compressor', [None, 'gzip'])
+def test_write_prefix_member(tmpdir, monkeypatch, compressor):
+    """The prefix is streamed into the .spack file, relocation information
+    first, along with the checksum of the compressed tarball."""
+    if compressor and not which(compressor):
+        pytest.skip('%s is not installed' % compressor)
+    monkeypatch.setattr(bindist, '_gzip_command',
+                        lambda: compressor and which(compressor))
+
+    prefix = tmpdir.mkdir('src').mkdir('pkg-1.0-abcdef')
+    prefix.ensure('bin', 'tool').write('#!/bin/sh\n')
+    prefix.ensure('lib', 'libfoo.so').write('original')
+    workdir = tmpdir.mkdir('work').mkdir('pkg-1.0-abcdef')
+    workdir.ensure('.spack', 'binary_distribution').write('buildinfo')
+    workdir.ensure('lib', 'libfoo.so').write('rewritten')
+
+    spackfile = BytesIO()
+    checksum = bindist._write_prefix_member(
+        spackfile, 'pkg.tar.gz', str(prefix), str(workdir))
+    spackfile.seek(0)
+    with closing(tarfile.open(fileobj=spackfile, mode='r')) as tar:
+        data = tar.extractfile('pkg.tar.gz').read()
+    assert hashlib.sha256(data).hexdigest() == checksum
+
+    with closing(tarfile.open(fileobj=BytesIO(data), mode='r:gz')) as tar:
+        names = tar.getnames()
+        assert names[:2] == ['pkg-1.0-abcdef',
+                             'pkg-1.0-abcdef/.spack/binary_distribution']
+        assert 'pkg-1.0-abcdef/bin/tool' in names
+        libfoo = tar.extractfile('pkg-1.0-abcdef/lib/libfoo.so')
+        assert libfoo.read() == b'rewritten'
+
+
+@pytest.mark.usefixtures('install_mockery')
+def test_extract_old_format_tarball(tmpdir):
+    """Tarballs with the relocation information anywhere, as written by
+    older versions of Spack, are relocated after extraction."""
+    spec = Spec('trivial-install-test-package')
+    spec.concretize()
+    old_root = '/old/spack/opt'
+    name = os.path.basename(spec.prefix)
+    relative_prefix = os.path.relpath(spec.prefix, spack.store.layout.root)
+
+    src = tmpdir.mkdir('src').mkdir(name)
+    src.ensure('bin', 'script').write('#!%s/bin/sh\n' % old_root)
+    src.ensure('.spack', 'binary_distribution').write(yaml.dump({
+        'buildpath': old_root,
+        'relative_rpaths': False,
+        'relocate_textfiles': ['bin/script'],
+        'relocate_binaries': []}))
+
+    tarfile_path = str(tmpdir.join(bindist.tarball_name(spec, '.tar.gz')))
+    with closing(tarfile.open(tarfile_path, 'w:gz')) as tar:
+        tar.add(str(src.join('bin')), arcname=name + '/bin')
+        tar.add(str(src.join('.spack')), arcname=name + '/.spack')
+    specfile_path = str(tmpdir.join(bindist.tarball_name(spec, '.spec.yaml')))
+    with open(specfile_path, 'w') as f:
+        f.write(yaml.dump({
+            'binary_cache_checksum': {
+                'hash_algorithm': 'sha256',
+                'hash': bindist.checksum_tarball(tarfile_path)},
+            'buildinfo': {'relative_prefix': relative_prefix}}))
+    spackfile_path = str(tmpdir.join(bindist.tarball_name(spec, '.spack')))
+    with closing(tarfile.open(spackfile_path, 'w')) as tar:
+        tar.add(tarfile_path, arcname=os.path.basename(tarfile_path))
+        tar.add(specfile_path, arcname=os.path.basename(specfile_path))
+
+    bindist._install_verified_tarball(spec, spackfile_path, dry_run=True)
+    assert not os.path.exists(spec.prefix)
+
+    bindist.extract_tarball(spec, spackfile_path, unsigned=True)
+    with open(os.path.join(spec.prefix, 'bin', 'script')) as f:
+        assert f.read() == '#!%s/bin/sh\n' % spack.store.layout.root
+
+
+@pytest.mark.disable_clean_stage_check
+@pytest.mark.usefixtures('install_mockery')
+def test_buildcache_dedup(tmpdir, monkeypatch):
+    """Packages created with dedup=True are installed from their manifest
+    and chunks, and rebuilding them stores no new chunks."""
+    spec = Spec('trivial-install-test-package')
+    spec.concretize()
+    spack.store.layout.create_install_directory(spec)
+    prefix = spec.prefix
+    mkdirp(os.path.join(prefix, 'bin'))
+    mkdirp(os.path.join(prefix, 'share'))
+    with open(os.path.join(prefix, 'bin', 'tool'), 'w') as f:
+        f.write('#!/bin/sh\necho %s\n' % prefix)
+    os.chmod(os.path.join(prefix, 'bin', 'tool'), 0o755)
+    with open(os.path.join(prefix, 'share', 'data'), 'w') as f:
+        f.write('data\n' * 1000)
+    os.symlink('data', os.path.join(prefix, 'share', 'link'))
+
+    mirror = tmpdir.join('mirror')
+    blobs = mirror.join('build_cache', bindist.blobs_directory_name)
+    monkeypatch.setattr(spack.util.content_store, 'chunk_size', 1024)
+    bindist.build_tarball(spec, str(mirror), unsigned=True, dedup=True)
+    chunks = set(p.basename for p in blobs.visit() if p.isfile())
+    assert len(chunks) > 1
+    assert not mirror.join('build_cache', bindist.tarball_path_name(
+        spec, '.spack')).exists()
+
+    bindist.build_tarball(spec, str(mirror), force=True, unsigned=True,
+                          dedup=True)
+    assert set(p.basename for p in blobs.visit() if p.isfile()) == chunks
+
+    index = bindist.generate_package_index(str(mirror))
+    entry = index['specs'][spec.dag_hash()]
+    assert entry['spackfile'] is None
+    assert not entry['signed']
+
+    shutil.rmtree(prefix)
+    spack.config.set('mirrors', {'test': 'file://' + str(mirror)})
+    monkeypatch.setattr(bindist, '_binary_index', None)
+    bindist.install_from_cache([spec], unsigned=True)
+
+    with open(os.path.join(prefix, 'bin', 'tool')) as f:
+        assert f.read() == '#!/bin/sh\necho %s\n' % prefix
+    assert os.stat(os.path.join(prefix, 'bin', 'tool')).st_mode & 0o777 == \
+        0o755
+    assert os.readlink(os.path.join(prefix, 'share', 'link')) == 'data'
+    with open(os.path.join(prefix, 'share', 'data')) as f:
+        assert f.read() == 'data\n' * 1000
+    assert spack.store.db.query_one(spec, installed=True)
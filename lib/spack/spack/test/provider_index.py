@@ -37,6 +37,8 @@ Tests assume that mock packages provide this::
                     mpi@:10.0: set([zmpi])},
     'stuff': {stuff: set([externalvirtual])}}
 """
+import json
+
 from six import StringIO
 
 import spack.repo
@@ -56,6 +58,14 @@ def test_yaml_round_trip(mock_packages):
     assert p == q
 
 
+def test_dict_round_trip(mock_packages):
+    p = ProviderIndex(spack.repo.all_package_names())
+
+    q = ProviderIndex.from_dict(json.loads(json.dumps(p.to_dict())))
+
+    assert p == q
+
+
 def test_providers_for_simple(mock_packages):
     p = ProviderIndex(spack.repo.all_package_names())
 
@@ -22,10 +22,20 @@
 # License along with this program; if not, write to the Free Software
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
 ##############################################################################
+import json
+import os
+import shutil
+
 import pytest
 
+import llnl.util.filesystem
+import llnl.util.multiproc
+
+import spack.caches
 import spack.repo
 import spack.paths
+import spack.spec
+import spack.util.file_cache
 
 
 # Unlike the repo_path fixture defined in conftest, this has a test-level
@@ -75,3 +85,262 @@ def test_repo_pkg_with_unknown_namespace(repo_for_test):
 def test_repo_unknown_pkg(repo_for_test):
     with pytest.raises(spack.repo.UnknownPackageError):
         repo_for_test.get('builtin.mock.nonexistentpackage')
+
+
+def test_package_metadata(mock_packages):
+    for name in spack.repo.path.all_package_names():
+        pkg_cls = spack.repo.path.get_pkg_class(name)
+        metadata = spack.repo.path.package_metadata(name)
+
+        assert metadata.name == pkg_cls.name
+        assert metadata.doc == pkg_cls.__doc__
+        assert metadata.tags == list(getattr(pkg_cls, 'tags', []))
+        assert sorted(metadata.versions) == sorted(pkg_cls.versions)
+        assert metadata.provided == pkg_cls.provided
+
+        assert sorted(metadata.variants) == sorted(pkg_cls.variants)
+        for vname, variant in pkg_cls.variants.items():
+            assert metadata.variants[vname]['default'] == variant.default
+
+        assert metadata.dependency_names == sorted(pkg_cls.dependencies)
+        for dname, conditions in pkg_cls.dependencies.items():
+            md_conditions = metadata.dependencies[dname]
+            assert sorted(md_conditions) == sorted(conditions)
+            for when, dep in conditions.items():
+                assert md_conditions[when].spec == dep.spec
+                assert md_conditions[when].type == dep.type
+
+        for deptype in ('build', 'link', 'run', 'test'):
+            assert metadata.dependencies_of_type(deptype) == set(
+                dname for dname, conditions in pkg_cls.dependencies.items()
+                if any(deptype in dep.type for dep in conditions.values()))
+
+
+def test_package_metadata_unknown_pkg(mock_packages):
+    with pytest.raises(spack.repo.UnknownPackageError):
+        spack.repo.path.package_metadata('nonexistentpackage')
+
+
+_metadata_test_package = '''\
+from spack import *
+
+
+class {0}(Package):
+    """Package for metadata index tests."""
+    homepage = "http://www.example.com"
+    url = "http://www.example.com/foo-1.0.tar.gz"
+
+    version('{1}', '0123456789abcdef0123456789abcdef')
+
+    depends_on('bar', when='@1.0:')
+'''
+
+
+def test_metadata_index_cache(tmpdir, monkeypatch, extra_repo):
+    monkeypatch.setattr(spack.caches, 'misc_cache',
+                        spack.util.file_cache.FileCache(str(tmpdir)))
+    packages_path = extra_repo.packages_path
+
+    def write_package(name, version, mtime):
+        filename = os.path.join(packages_path, name, 'package.py')
+        llnl.util.filesystem.mkdirp(os.path.dirname(filename))
+        with open(filename, 'w') as f:
+            f.write(_metadata_test_package.format(
+                name.capitalize(), version))
+        os.utime(filename, (mtime, mtime))
+        spack.repo.FastPackageChecker._paths_cache.pop(packages_path, None)
+
+    def index():
+        repo = spack.repo.Repo(extra_repo.root)
+        with spack.repo.swap(spack.repo.RepoPath(repo)):
+            return spack.repo.RepoIndex(
+                packages_path, 'extra_test_repo')['metadata']
+
+    write_package('foo', '1.0', 1000)
+    write_package('foo2', '1.0', 1000)
+    assert sorted(index()) == ['foo', 'foo2']
+    assert list(index()['foo'].versions) == [spack.spec.Version('1.0')]
+    assert index()['foo'].dependency_names == ['bar']
+
+    # unchanged packages are not read again
+    def fail(*args):
+        raise AssertionError('package was imported')
+
+    get_pkg_class = spack.repo.Repo.get_pkg_class
+    monkeypatch.setattr(spack.repo.Repo, 'get_pkg_class', fail)
+    assert sorted(index()) == ['foo', 'foo2']
+    monkeypatch.setattr(spack.repo.Repo, 'get_pkg_class', get_pkg_class)
+
+    # changed packages are read again, and removed ones dropped
+    write_package('foo', '2.0', 2000)
+    shutil.rmtree(os.path.join(packages_path, 'foo2'))
+    spack.repo.FastPackageChecker._paths_cache.pop(packages_path, None)
+    assert sorted(index()) == ['foo']
+    assert list(index()['foo'].versions) == [spack.spec.Version('2.0')]
+
+
+def test_possible_dependents(mock_packages):
+    # dependents computed from the package classes, expanding virtuals
+    expected = {}
+    for pkg in spack.repo.path.all_packages():
+        for dep in pkg.dependencies:
+            deps = [dep]
+            if spack.repo.path.is_virtual(dep):
+                deps += [s.name for s in spack.repo.path.providers_for(dep)]
+            for d in deps:
+                expected.setdefault(d, set()).add(pkg.name)
+
+    for name in set(expected) | set(spack.repo.path.all_package_names()):
+        assert spack.repo.path.possible_dependents(name) == \
+            expected.get(name, set()) - set([name])
+
+    assert 'mpileaks' in spack.repo.path.possible_dependents('mpich')
+    assert spack.repo.path.possible_dependents('libelf', transitive=True) == \
+        set(['callpath', 'dyninst', 'libdwarf', 'mpileaks',
+             'multivalue_variant', 'singlevalue-variant-dependent',
+             'patch-a-dependency', 'patch-several-dependencies'])
+
+
+def test_dependents_index_cache(tmpdir, monkeypatch, extra_repo):
+    monkeypatch.setattr(spack.caches, 'misc_cache',
+                        spack.util.file_cache.FileCache(str(tmpdir)))
+    packages_path = extra_repo.packages_path
+
+    def write_package(name, dependency):
+        filename = os.path.join(packages_path, name, 'package.py')
+        llnl.util.filesystem.mkdirp(os.path.dirname(filename))
+        with open(filename, 'w') as f:
+            f.write(_metadata_test_package.format(name.capitalize(), '1.0')
+                    .replace("'bar'", repr(dependency)))
+        spack.repo.FastPackageChecker._paths_cache.pop(packages_path, None)
+
+    def index():
+        repo = spack.repo.Repo(extra_repo.root)
+        with spack.repo.swap(spack.repo.RepoPath(repo)):
+            return spack.repo.RepoIndex(
+                packages_path, 'extra_test_repo')['dependents']
+
+    write_package('foo', 'zlib')
+    write_package('foo2', 'zlib')
+    assert index()['zlib'] == set(['foo', 'foo2'])
+
+    # packages changed since the index was written are read again
+    write_package('foo2', 'bzip2')
+    filename = os.path.join(packages_path, 'foo2', 'package.py')
+    os.utime(filename, (1000, 1000))
+    assert index()['zlib'] == set(['foo'])
+    assert index()['bzip2'] == set(['foo2'])
+
+    # deleted packages are removed
+    shutil.rmtree(os.path.join(packages_path, 'foo'))
+    spack.repo.FastPackageChecker._paths_cache.pop(packages_path, None)
+    assert 'zlib' not in index()
+    assert sorted(index().packages) == ['foo2']
+
+
+@pytest.mark.parametrize('pool_threshold,can_fork', [
+    (1, True), (1, False), (100, True)])
+def test_repo_index_update(tmpdir, monkeypatch, extra_repo, pool_threshold,
+                           can_fork):
+    monkeypatch.setattr(spack.caches, 'misc_cache',
+                        spack.util.file_cache.FileCache(str(tmpdir)))
+    if not can_fork:
+        monkeypatch.setattr(llnl.util.multiproc, 'fork_context', lambda: None)
+    monkeypatch.setattr(spack.repo.RepoIndex, 'pool_threshold',
+                        pool_threshold)
+    monkeypatch.setattr(spack.repo.RepoIndex, 'jobs', 2)
+    packages_path = extra_repo.packages_path
+
+    names = ['foo{0}'.format(i) for i in range(4)]
+    for name in names:
+        filename = os.path.join(packages_path, name, 'package.py')
+        llnl.util.filesystem.mkdirp(os.path.dirname(filename))
+        with open(filename, 'w') as f:
+            f.write(_metadata_test_package.format(name.capitalize(), '1.0')
+                    .replace("depends_on('bar'",
+                             "provides('stuff')\n    depends_on('bar'"))
+    spack.repo.FastPackageChecker._paths_cache.pop(packages_path, None)
+
+    repo = spack.repo.Repo(extra_repo.root)
+    with spack.repo.swap(spack.repo.RepoPath(repo)):
+        index = spack.repo.RepoIndex(packages_path, 'extra_test_repo')
+        assert sorted(index['metadata']) == names
+        assert index['dependents']['bar'] == set(names)
+        assert sorted(s.name for s in
+                      index['providers'].providers_for('stuff')) == names
+
+    # all the indexes were written, with the times of the package files
+    for name in ('metadata', 'providers', 'tags', 'dependents'):
+        filename = os.path.join(
+            str(tmpdir), name, 'extra_test_repo-index.json')
+        with open(filename) as f:
+            assert sorted(json.load(f)['stamps']) == names
+
+    # deleted packages are removed from every index
+    shutil.rmtree(os.path.join(packages_path, 'foo0'))
+    spack.repo.FastPackageChecker._paths_cache.pop(packages_path, None)
+    index = spack.repo.RepoIndex(packages_path, 'extra_test_repo')
+    assert sorted(s.name for s in
+                  index['providers'].providers_for('stuff')) == names[1:]
+    assert sorted(index['metadata']) == names[1:]
+
+    # when an index needs an update, the others are only read
+    os.remove(os.path.join(str(tmpdir), 'tags', 'extra_test_repo-index.json'))
+    written = []
+    write_transaction = spack.caches.misc_cache.write_transaction
+
+    def record_write(key):
+        written.append(key)
+        return write_transaction(key)
+
+    monkeypatch.setattr(
+        spack.caches.misc_cache, 'write_transaction', record_write)
+    index = spack.repo.RepoIndex(packages_path, 'extra_test_repo')
+    assert sorted(index['tags']) == []
+    assert written == ['tags/extra_test_repo-index.json']
+    assert sorted(index['metadata']) == names[1:]
+
+
+def test_repo_index_digests(tmpdir, monkeypatch, extra_repo):
+    monkeypatch.setattr(spack.caches, 'misc_cache',
+                        spack.util.file_cache.FileCache(str(tmpdir)))
+    packages_path = extra_repo.packages_path
+    filename = os.path.join(packages_path, 'foo', 'package.py')
+
+    def write_package(version, mtime):
+        llnl.util.filesystem.mkdirp(os.path.dirname(filename))
+        with open(filename, 'w') as f:
+            f.write(_metadata_test_package.format('Foo', version))
+        os.utime(filename, (mtime, mtime))
+        spack.repo.FastPackageChecker._paths_cache.pop(packages_path, None)
+
+    def index():
+        repo = spack.repo.Repo(extra_repo.root)
+        with spack.repo.swap(spack.repo.RepoPath(repo)):
+            return spack.repo.RepoIndex(
+                packages_path, 'extra_test_repo', digests=True)['metadata']
+
+    def stamp():
+        index_file = os.path.join(
+            str(tmpdir), 'metadata', 'extra_test_repo-index.json')
+        with open(index_file) as f:
+            return json.load(f)['stamps']['foo']
+
+    write_package('1.0', 1000)
+    assert list(index()['foo'].versions) == [spack.spec.Version('1.0')]
+    assert stamp()[0] == 1000
+
+    # touching the file only stamps it again
+    def fail(*args):
+        raise AssertionError('package was imported')
+
+    get_pkg_class = spack.repo.Repo.get_pkg_class
+    monkeypatch.setattr(spack.repo.Repo, 'get_pkg_class', fail)
+    write_package('1.0', 2000)
+    assert list(index()['foo'].versions) == [spack.spec.Version('1.0')]
+    assert stamp()[0] == 2000
+    monkeypatch.setattr(spack.repo.Repo, 'get_pkg_class', get_pkg_class)
+
+    # changed contents are read again, even with an older modification time
+    write_package('2.0', 1500)
+    assert list(index()['foo'].versions) == [spack.spec.Version('2.0')]
@@ -108,3 +108,37 @@ def test_yaml_aliases():
 
     # ensure no YAML aliases appear in syaml dumps.
     assert '*id' not in string
+
+
+@pytest.mark.parametrize('data', [
+    syaml.syaml_dict([('zlib', syaml.syaml_dict([
+        ('version', '1.2.11'), ('namespace', 'builtin')]))]),
+    # scalars that need quoting, or that look like other types
+    ['1.0', '1.2.3', '07', '1e3', '0x1f', '.inf', '2:3', 'yes', 'Yes', 'on',
+     'null', '~', '', '*', '@x', '%gcc', '!x', ':x', '?', '- x', '[x]',
+     'x: y', 'a,b', 'a #b', 'a#b', "it's", '-g -O3', '/path/to', 'a\tb',
+     u'caf\xe9', True, False, None, 0, 42, 2 ** 70, 'n', 'NULL', 'OFF',
+     'x' * 200],
+    {'x' * 100: 0, 'y' * 101: 0, 'z' * 200: 0},
+    {'path': '/usr', 'module': False, 'x: y': ['1.0', {}], '': []},
+    syaml.syaml_dict([('b', {'z': 1, 'a': [[]]}), ('a', syaml.syaml_dict())]),
+    # emitted over several lines, or not a collection: left to dump()
+    {'key': 'two\nlines'},
+    [('a', 'tuple')],
+    'scalar',
+])
+def test_dump_flow(data):
+    expected = syaml.dump(
+        data, default_flow_style=True, width=syaml.flow_width)
+    assert syaml.dump_flow(data) == expected
+
+
+def test_dump_flow_plain_scalars_are_not_memoized():
+    syaml._flow_scalars.clear()
+    syaml.dump_flow({'hash': 'abcdefghijklmnopqrstuvwxyz234567',
+                     'prefix': '/usr/local/x', 'version': 'develop',
+                     'debug': False, 'jobs': 16, 'none': None})
+    assert len(syaml._flow_scalars) == 0
+
+    syaml.dump_flow(['1.0', 'yes'])
+    assert len(syaml._flow_scalars) == 2
@@ -22,12 +22,16 @@
 # License along with this program; if not, write to the Free Software
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
 ##############################################################################
+import re
+
 import pytest
 import shlex
 
+import spack.paths
+import spack.repo
 import spack.store
 import spack.spec as sp
-from spack.parse import Token
+from spack.parse import Token, LexError
 from spack.spec import Spec, parse, parse_anonymous_spec
 from spack.spec import SpecParseError, RedundantSpecError
 from spack.spec import AmbiguousHashError, InvalidHashError, NoSuchHashError
@@ -566,3 +570,78 @@ def test_parse_anonymous_specs(spec, anon_spec, spec_name):
 
     assert len(expected) == 1
     assert spec in expected
+
+
+def test_parse_cache_returns_copies():
+    """Strings parsed more than once are copied from the parse cache, and
+    changing a spec does not change the next ones parsed from it."""
+    string = 'mpileaks@2.3+debug ^callpath@1.0'
+    sp._parse_cache.clear()
+    first = Spec(string)
+    second = Spec(string)
+    assert isinstance(sp._parse_cache.get(string), Spec)
+
+    second.versions = sp.VersionList(['1.0'])
+    second['callpath'].variants['debug'] = sp.BoolValuedVariant('debug', True)
+    third = Spec(string)
+    assert third is not first
+    assert third == first
+    assert str(third) == string
+    assert third['callpath'] is not first['callpath']
+    assert third['callpath'].variants.spec is third['callpath']
+
+
+def test_parse_cache_skips_changing_results():
+    """Specs by hash and with an architecture are parsed every time."""
+    sp._parse_cache.clear()
+    for string in ('libelf arch=test-debian6-x86_64', 'libelf target=fe'):
+        Spec(string)
+        Spec(string)
+        assert sp._parse_cache.get(string) is None
+
+
+def test_lex_error_position():
+    with pytest.raises(LexError) as e:
+        sp.SpecLexer().lex(['mpileaks@1.2', 'foo$bar'])
+    assert e.value.string == 'foo$bar'
+    assert e.value.pos == 3
+
+
+#: Directives and keyword arguments whose values are spec strings
+_directive_re = re.compile(
+    r'\b(?:depends_on|conflicts|provides|extends|when)\s*[(=]\s*'
+    r'(?P<quote>[\'"])(?P<spec>[^\'"]+)(?P=quote)')
+
+
+@pytest.mark.maybeslow
+def test_parse_builtin_directive_strings():
+    """Parse the spec strings in the directives of all builtin packages,
+    as when they are imported, and check that specs from the parse cache
+    equal freshly parsed ones."""
+    repo = spack.repo.Repo(spack.paths.packages_path)
+    strings = []
+    for name in repo.all_package_names():
+        with open(repo.filename_for_package_name(name)) as f:
+            for match in _directive_re.finditer(f.read()):
+                strings.append(match.group('spec'))
+
+    def parse_all():
+        specs = []
+        for string in strings:
+            try:
+                specs.append(Spec(string))
+            except Exception:
+                specs.append(None)
+        return specs
+
+    sp._parse_cache.clear()
+    cold_specs = parse_all()
+    warm_specs = parse_all()
+
+    for string, cold_spec, warm_spec in zip(strings, cold_specs, warm_specs):
+        if cold_spec is None:
+            assert warm_spec is None
+            continue
+        fresh = parse(string)[0]
+        assert warm_spec == fresh, string
+        assert str(warm_spec) == str(fresh), string
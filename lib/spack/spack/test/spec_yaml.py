@@ -29,10 +29,14 @@ YAML format preserves DAG information in the spec.
 """
 from collections import Iterable, Mapping
 
+import pytest
+
+import spack.repo
 import spack.util.spack_json as sjson
 import spack.util.spack_yaml as syaml
 from spack.spec import Spec
 from spack.util.spack_yaml import syaml_dict
+from spack.version import VersionList
 
 
 def check_yaml_round_trip(spec):
@@ -207,6 +211,43 @@ def test_ordered_read_not_required_for_consistent_dag_hash(
         assert spec.full_hash() == round_trip_reversed_json_spec.full_hash()
 
 
+def check_dump_flow(spec):
+    """Check that the nodes of a spec are dumped for hashing like the
+    YAML emitter would do."""
+    for node in spec.traverse():
+        node_dict = node.to_node_dict()
+        assert syaml.dump_flow(node_dict) == syaml.dump(
+            node_dict, default_flow_style=True, width=syaml.flow_width)
+
+
+def test_hashed_nodes_dump_like_yaml(database, mock_packages):
+    for spec in database.query(installed=any):
+        check_dump_flow(spec)
+
+    for name in spack.repo.all_package_names():
+        spec = Spec(name)
+        check_dump_flow(spec)
+        try:
+            spec.concretize()
+        except Exception:
+            # some mock packages are meant not to concretize
+            continue
+        check_dump_flow(spec)
+
+
+@pytest.mark.maybeslow
+def test_builtin_nodes_dump_like_yaml():
+    for name in spack.repo.all_package_names():
+        pkg = spack.repo.get(name)
+        variants = [v.make_default() for v in pkg.variants.values()]
+        for version in pkg.versions:
+            spec = Spec(name)
+            spec.versions = VersionList([version])
+            for variant in variants:
+                spec.variants[variant.name] = variant
+            check_dump_flow(spec)
+
+
 def reverse_all_dicts(data):
     """Descend into data and reverse all the dictionaries"""
     if isinstance(data, dict):
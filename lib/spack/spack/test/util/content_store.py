@@ -0,0 +1,80 @@
+##############################################################################
+# Copyright (c) 2013-2018, Lawrence Livermore National Security, LLC.
+# Produced at the Lawrence Livermore National Laboratory.
+#
+# This file is part of Spack.
+# Created by Todd Gamblin, tgamblin@llnl.gov, All rights reserved.
+# LLNL-CODE-647188
+#
+# For details, see https://github.com/spack/spack
+# Please also see the NOTICE and LICENSE files for our notice and the LGPL.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License (as
+# published by the Free Software Foundation) version 2.1, February 1999.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the IMPLIED WARRANTY OF
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the terms and
+# conditions of the GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+##############################################################################
+"""Tests for the content-addressed store of build caches."""
+import pytest
+
+import spack.util.content_store as content_store
+from spack.util.content_store import LocalContentStore, ContentStoreError
+
+
+@pytest.fixture()
+def store(tmpdir):
+    return LocalContentStore(str(tmpdir.join('store')))
+
+
+def test_add_and_write_file(tmpdir, store, monkeypatch):
+    """Files are split into chunks, and equal chunks are stored once."""
+    monkeypatch.setattr(content_store, 'chunk_size', 4)
+    source = tmpdir.join('source')
+    source.write('abcdabcdxy')
+
+    checksums = content_store.add_file(store, str(source))
+    assert len(checksums) == 3
+    assert checksums[0] == checksums[1]
+    assert len([p for p in tmpdir.join('store').visit() if p.isfile()]) == 2
+
+    dest = tmpdir.join('dest')
+    content_store.write_file(store, checksums, str(dest))
+    assert dest.read() == 'abcdabcdxy'
+
+    empty = tmpdir.join('empty')
+    empty.write('')
+    assert content_store.add_file(store, str(empty)) == []
+
+
+def test_copy_chunks(tmpdir, store):
+    """Chunks are copied from a store at a URL once, and checked."""
+    source = tmpdir.join('source')
+    source.write('content')
+    remote = LocalContentStore(str(tmpdir.join('remote')))
+    checksums = content_store.add_file(remote, str(source))
+
+    url_store = content_store.store_for_url(
+        'http://example.com/build_cache/blobs')
+    assert isinstance(url_store, content_store.URLContentStore)
+    with pytest.raises(ContentStoreError):
+        url_store.write(checksums[0], b'')
+
+    remote_url = content_store.URLContentStore('file://' + remote.root)
+    assert content_store.copy_chunks(remote_url, store, checksums) > 0
+    assert store.contains(checksums[0])
+    assert content_store.copy_chunks(remote_url, store, checksums) == 0
+
+    tmpdir.join('remote', remote.chunk_path(checksums[0])).write(
+        content_store.compress(b'tampered'), mode='wb')
+    other = LocalContentStore(str(tmpdir.join('other')))
+    with pytest.raises(ContentStoreError):
+        content_store.copy_chunks(remote, other, checksums)
+    assert not other.contains(checksums[0])
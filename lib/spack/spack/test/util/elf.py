@@ -0,0 +1,93 @@
+##############################################################################
+# Copyright (c) 2013-2018, Lawrence Livermore National Security, LLC.
+# Produced at the Lawrence Livermore National Laboratory.
+#
+# This file is part of Spack.
+# Created by Todd Gamblin, tgamblin@llnl.gov, All rights reserved.
+# LLNL-CODE-647188
+#
+# For details, see https://github.com/spack/spack
+# Please also see the NOTICE and LICENSE files for our notice and the LGPL.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License (as
+# published by the Free Software Foundation) version 2.1, February 1999.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the IMPLIED WARRANTY OF
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the terms and
+# conditions of the GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+##############################################################################
+"""Test reading and rewriting RPATHs of ELF files."""
+import os
+
+import pytest
+
+import spack.paths
+import spack.util.elf as elf
+from spack.relocate import classify_file
+from spack.util.executable import which
+
+
+@pytest.fixture()
+def binary_with_rpath(tmpdir):
+    """Returns a function that compiles a small executable with the
+    given RPATH, as DT_RUNPATH or DT_RPATH."""
+    # run the system compiler and linker, not Spack's wrappers, which
+    # other tests may have put in PATH
+    path = [d for d in os.environ.get('PATH', '').split(os.pathsep)
+            if not d.startswith(spack.paths.build_env_path)]
+    cc = which('cc', 'gcc', path=path)
+    if not cc:
+        pytest.skip('no C compiler to build ELF files with')
+    source = tmpdir.join('main.c')
+    source.write('int main() { return 0; }\n')
+
+    def _build(rpath, runpath=True):
+        output = str(tmpdir.join('main'))
+        dtags = '--enable-new-dtags' if runpath else '--disable-new-dtags'
+        cc('-o', output, str(source),
+           '-Wl,-rpath,{0}'.format(rpath), '-Wl,{0}'.format(dtags),
+           env={'PATH': os.pathsep.join(path)})
+        return output
+
+    return _build
+
+
+def test_get_rpath(binary_with_rpath):
+    path = binary_with_rpath('/spack/opt/lib:/usr/lib', runpath=False)
+    with open(path, 'rb') as f:
+        parsed = elf.parse_elf(f)
+    assert parsed.rpath == '/spack/opt/lib:/usr/lib'
+    assert parsed.rpath_tag == elf.DT_RPATH
+    assert 'ELF' in classify_file(path)
+
+
+def test_replace_rpath(binary_with_rpath):
+    path = binary_with_rpath('/spack/opt/lib:/usr/lib')
+
+    # Shorter RPATHs are written in place, turning RUNPATH into RPATH
+    assert elf.replace_rpath(path, '/new/lib')
+    with open(path, 'rb') as f:
+        parsed = elf.parse_elf(f)
+    assert parsed.rpath == '/new/lib'
+    assert parsed.rpath_tag == elf.DT_RPATH
+
+    # Longer ones need patchelf
+    assert not elf.replace_rpath(path, '/a/much/longer/path/than/before/lib')
+    assert elf.get_rpath(path) == '/new/lib'
+
+
+def test_not_elf(tmpdir):
+    path = tmpdir.join('script.sh')
+    path.write('#!/bin/sh\necho hello\n')
+    with pytest.raises(elf.ElfParsingError):
+        elf.get_rpath(str(path))
+    assert classify_file(str(path)) == 'script, text executable'
+
+    path.write_binary(b'\x00\x01\x02')
+    assert classify_file(str(path)) == 'data'
@@ -26,9 +26,15 @@
 We try to maintain compatibility with RPM's version semantics
 where it makes sense.
 """
+import copy
+import pickle
+import re
+
 import pytest
 
-from spack.version import Version, ver
+import spack.paths
+import spack.repo
+from spack.version import Version, VersionList, ver
 
 
 def assert_ver_lt(a, b):
@@ -518,3 +524,52 @@ def test_get_item():
     # Raise TypeError on tuples
     with pytest.raises(TypeError):
         b.__getitem__(1, 2)
+
+
+def test_versions_are_interned():
+    assert Version('1.2.3') is Version('1.2.3')
+    assert Version('1.2.3 ') is Version('1.2.3')
+    assert Version('1.2.3')[:2] is Version('1.2')
+    assert ver('1.2:1.4') is ver('1.2:1.4')
+    assert ver(':1.4') is not ver('1.2:1.4')
+
+    # Copies and unpickled versions are the same objects
+    for v in (Version('1.2.3'), ver('1.2:'), ver(':')):
+        assert copy.copy(v) is v
+        assert copy.deepcopy(v) is v
+        assert pickle.loads(pickle.dumps(v, 2)) is v
+
+
+def test_non_numeric_versions_ignore_separators():
+    assert_ver_eq('a.b', 'a-b')
+    assert_ver_lt('branch_a', 'branch-b')
+    assert_ver_lt('branch', '1.0')
+    assert_ver_gt('develop', '1.0')
+
+
+#: Versions declared by packages
+_version_re = re.compile(
+    r'\bversion\(\s*(?P<quote>[\'"])(?P<version>.+?)(?P=quote)')
+
+
+@pytest.mark.maybeslow
+def test_builtin_versions():
+    """Sort the versions declared by all builtin packages and check that
+    comparisons agree with their order."""
+    repo = spack.repo.Repo(spack.paths.packages_path)
+    strings = []
+    for name in repo.all_package_names():
+        with open(repo.filename_for_package_name(name)) as f:
+            for match in _version_re.finditer(f.read()):
+                strings.append(match.group('version'))
+
+    versions = [Version(s) for s in strings]
+    ordered = sorted(versions)
+    vlist = VersionList(versions)
+    for v in versions:
+        assert v in vlist
+
+    for a, b in zip(ordered, ordered[1:]):
+        assert a <= b
+        assert not b < a
+        assert (a == b) == (a.version == b.version)
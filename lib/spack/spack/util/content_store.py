@@ -0,0 +1,217 @@
+##############################################################################
+# Copyright (c) 2013-2018, Lawrence Livermore National Security, LLC.
+# Produced at the Lawrence Livermore National Laboratory.
+#
+# This file is part of Spack.
+# Created by Todd Gamblin, tgamblin@llnl.gov, All rights reserved.
+# LLNL-CODE-647188
+#
+# For details, see https://github.com/spack/spack
+# Please also see the NOTICE and LICENSE files for our notice and the LGPL.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License (as
+# published by the Free Software Foundation) version 2.1, February 1999.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the IMPLIED WARRANTY OF
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the terms and
+# conditions of the GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+##############################################################################
+"""Content-addressed storage of files, for build caches.
+
+Files are split into chunks of at most :data:`chunk_size` bytes, and
+each chunk is stored once, compressed with zlib, under the sha256
+checksum of its uncompressed content::
+
+    <root>/<checksum[0:2]>/<checksum>
+
+A file is then described by the list of the checksums of its chunks.
+Identical files, and identical chunks of large files, are stored and
+transferred only once, however many packages contain them.
+"""
+import hashlib
+import os
+import tempfile
+import zlib
+from contextlib import closing
+
+from six.moves.urllib.error import URLError
+
+from llnl.util.filesystem import mkdirp
+
+from spack.error import SpackError
+from spack.util.web import read_from_url
+
+#: Size of the chunks files are split into
+chunk_size = 1024 * 1024
+
+
+class ContentStore(object):
+    """Base class of content-addressed stores.
+
+    Subclasses implement :meth:`read`, and :meth:`contains` and
+    :meth:`write` if the store can be written to.  Chunks are passed
+    around compressed, as they are stored.
+    """
+
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+
+    def chunk_path(self, checksum):
+        """Path of the chunk with ``checksum``, relative to the store."""
+        return '{0}/{1}'.format(checksum[0:2], checksum)
+
+    def contains(self, checksum):
+        """Whether the store holds the chunk with ``checksum``."""
+        raise NotImplementedError
+
+    def read(self, checksum):
+        """Return the compressed content of the chunk with ``checksum``."""
+        raise NotImplementedError
+
+    def write(self, checksum, data):
+        """Store ``data``, the compressed content of the chunk with
+        ``checksum``."""
+        raise ContentStoreError('Cannot write to {0}'.format(self.url))
+
+    def __repr__(self):
+        return '{0}({1!r})'.format(type(self).__name__, self.url)
+
+
+class LocalContentStore(ContentStore):
+    """Store in a local directory, for instance a ``file://`` mirror."""
+
+    def __init__(self, root):
+        root = os.path.abspath(root)
+        super(LocalContentStore, self).__init__('file://' + root)
+        self.root = root
+
+    def path(self, checksum):
+        return os.path.join(self.root, self.chunk_path(checksum))
+
+    def contains(self, checksum):
+        return os.path.exists(self.path(checksum))
+
+    def read(self, checksum):
+        try:
+            with open(self.path(checksum), 'rb') as f:
+                return f.read()
+        except (IOError, OSError) as e:
+            raise ContentStoreError(
+                'Cannot read chunk {0} from {1}'.format(checksum, self.url),
+                str(e))
+
+    def write(self, checksum, data):
+        # Write to a temporary file first, so that readers never see a
+        # partial chunk, and several threads or processes can store the
+        # same chunk at the same time.
+        path = self.path(checksum)
+        mkdirp(os.path.dirname(path))
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path),
+                                        prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.chmod(tmp_path, 0o644)
+            os.rename(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+class URLContentStore(ContentStore):
+    """Read-only store at a URL, for instance on a remote mirror."""
+
+    def read(self, checksum):
+        url = '{0}/{1}'.format(self.url, self.chunk_path(checksum))
+        try:
+            with closing(read_from_url(url)) as response:
+                return response.read()
+        except (URLError, IOError) as e:
+            raise ContentStoreError(
+                'Cannot fetch chunk {0}'.format(url), str(e))
+
+
+def store_for_url(url):
+    """Return the content store at ``url``, which may be a local path."""
+    if url.startswith('file://'):
+        return LocalContentStore(url[len('file://'):])
+    if '://' not in url:
+        return LocalContentStore(url)
+    return URLContentStore(url)
+
+
+def compress(data):
+    """Compress the content of a chunk, as it is stored."""
+    return zlib.compress(data, 6)
+
+
+def decompress(checksum, data):
+    """Decompress a chunk read from a store, and check that its content
+    has ``checksum``."""
+    try:
+        content = zlib.decompress(data)
+    except zlib.error as e:
+        raise ContentStoreError(
+            'Chunk {0} is corrupted'.format(checksum), str(e))
+    if hashlib.sha256(content).hexdigest() != checksum:
+        raise ContentStoreError(
+            'Chunk {0} failed checksum verification'.format(checksum))
+    return content
+
+
+def add_file(store, path):
+    """Add the content of the file at ``path`` to ``store``.
+
+    Only the chunks that are not in the store yet are compressed and
+    written.
+
+    Returns:
+        list: the checksums of the chunks of the file, in order
+    """
+    checksums = []
+    with open(path, 'rb') as f:
+        data = f.read(chunk_size)
+        while data:
+            checksum = hashlib.sha256(data).hexdigest()
+            if not store.contains(checksum):
+                store.write(checksum, compress(data))
+            checksums.append(checksum)
+            data = f.read(chunk_size)
+    return checksums
+
+
+def copy_chunks(source, dest, checksums):
+    """Copy the chunks with ``checksums`` that ``dest`` does not hold
+    yet from ``source``, checking their content.
+
+    Returns:
+        int: the number of bytes copied
+    """
+    copied = 0
+    for checksum in checksums:
+        if dest.contains(checksum):
+            continue
+        data = source.read(checksum)
+        decompress(checksum, data)
+        dest.write(checksum, data)
+        copied += len(data)
+    return copied
+
+
+def write_file(store, checksums, path):
+    """Write the file made of the chunks with ``checksums`` in ``store``
+    to ``path``, checking their content."""
+    with open(path, 'wb') as f:
+        for checksum in checksums:
+            f.write(decompress(checksum, store.read(checksum)))
+
+
+class ContentStoreError(SpackError):
+    """Raised when a chunk cannot be read, written or verified."""
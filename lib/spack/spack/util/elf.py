@@ -0,0 +1,265 @@
+##############################################################################
+# Copyright (c) 2013-2018, Lawrence Livermore National Security, LLC.
+# Produced at the Lawrence Livermore National Laboratory.
+#
+# This file is part of Spack.
+# Created by Todd Gamblin, tgamblin@llnl.gov, All rights reserved.
+# LLNL-CODE-647188
+#
+# For details, see https://github.com/spack/spack
+# Please also see the NOTICE and LICENSE files for our notice and the LGPL.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License (as
+# published by the Free Software Foundation) version 2.1, February 1999.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the IMPLIED WARRANTY OF
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the terms and
+# conditions of the GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+##############################################################################
+"""Read and rewrite the RPATH of ELF binaries without external tools.
+
+Relocating a binary package used to run ``patchelf`` twice for every
+shared object and executable in it.  This module parses just enough of
+the ELF format to find the ``DT_RPATH`` or ``DT_RUNPATH`` entry of the
+dynamic section and the string it points to, so that the RPATH can be
+read, and overwritten in place when the new one is not longer than the
+old one.  Growing an RPATH means rewriting the string table, which is
+left to ``patchelf``.
+"""
+import struct
+
+import six
+
+from llnl.util.filesystem import writable
+
+from spack.error import SpackError
+
+__all__ = ['ElfParsingError', 'parse_elf', 'get_rpath', 'replace_rpath']
+
+#: Values of ``e_type``, with the words ``file`` uses to describe them
+ET_REL, ET_EXEC, ET_DYN, ET_CORE = 1, 2, 3, 4
+elf_types = {
+    ET_REL: 'relocatable',
+    ET_EXEC: 'executable',
+    ET_DYN: 'shared object',
+    ET_CORE: 'core file',
+}
+
+PT_LOAD, PT_DYNAMIC = 1, 2
+DT_NULL, DT_STRTAB, DT_STRSZ, DT_RPATH, DT_RUNPATH = 0, 5, 10, 15, 29
+
+# struct formats, without the byte order, by ELF class (32 or 64 bit)
+_header = {32: 'HHIIIIIHHHHHH', 64: 'HHIQQQIHHHHHH'}
+_program_header = {32: 'IIIIIIII', 64: 'IIQQQQQQ'}
+_dynamic_entry = {32: 'iI', 64: 'qQ'}
+
+
+class ElfParsingError(SpackError):
+    """Raised when a file is not an ELF file Spack can handle."""
+
+
+class ElfFile(object):
+    """What Spack needs to know about an ELF file.
+
+    Attributes:
+        bits (int): 32 or 64
+        byte_order (str): ``'<'`` or ``'>'``, for ``struct``
+        elf_type (int): the ``e_type`` of the file
+        rpath (str): the RPATH (or RUNPATH) of the file, or ``None``
+        rpath_tag (int): ``DT_RPATH``, ``DT_RUNPATH`` or ``None``
+        rpath_entry_offset (int): offset of the dynamic entry of the
+            RPATH in the file
+        rpath_offset (int): offset of the RPATH string in the file
+        rpath_count (int): number of RPATH and RUNPATH entries
+    """
+
+    def __init__(self, bits, byte_order, elf_type):
+        self.bits = bits
+        self.byte_order = byte_order
+        self.elf_type = elf_type
+        self.rpath = None
+        self.rpath_tag = None
+        self.rpath_entry_offset = None
+        self.rpath_offset = None
+        self.rpath_count = 0
+
+    @property
+    def description(self):
+        """Description in the style of ``file``, e.g. ``ELF 64-bit LSB
+        shared object``."""
+        return 'ELF {0}-bit {1} {2}'.format(
+            self.bits, 'LSB' if self.byte_order == '<' else 'MSB',
+            elf_types.get(self.elf_type, 'unknown type'))
+
+
+def _decode(data):
+    if six.PY2:
+        return data
+    return data.decode('utf-8', 'surrogateescape')
+
+
+def _encode(string):
+    if six.PY2:
+        return string.encode('utf-8') if isinstance(
+            string, six.text_type) else string
+    return string.encode('utf-8', 'surrogateescape')
+
+
+def _unpack(f, fmt, offset):
+    size = struct.calcsize(fmt)
+    f.seek(offset)
+    data = f.read(size)
+    if len(data) != size:
+        raise ElfParsingError('unexpected end of file')
+    return struct.unpack(fmt, data)
+
+
+def _read_string(f, offset, limit):
+    f.seek(offset)
+    data = f.read(limit)
+    end = data.find(b'\0')
+    if end < 0:
+        raise ElfParsingError('unterminated string in string table')
+    return _decode(data[:end])
+
+
+def parse_elf(f, dynamic=True):
+    """Parse the headers of the ELF file open in binary mode as ``f``.
+
+    Args:
+        f (file): the file, open for reading in binary mode
+        dynamic (bool): also read the RPATH from the dynamic section
+
+    Returns:
+        ElfFile: the parsed file
+
+    Raises:
+        ElfParsingError: if ``f`` is not an ELF file, or is truncated
+    """
+    f.seek(0)
+    ident = f.read(16)
+    if len(ident) < 16 or ident[:4] != b'\x7fELF':
+        raise ElfParsingError('not an ELF file')
+
+    ei_class, ei_data = struct.unpack('BB', ident[4:6])
+    bits = {1: 32, 2: 64}.get(ei_class)
+    byte_order = {1: '<', 2: '>'}.get(ei_data)
+    if bits is None or byte_order is None:
+        raise ElfParsingError('unknown ELF class or byte order')
+
+    header = _unpack(f, byte_order + _header[bits], 16)
+    elf = ElfFile(bits, byte_order, header[0])
+    if not dynamic:
+        return elf
+
+    phoff, phentsize, phnum = header[4], header[8], header[9]
+    loads, dynamic_segment = [], None
+    for i in range(phnum):
+        ph = _unpack(f, byte_order + _program_header[bits],
+                     phoff + i * phentsize)
+        if bits == 32:
+            p_type, p_offset, p_vaddr, p_filesz = ph[0], ph[1], ph[2], ph[4]
+        else:
+            p_type, p_offset, p_vaddr, p_filesz = ph[0], ph[2], ph[3], ph[5]
+        if p_type == PT_LOAD:
+            loads.append((p_vaddr, p_offset, p_filesz))
+        elif p_type == PT_DYNAMIC:
+            dynamic_segment = (p_offset, p_filesz)
+
+    if dynamic_segment is None:
+        return elf
+
+    # Read the dynamic section up to DT_NULL
+    entry_format = byte_order + _dynamic_entry[bits]
+    entry_size = struct.calcsize(entry_format)
+    strtab = strsz = None
+    offset, end = dynamic_segment[0], sum(dynamic_segment)
+    while offset + entry_size <= end:
+        tag, value = _unpack(f, entry_format, offset)
+        if tag == DT_NULL:
+            break
+        elif tag == DT_STRTAB:
+            strtab = value
+        elif tag == DT_STRSZ:
+            strsz = value
+        elif tag in (DT_RPATH, DT_RUNPATH):
+            elf.rpath_count += 1
+            # DT_RUNPATH takes precedence, as in the dynamic loader
+            if elf.rpath_tag != DT_RUNPATH:
+                elf.rpath_tag = tag
+                elf.rpath_entry_offset = offset
+                elf.rpath_offset = value
+        offset += entry_size
+
+    if elf.rpath_tag is None:
+        return elf
+    if strtab is None or strsz is None:
+        raise ElfParsingError('dynamic section has no string table')
+
+    # DT_STRTAB is a virtual address: find where it is in the file
+    for vaddr, file_offset, filesz in loads:
+        if vaddr <= strtab < vaddr + filesz:
+            strtab_offset = strtab - vaddr + file_offset
+            break
+    else:
+        raise ElfParsingError('string table is not in a loaded segment')
+
+    if elf.rpath_offset >= strsz:
+        raise ElfParsingError('RPATH is outside of the string table')
+    elf.rpath = _read_string(f, strtab_offset + elf.rpath_offset,
+                             strsz - elf.rpath_offset)
+    elf.rpath_offset += strtab_offset
+    return elf
+
+
+def get_rpath(path):
+    """Return the RPATH (or RUNPATH) of the ELF file at ``path``, or
+    ``None`` if it has none."""
+    with open(path, 'rb') as f:
+        return parse_elf(f).rpath
+
+
+def replace_rpath(path, new_rpath, force_rpath=True):
+    """Overwrite the RPATH of the ELF file at ``path`` in place.
+
+    This works only if the file has an RPATH, and the new one is not
+    longer than the old one; the rest of the old string is zeroed.  Like
+    ``patchelf --force-rpath``, a ``DT_RUNPATH`` entry is turned into a
+    ``DT_RPATH`` one if ``force_rpath`` is set.
+
+    Returns:
+        bool: True if the RPATH was replaced, or was already
+        ``new_rpath``; False if this needs a tool like ``patchelf``
+    """
+    with open(path, 'rb') as f:
+        elf = parse_elf(f)
+
+    if elf.rpath is None:
+        # there is nothing to overwrite; adding an RPATH needs patchelf
+        return not new_rpath
+    if elf.rpath_count > 1:
+        return False
+
+    convert = force_rpath and elf.rpath_tag == DT_RUNPATH
+    if elf.rpath == new_rpath and not convert:
+        return True
+    encoded = _encode(new_rpath)
+    old_length = len(_encode(elf.rpath))
+    if len(encoded) > old_length:
+        return False
+
+    with writable(path):
+        with open(path, 'r+b') as f:
+            f.seek(elf.rpath_offset)
+            f.write(encoded + b'\0' * (old_length - len(encoded)))
+            if convert:
+                f.seek(elf.rpath_entry_offset)
+                f.write(struct.pack(
+                    elf.byte_order + _dynamic_entry[elf.bits][0], DT_RPATH))
+    return True
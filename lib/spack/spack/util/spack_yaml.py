@@ -31,20 +31,24 @@
   default unorderd dict.
 
 """
+import ctypes
+import re
+
 from ordereddict_backport import OrderedDict
-from six import string_types, StringIO
+from six import string_types, integer_types, StringIO
 
 import ruamel.yaml as yaml
 from ruamel.yaml import Loader, Dumper
 from ruamel.yaml.nodes import MappingNode, SequenceNode, ScalarNode
 from ruamel.yaml.constructor import ConstructorError
 
+from llnl.util.lang import LRUCache
 from llnl.util.tty.color import colorize, clen, cextra
 
 import spack.error
 
 # Only export load and dump
-__all__ = ['load', 'dump', 'SpackYAMLError']
+__all__ = ['load', 'dump', 'dump_flow', 'SpackYAMLError']
 
 # Make new classes so we can add custom attributes.
 # Also, use OrderedDict instead of just dict.
@@ -345,6 +349,115 @@ def dump(*args, **kwargs):
         return yaml.dump(*args, **kwargs)
 
 
+#: Line width for flow-style dumps, so that lines never wrap.  This is the
+#: largest C int, to avoid passing too large a value to cyaml.
+flow_width = 2 ** (ctypes.sizeof(ctypes.c_int) * 8 - 1) - 1
+
+#: Scalar types that ``dump_flow()`` emits itself
+_flow_scalar_types = string_types + integer_types + (bool, type(None))
+
+#: Characters that YAML treats as line breaks.  Scalars containing them
+#: are emitted over several lines, indented depending on where they are.
+_line_breaks = ('\n', '\r', u'\x85', u'\u2028', u'\u2029')
+
+#: Strings the emitter writes as they are: they start with a letter or a
+#: slash, and have no indicator characters or whitespace.  Names, versions
+#: after the first character, hashes and prefixes all look like this.
+_plain_str = re.compile(r'^[A-Za-z/][A-Za-z0-9_.+/-]*$')
+
+#: Plain strings that YAML would read back as booleans or null
+_plain_str_exceptions = set([
+    'yes', 'Yes', 'YES', 'no', 'No', 'NO', 'true', 'True', 'TRUE',
+    'false', 'False', 'FALSE', 'on', 'On', 'ON', 'off', 'Off', 'OFF',
+    'null', 'Null', 'NULL'])
+
+#: Longest plain string written directly as a mapping key.  The emitter
+#: writes longer keys as complex (``? key``) keys.
+_plain_key_length = 100
+
+#: Flow-style representation of the other scalars the emitter was asked
+#: for, as mapping keys and as values, keyed by (is_key, type, value).
+#: Bounded, since it sees every such scalar of every spec that is hashed.
+_flow_scalars = LRUCache(4096)
+
+
+class _NotFlowDumpable(Exception):
+    """Raised for data that ``dump_flow()`` does not emit itself."""
+
+
+def _flow_scalar(value, key):
+    # Only native str: unicode strings in Python 2 are tagged by the
+    # emitter.
+    if type(value) is str:
+        if (_plain_str.match(value) and
+                value not in _plain_str_exceptions and
+                not (key and len(value) > _plain_key_length)):
+            return value
+    elif value is None:
+        return 'null'
+    elif type(value) is bool:
+        return 'true' if value else 'false'
+    elif type(value) in integer_types:
+        return str(value)
+
+    memo_key = (key, type(value), value)
+    text = _flow_scalars.get(memo_key)
+    if text is None:
+        if not isinstance(value, _flow_scalar_types) or (
+                isinstance(value, string_types) and
+                any(c in value for c in _line_breaks)):
+            raise _NotFlowDumpable()
+
+        # Let the YAML emitter decide how to quote the scalar, in the
+        # same position it will have in the document.
+        if key:
+            prefix, suffix = '{', ': 0}\n'
+            text = dump({value: 0}, default_flow_style=True, width=flow_width)
+        else:
+            prefix, suffix = '[', ']\n'
+            text = dump([value], default_flow_style=True, width=flow_width)
+
+        if (not text.startswith(prefix) or not text.endswith(suffix) or
+                text.startswith('{? ')):
+            raise _NotFlowDumpable()
+        text = text[len(prefix):-len(suffix)]
+        _flow_scalars[memo_key] = text
+
+    return text
+
+
+def _flow(data):
+    if type(data) in (dict, syaml_dict):
+        items = data.items()
+        if type(data) is dict:
+            items = sorted(items)
+        return '{%s}' % ', '.join(
+            '%s: %s' % (_flow_scalar(k, True), _flow(v)) for k, v in items)
+
+    elif type(data) in (list, syaml_list):
+        return '[%s]' % ', '.join(_flow(v) for v in data)
+
+    return _flow_scalar(data, False)
+
+
+def dump_flow(data):
+    """Return the same text as ``dump(data, default_flow_style=True,
+    width=flow_width)``, without going through the YAML emitter.
+
+    This is meant for data that is dumped very often, like the nodes of
+    specs that are hashed.  Only dicts, lists and the scalars in them are
+    written directly, and how each scalar is quoted is still decided by
+    the emitter, once per distinct scalar.  Anything else is handed over
+    to ``dump()``.
+    """
+    if type(data) in (dict, syaml_dict, list, syaml_list):
+        try:
+            return _flow(data) + '\n'
+        except _NotFlowDumpable:
+            pass
+    return dump(data, default_flow_style=True, width=flow_width)
+
+
 def dump_annotated(data, stream=None, *args, **kwargs):
     kwargs['Dumper'] = LineAnnotationDumper
 
@@ -93,6 +93,41 @@ class NonDaemonPool(multiprocessing.pool.Pool):
     Process = NonDaemonProcess
 
 
+def _ssl_context():
+    """SSL context for requests, according to ``config:verify_ssl``."""
+    context = None
+    verify_ssl = spack.config.get('config:verify_ssl')
+    pyver = sys.version_info
+    if (pyver < (2, 7, 9) or (3,) < pyver < (3, 4, 3)):
+        if verify_ssl:
+            tty.warn("Spack will not check SSL certificates. You need to "
+                     "update your Python to enable certificate "
+                     "verification.")
+    elif verify_ssl:
+        # We explicitly create default context to avoid error described in
+        # https://blog.sucuri.net/2016/03/beware-unverified-tls-certificates-php-python.html
+        context = ssl.create_default_context()
+    else:
+        context = ssl._create_unverified_context()
+    return context
+
+
+def read_from_url(url, headers=None):
+    """Make a GET request for a URL and return the response.
+
+    Args:
+        url (str): URL to read
+        headers (dict): additional request headers, e.g. for a
+            conditional request
+
+    Raises:
+        URLError: if the request fails; this includes HTTP errors, and
+            ``304 Not Modified`` responses to conditional requests.
+    """
+    req = Request(url, headers=headers or {})
+    return _urlopen(req, timeout=_timeout, context=_ssl_context())
+
+
 def _spider(url, visited, root, depth, max_depth, raise_on_error):
     """Fetches URL and any pages it links to up to max_depth.
 
@@ -114,20 +149,7 @@ def _spider(url, visited, root, depth, max_depth, raise_on_error):
         root = re.sub('/index.html$', '', root)
 
     try:
-        context = None
-        verify_ssl = spack.config.get('config:verify_ssl')
-        pyver = sys.version_info
-        if (pyver < (2, 7, 9) or (3,) < pyver < (3, 4, 3)):
-            if verify_ssl:
-                tty.warn("Spack will not check SSL certificates. You need to "
-                         "update your Python to enable certificate "
-                         "verification.")
-        elif verify_ssl:
-            # We explicitly create default context to avoid error described in
-            # https://blog.sucuri.net/2016/03/beware-unverified-tls-certificates-php-python.html
-            context = ssl.create_default_context()
-        else:
-            context = ssl._create_unverified_context()
+        context = _ssl_context()
 
         # Make a HEAD request first to check the content type.  This lets
         # us ignore tarballs and gigantic files.
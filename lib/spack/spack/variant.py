@@ -570,8 +570,9 @@ class VariantMap(lang.HashableMap):
             VariantMap: a copy of self
         """
         clone = VariantMap(self.spec)
-        for name, variant in self.items():
-            clone[name] = variant.copy()
+        # the variants were checked when they were added to self
+        for name, variant in self.dict.items():
+            clone.dict[name] = variant.copy()
         return clone
 
     def __str__(self):
@@ -108,26 +108,87 @@ def coerced(method):
     return coercing_method
 
 
+# Splits version strings into alphabetical and numeric segments
+_segment_regex = re.compile(r'[a-zA-Z]+|[0-9]+')
+
+#: Versions by string; there is one Version object per distinct string
+_versions = {}
+
+#: VersionRanges by the strings of their endpoints
+_version_ranges = {}
+
+
+def _version_key(version):
+    """Sort key of a Version, so that versions compare like their keys.
+
+    Non-numeric versions sort before numeric ones and ``develop`` sorts
+    after everything.  Numeric versions compare segment by segment,
+    where numbers are newer than letters, and the version with more
+    segments is newer if one is a prefix of the other.  Non-numeric
+    versions compare by their segments joined with dots, so versions
+    that differ only in their separators are equal.
+    """
+    segments = version.version
+    if not segments or not isinstance(segments[0], numbers.Integral):
+        if segments == ('develop',):
+            return (3,)
+        return (1, '.'.join(str(seg) for seg in segments))
+
+    key = [2]
+    for seg in segments:
+        # Numbers are always "newer" than letters.
+        # This is for consistency with RPM.  See patch
+        # #60884 (and details) from bugzilla #50977 in
+        # the RPM project at rpm.org.  Or look at
+        # rpmvercmp.c if you want to see how this is
+        # implemented there.
+        key.append(isinstance(seg, numbers.Integral))
+        key.append(seg)
+    return tuple(key)
+
+
 class Version(object):
-    """Class to represent versions"""
+    """Class to represent versions.
+
+    Versions are interned, so ``Version('1.2')`` always returns the same
+    object, and they must not be modified.
+    """
+    __slots__ = ['string', 'version', 'separators', '_key', '_hash']
 
-    def __init__(self, string):
+    def __new__(cls, string):
         string = str(string)
+        version = _versions.get(string)
+        if version is not None:
+            return version
 
         if not re.match(VALID_VERSION, string):
             raise ValueError("Bad characters in version string: %s" % string)
 
         # preserve the original string, but trimmed.
-        string = string.strip()
-        self.string = string
+        stripped = string.strip()
+        version = _versions.get(stripped)
+        if version is None:
+            version = object.__new__(cls)
+            version.string = stripped
 
-        # Split version into alphabetical and numeric segments
-        segment_regex = r'[a-zA-Z]+|[0-9]+'
-        segments = re.findall(segment_regex, string)
-        self.version = tuple(int_if_int(seg) for seg in segments)
+            # Split version into alphabetical and numeric segments
+            segments = _segment_regex.findall(stripped)
+            version.version = tuple(int_if_int(seg) for seg in segments)
 
-        # Store the separators from the original version string as well.
-        self.separators = tuple(re.split(segment_regex, string)[1:])
+            # Store the separators from the original version string as well.
+            version.separators = tuple(_segment_regex.split(stripped)[1:])
+
+            version._key = _version_key(version)
+            version._hash = hash(version.version)
+
+            # Another thread may have made the same version meanwhile
+            version = _versions.setdefault(stripped, version)
+
+        _versions[string] = version
+        return version
+
+    def __reduce__(self):
+        return Version, (self.string,)
 
     @property
     def dotted(self):
@@ -291,27 +352,6 @@ class Version(object):
     def concrete(self):
         return self
 
-    def _numeric_lt(self, other):
-        """Compares two versions, knowing they're both numeric"""
-        # Standard comparison of two numeric versions
-        for a, b in zip(self.version, other.version):
-            if a == b:
-                continue
-            else:
-                # Numbers are always "newer" than letters.
-                # This is for consistency with RPM.  See patch
-                # #60884 (and details) from bugzilla #50977 in
-                # the RPM project at rpm.org.  Or look at
-                # rpmvercmp.c if you want to see how this is
-                # implemented there.
-                if type(a) != type(b):
-                    return type(b) == int
-                else:
-                    return a < b
-        # If the common prefix is equal, the one
-        # with more segments is bigger.
-        return len(self.version) < len(other.version)
-
     @coerced
     def __lt__(self, other):
         """Version comparison is designed for consistency with the way RPM
@@ -319,46 +359,12 @@ class Version(object):
            packages, you should override your package's version string to
            express it more sensibly.
         """
-        if other is None:
-            return False
-
-        # Coerce if other is not a Version
-        # simple equality test first.
-        if self.version == other.version:
-            return False
-
-        # First priority: anything < develop
-        sdev = self.isdevelop()
-        if sdev:
-            return False    # source = develop, it can't be < anything
-
-        # Now we know !sdev
-        odev = other.isdevelop()
-        if odev:
-            return True    # src < dst
-
-        # now we know neither self nor other isdevelop().
-
-        # Principle: Non-numeric is less than numeric
-        # (so numeric will always be preferred by default)
-        if self.isnumeric():
-            if other.isnumeric():
-                return self._numeric_lt(other)
-            else:    # self = numeric; other = non-numeric
-                # Numeric > Non-numeric (always)
-                return False
-        else:
-            if other.isnumeric():  # self = non-numeric, other = numeric
-                # non-numeric < numeric (always)
-                return True
-            else:  # Both non-numeric
-                # Maybe consider other ways to compare here...
-                return self.string < other.string
+        return other is not None and self._key < other._key
 
     @coerced
     def __eq__(self, other):
         return (other is not None and
-                type(other) == Version and self.version == other.version)
+                type(other) == Version and self._key == other._key)
 
     @coerced
     def __ne__(self, other):
@@ -366,18 +372,18 @@ class Version(object):
 
     @coerced
     def __le__(self, other):
-        return self == other or self < other
+        return other is not None and self._key <= other._key
 
     @coerced
     def __ge__(self, other):
-        return not (self < other)
+        return other is None or self._key >= other._key
 
     @coerced
     def __gt__(self, other):
-        return not (self == other) and not (self < other)
+        return other is None or self._key > other._key
 
     def __hash__(self):
-        return hash(self.version)
+        return self._hash
 
     @coerced
     def __contains__(self, other):
@@ -422,17 +428,40 @@ class Version(object):
 
 
 class VersionRange(object):
+    """Range of versions between two Versions, either of which may be
+    None for an open end.  Like Versions, VersionRanges are interned and
+    must not be modified.
+    """
+    __slots__ = ['start', 'end', '_key']
 
-    def __init__(self, start, end):
+    def __new__(cls, start, end):
         if isinstance(start, string_types):
             start = Version(start)
         if isinstance(end, string_types):
             end = Version(end)
 
-        self.start = start
-        self.end = end
+        strings = (start.string if start is not None else None,
+                   end.string if end is not None else None)
+        version_range = _version_ranges.get(strings)
+        if version_range is not None:
+            return version_range
+
+        version_range = object.__new__(cls)
+        version_range.start = start
+        version_range.end = end
         if start and end and end < start:
-            raise ValueError("Invalid Version range: %s" % self)
+            raise ValueError("Invalid Version range: %s" % version_range)
+
+        # None in the start position is less than any version, and None
+        # in the end position is greater than any version.
+        version_range._key = (
+            (1, start._key) if start is not None else (0,),
+            (0, end._key) if end is not None else (1,))
+
+        return _version_ranges.setdefault(strings, version_range)
+
+    def __reduce__(self):
+        return VersionRange, (self.start, self.end)
 
     def lowest(self):
         return self.start
@@ -447,21 +476,12 @@ class VersionRange(object):
            the start position is less than everything except None, and None in
            the end position is greater than everything but None.
         """
-        if other is None:
-            return False
-
-        s, o = self, other
-        if s.start != o.start:
-            return s.start is None or (
-                o.start is not None and s.start < o.start)
-        return (s.end != o.end and
-                o.end is None or (s.end is not None and s.end < o.end))
+        return other is not None and self._key < other._key
 
     @coerced
     def __eq__(self, other):
         return (other is not None and
-                type(other) == VersionRange and
-                self.start == other.start and self.end == other.end)
+                type(other) == VersionRange and self._key == other._key)
 
     @coerced
     def __ne__(self, other):
@@ -469,15 +489,15 @@ class VersionRange(object):
 
     @coerced
     def __le__(self, other):
-        return self == other or self < other
+        return other is not None and self._key <= other._key
 
     @coerced
     def __ge__(self, other):
-        return not (self < other)
+        return other is None or self._key >= other._key
 
     @coerced
     def __gt__(self, other):
-        return not (self == other) and not (self < other)
+        return other is None or self._key > other._key
 
     @property
     def concrete(self):
@@ -646,7 +666,7 @@ class VersionList(object):
             if version.concrete:
                 version = version.concrete
 
-            i = bisect_left(self, version)
+            i = bisect_left(self.versions, version)
 
             while i - 1 >= 0 and version.overlaps(self[i - 1]):
                 version = version.union(self[i - 1])
@@ -674,7 +694,10 @@ class VersionList(object):
             return None
 
     def copy(self):
-        return VersionList(self)
+        # the list is already sorted and non-redundant
+        clone = VersionList()
+        clone.versions = list(self.versions)
+        return clone
 
     def lowest(self):
         """Get the lowest version in the list."""
@@ -790,7 +813,7 @@ class VersionList(object):
             return False
 
         for version in other:
-            i = bisect_left(self, other)
+            i = bisect_left(self.versions, version)
             if i == 0:
                 if version not in self[0]:
                     return False
@@ -116,7 +116,8 @@ function _spack {
     then
         compgen -W "-h --help --color -d --debug -D --pdb -k --insecure
                     -m --mock -p --profile -P --sorted-profile --lines
-                    -v --verbose -s --stacktrace -V --version" -- "$cur"
+                    -v --verbose -s --stacktrace -V --version
+                    --time-startup" -- "$cur"
     else
         compgen -W "$(_subcommands)" -- "$cur"
     fi
@@ -164,7 +165,16 @@ function _spack_buildcache {
     then
         compgen -W "-h --help" -- "$cur"
     else
-        compgen -W "create install keys list" -- "$cur"
+        compgen -W "check create install keys list update-index" -- "$cur"
+    fi
+}
+
+function _spack_buildcache_check {
+    if $list_options
+    then
+        compgen -W "-h --help -f --force" -- "$cur"
+    else
+        compgen -W "$(_all_packages)" -- "$cur"
     fi
 }
 
@@ -172,7 +182,7 @@ function _spack_buildcache_create {
     if $list_options
     then
         compgen -W "-h --help -r --rel -f --force -u --unsigned -a --allow-root
-                    -k --key -d --directory" -- "$cur"
+                    -k --key -d --directory --dedup" -- "$cur"
     else
         compgen -W "$(_all_packages)" -- "$cur"
     fi
@@ -182,7 +192,7 @@ function _spack_buildcache_install {
     if $list_options
     then
         compgen -W "-h --help -f --force -m --multiple -a --allow-root -u
-                    --unsigned" -- "$cur"
+                    --unsigned -j --jobs --connections --dry-run" -- "$cur"
     else
         compgen -W "$(_all_packages)" -- "$cur"
     fi
@@ -201,6 +211,10 @@ function _spack_buildcache_list {
     fi
 }
 
+function _spack_buildcache_update_index {
+    compgen -W "-h --help -d --directory" -- "$cur"
+}
+
 function _spack_cd {
     if $list_options
     then
@@ -350,6 +364,27 @@ function _spack_deactivate {
     fi
 }
 
+function _spack_daemon {
+    if $list_options
+    then
+        compgen -W "-h --help" -- "$cur"
+    else
+        compgen -W "start status stop" -- "$cur"
+    fi
+}
+
+function _spack_daemon_start {
+    compgen -W "-h --help -f --foreground" -- "$cur"
+}
+
+function _spack_daemon_status {
+    compgen -W "-h --help" -- "$cur"
+}
+
+function _spack_daemon_stop {
+    compgen -W "-h --help" -- "$cur"
+}
+
 function _spack_debug {
     if $list_options
     then
@@ -551,10 +586,12 @@ function _spack_info {
 function _spack_install {
     if $list_options
     then
-        compgen -W "-h --help --only -j --jobs --overwrite --keep-prefix
+        compgen -W "-h --help --only -j --jobs --concurrent-builds
+                    --keep-going --cooperative --overwrite --keep-prefix
                     --keep-stage --dont-restage --use-cache --show-log-on-error
                     --source -n --no-checksum -v --verbose --fake -f --file
-                    --clean --dirty --test --log-format --log-file
+                    --clean --dirty --unify --concretize-jobs --test
+                    --log-format --log-file
                     -y --yes-to-all" -- "$cur"
     else
         compgen -W "$(_all_packages)" -- "$cur"
@@ -888,7 +925,7 @@ function _spack_python {
 }
 
 function _spack_reindex {
-    compgen -W "-h --help" -- "$cur"
+    compgen -W "-h --help --compact" -- "$cur"
 }
 
 function _spack_repo {
@@ -954,8 +991,9 @@ function _spack_setup {
 function _spack_spec {
     if $list_options
     then
-        compgen -W "-h --help -l --long -L --very-long -y --yaml -c --cover
-                    -N --namespaces -I --install-status -t --types" -- "$cur"
+        compgen -W "-h --help -l --long -L --very-long --unify -y --yaml
+                    -c --cover -N --namespaces -I --install-status -t --types
+                    -j --jobs --no-cache" -- "$cur"
     else
         compgen -W "$(_all_packages)" -- "$cur"
     fi